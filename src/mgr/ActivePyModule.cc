@@ -153,3 +153,35 @@ void ActivePyModule::get_health_checks(health_check_map_t *checks)
   checks->merge(health_checks);
 }
 
+void ActivePyModule::dump_map_cache_stats(Formatter *f)
+{
+  if (pClassInstance == nullptr) {
+    return;
+  }
+
+  Gil gil(py_module->pMyThreadState, true);
+
+  auto pStats = PyObject_CallMethod(pClassInstance,
+      const_cast<char*>("_get_map_cache_stats"), nullptr);
+  if (pStats == nullptr) {
+    derr << get_name() << "._get_map_cache_stats:" << dendl;
+    derr << handle_pyerror() << dendl;
+    return;
+  }
+
+  // None if the module did not opt in to the map cache
+  if (PyDict_Check(pStats)) {
+    f->open_object_section(get_name().c_str());
+    PyObject *key, *value;
+    Py_ssize_t pos = 0;
+    while (PyDict_Next(pStats, &pos, &key, &value)) {
+      if (PyFloat_Check(value)) {
+        f->dump_float(PyString_AsString(key), PyFloat_AsDouble(value));
+      } else {
+        f->dump_int(PyString_AsString(key), PyInt_AsLong(value));
+      }
+    }
+    f->close_section();
+  }
+  Py_DECREF(pStats);
+}
@@ -62,6 +62,8 @@ public:
   }
   void get_health_checks(health_check_map_t *checks);
 
+  void dump_map_cache_stats(Formatter *f);
+
   void set_uri(const std::string &str)
   {
     uri = str;
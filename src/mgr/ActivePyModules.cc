@@ -354,6 +354,28 @@ PyObject *ActivePyModules::get_python(const std::string &what)
       mgr_map.dump(&f);
     });
     return f.get();
+  } else if (what == "map_versions") {
+    // Cheap to build: used by MgrModule to key its map cache
+    PyFormatter f;
+    cluster_state.with_osdmap([&f](const OSDMap &osd_map) {
+      f.dump_unsigned("osd_map", osd_map.get_epoch());
+    });
+    cluster_state.with_pgmap([&f](const PGMap &pg_map) {
+      f.dump_unsigned("pg_map", pg_map.version);
+    });
+    cluster_state.with_fsmap([&f](const FSMap &fsmap) {
+      f.dump_unsigned("fs_map", fsmap.get_epoch());
+    });
+    cluster_state.with_monmap([&f](const MonMap &monmap) {
+      f.dump_unsigned("mon_map", monmap.get_epoch());
+    });
+    cluster_state.with_servicemap([&f](const ServiceMap &service_map) {
+      f.dump_unsigned("service_map", service_map.epoch);
+    });
+    cluster_state.with_mgrmap([&f](const MgrMap &mgr_map) {
+      f.dump_unsigned("mgr_map", mgr_map.get_epoch());
+    });
+    return f.get();
   } else {
     derr << "Python module requested unknown data '" << what << "'" << dendl;
     Py_RETURN_NONE;
@@ -688,6 +710,112 @@ PyObject* ActivePyModules::get_perf_schema_python(
   return f.get();
 }
 
+PyObject* ActivePyModules::get_perf_counters_python(
+    const std::string &svc_type,
+    const std::string &svc_id,
+    int prio_limit,
+    bool with_schema)
+{
+  PyThreadState *tstate = PyEval_SaveThread();
+  Mutex::Locker l(lock);
+  PyEval_RestoreThread(tstate);
+
+  DaemonStateCollection daemons;
+
+  if (svc_type == "") {
+    daemons = daemon_state.get_all();
+  } else if (svc_id.empty()) {
+    daemons = daemon_state.get_by_service(svc_type);
+  } else {
+    auto key = DaemonKey(svc_type, svc_id);
+    auto got = daemon_state.get(key);
+    if (got != nullptr) {
+      daemons[key] = got;
+    }
+  }
+
+  // Only the most recent data point of each counter is emitted, so
+  // that callers wanting a snapshot of everything do not pay for
+  // converting the whole stored time series of every counter.
+  PyFormatter f;
+  for (auto statepair : daemons) {
+    auto key = statepair.first;
+    auto state = statepair.second;
+
+    std::ostringstream daemon_name;
+    daemon_name << key.first << "." << key.second;
+    f.open_object_section(daemon_name.str().c_str());
+
+    Mutex::Locker l(state->lock);
+    for (const auto &ctr_inst_iter : state->perf_counters.instances) {
+      const auto &counter_name = ctr_inst_iter.first;
+      const auto &counter_instance = ctr_inst_iter.second;
+      auto type_iter = state->perf_counters.types.find(counter_name);
+      if (type_iter == state->perf_counters.types.end()) {
+        continue;
+      }
+      const auto &type = type_iter->second;
+      if (type.priority < prio_limit) {
+        continue;
+      }
+
+      if (with_schema) {
+        f.open_object_section(counter_name.c_str());
+        f.dump_string("description", type.description);
+        if (!type.nick.empty()) {
+          f.dump_string("nick", type.nick);
+        }
+        f.dump_unsigned("type", type.type);
+        f.dump_unsigned("priority", type.priority);
+        f.dump_unsigned("units", type.unit);
+      }
+
+      // without the schema, the latest data point is emitted in the
+      // same form as by get_counter_python()
+      if (type.type & PERFCOUNTER_LONGRUNAVG) {
+        const auto &avg_data = counter_instance.get_data_avg();
+        uint64_t t = 0, s = 0, c = 0;
+        if (!avg_data.empty()) {
+          t = avg_data.back().t.sec();
+          s = avg_data.back().s;
+          c = avg_data.back().c;
+        }
+        if (with_schema) {
+          f.dump_unsigned("value", s);
+          f.dump_unsigned("count", c);
+        } else {
+          f.open_array_section(counter_name.c_str());
+          f.dump_unsigned("t", t);
+          f.dump_unsigned("s", s);
+          f.dump_unsigned("c", c);
+          f.close_section();
+        }
+      } else {
+        const auto &data = counter_instance.get_data();
+        uint64_t t = 0, v = 0;
+        if (!data.empty()) {
+          t = data.back().t.sec();
+          v = data.back().v;
+        }
+        if (with_schema) {
+          f.dump_unsigned("value", v);
+        } else {
+          f.open_array_section(counter_name.c_str());
+          f.dump_unsigned("t", t);
+          f.dump_unsigned("v", v);
+          f.close_section();
+        }
+      }
+
+      if (with_schema) {
+        f.close_section();
+      }
+    }
+    f.close_section();
+  }
+  return f.get();
+}
+
 PyObject *ActivePyModules::get_context()
 {
   PyThreadState *tstate = PyEval_SaveThread();
@@ -796,6 +924,23 @@ void ActivePyModules::get_health_checks(health_check_map_t *checks)
   }
 }
 
+void ActivePyModules::dump_map_cache_stats(Formatter *f)
+{
+  std::vector<ActivePyModule*> active;
+  {
+    Mutex::Locker l(lock);
+    for (auto& p : modules) {
+      active.push_back(p.second.get());
+    }
+  }
+
+  // Like handle_command, call into the modules without holding our lock
+  // so that they can call back into us while we wait for their GIL.
+  for (auto module : active) {
+    module->dump_map_cache_stats(f);
+  }
+}
+
 void ActivePyModules::set_uri(const std::string& module_name,
                         const std::string &uri)
 {
@@ -72,6 +72,11 @@ public:
   PyObject *get_perf_schema_python(
      const std::string &svc_type,
      const std::string &svc_id);
+  PyObject *get_perf_counters_python(
+     const std::string &svc_type,
+     const std::string &svc_id,
+     int prio_limit,
+     bool with_schema);
   PyObject *get_context();
   PyObject *get_osdmap();
 
@@ -91,6 +96,8 @@ public:
 			 health_check_map_t&& checks);
   void get_health_checks(health_check_map_t *checks);
 
+  void dump_map_cache_stats(Formatter *f);
+
   void set_uri(const std::string& module_name, const std::string &uri);
 
   int handle_command(
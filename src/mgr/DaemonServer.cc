@@ -868,6 +868,25 @@ bool DaemonServer::handle_command(MCommand *m)
     return true;
   }
 
+  // ----------------
+  // module commands
+  if (prefix == "mgr cache stats") {
+    // Calling into the modules takes their GIL: don't do it while
+    // holding our lock
+    finisher.queue(new FunctionContext([this, cmdctx, format](int r_) {
+      std::stringstream ss;
+      boost::scoped_ptr<Formatter> f(Formatter::create(format));
+      if (!f)
+	f.reset(Formatter::create("json-pretty"));
+      f->open_object_section("map_cache");
+      py_modules.dump_map_cache_stats(f.get());
+      f->close_section();
+      f->flush(cmdctx->odata);
+      cmdctx->reply(0, ss);
+    }));
+    return true;
+  }
+
   if (prefix == "config set") {
     std::string key;
     std::string val;
@@ -132,6 +132,10 @@ COMMAND("service dump",
 COMMAND("service status",
         "dump service state", "service", "r", "cli,rest")
 
+COMMAND("mgr cache stats",
+	"dump the hit rates of the modules' cluster map caches",
+	"mgr", "r", "cli,rest")
+
 COMMAND("config show " \
 	"name=who,type=CephString name=key,type=CephString,req=False",
 	"Show running configuration",
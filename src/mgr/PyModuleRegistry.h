@@ -149,6 +149,17 @@ public:
    */
   void get_health_checks(health_check_map_t *checks);
 
+  /**
+   * Dump the get() cache statistics of the modules that opted in to
+   * the map cache (see MgrModule.MAP_CACHE)
+   */
+  void dump_map_cache_stats(Formatter *f)
+  {
+    if (active_modules) {
+      active_modules->dump_map_cache_stats(f);
+    }
+  }
+
   // FIXME: breaking interface so that I don't have to go rewrite all
   // the places that call into these (for now)
   // >>>
@@ -74,11 +74,15 @@ static PyObject *osdmap_apply_incremental(BasePyOSDMap *self,
     return nullptr;
   }
 
+  // Let other python threads (e.g. the balancer optimizing several
+  // crush roots at once) run while we copy the map
+  PyThreadState *tstate = PyEval_SaveThread();
   bufferlist bl;
   self->osdmap->encode(bl, CEPH_FEATURES_ALL|CEPH_FEATURE_RESERVED);
   OSDMap *next = new OSDMap;
   next->decode(bl);
   next->apply_incremental(*(incobj->inc));
+  PyEval_RestoreThread(tstate);
   dout(10) << __func__ << " map " << self->osdmap << " inc " << incobj->inc
 	   << " next " << next << dendl;
 
@@ -167,10 +171,12 @@ static PyObject *osdmap_map_pool_pgs_up(BasePyOSDMap* self, PyObject *args)
   if (!pi)
     return nullptr;
   map<pg_t,vector<int>> pm;
+  PyThreadState *tstate = PyEval_SaveThread();
   for (unsigned ps = 0; ps < pi->get_pg_num(); ++ps) {
     pg_t pgid(ps, poolid);
     self->osdmap->pg_to_up_acting_osds(pgid, &pm[pgid], nullptr, nullptr, nullptr);
   }
+  PyEval_RestoreThread(tstate);
   PyFormatter f;
   for (auto p : pm) {
     string pg = stringify(p.first);
@@ -1015,6 +1015,96 @@ def cmdsiglen(sig):
     return len(some_value['sig'])
 
 
+class PrefixIndex(object):
+    """
+    Trie of the leading prefix words of the signatures of a sigdict, used
+    to find the commands worth matching against the arguments without
+    scanning the whole command table.
+    """
+    class Node(object):
+        def __init__(self):
+            self.children = {}
+            # commands whose prefix words end at this node
+            self.cmds = []
+            # commands whose prefix words start with the path to this node
+            self.subtree = []
+
+    def __init__(self, sigdict):
+        self.sigdict = sigdict
+        self.size = len(sigdict)
+        self.root = PrefixIndex.Node()
+        self.order = {}
+        for idx, (cmdtag, cmd) in enumerate(sigdict.items()):
+            self.order[cmdtag] = idx
+            node = self.root
+            node.subtree.append(cmdtag)
+            for desc in cmd['sig']:
+                if desc.t != CephPrefix:
+                    break
+                node = node.children.setdefault(desc.instance.prefix,
+                                                PrefixIndex.Node())
+                node.subtree.append(cmdtag)
+            node.cmds.append(cmdtag)
+
+    def candidates(self, args):
+        """
+        Return the (cmdtag, cmd) pairs that may have the highest matchnum()
+        for args, in sigdict order.  The others diverge from args on a
+        prefix word before the best candidates do.
+        """
+        found = set(self.root.cmds)
+        node = self.root
+        for i, word in enumerate(args):
+            if i == len(args) - 1:
+                # partial matching is allowed on the last word
+                matching = [child for prefix, child in node.children.items()
+                            if prefix.startswith(word)]
+                if not matching:
+                    found.update(node.subtree)
+                for child in matching:
+                    found.update(child.subtree)
+                break
+            child = node.children.get(word)
+            if child is None:
+                found.update(node.subtree)
+                break
+            node = child
+            found.update(node.cmds)
+        else:
+            found.update(node.subtree)
+        return [(cmdtag, self.sigdict[cmdtag])
+                for cmdtag in sorted(found, key=self.order.get)]
+
+    def lookup(self, args):
+        """
+        Return the cmdtags of the commands whose prefix words are all
+        found, in order, at the beginning of args.
+        """
+        found = []
+        node = self.root
+        for word in args:
+            node = node.children.get(word)
+            if node is None:
+                break
+            found.extend(node.cmds)
+        return found
+
+
+_prefix_index = None
+
+
+def get_prefix_index(sigdict):
+    """
+    Return the PrefixIndex of sigdict, reusing the last one built if it
+    was for the same sigdict.
+    """
+    global _prefix_index
+    if _prefix_index is None or _prefix_index.sigdict is not sigdict or \
+            _prefix_index.size != len(sigdict):
+        _prefix_index = PrefixIndex(sigdict)
+    return _prefix_index
+
+
 def validate_command(sigdict, args, verbose=False):
     """
     turn args into a valid dictionary ready to be sent off as JSON,
@@ -1029,7 +1119,7 @@ def validate_command(sigdict, args, verbose=False):
         # (so we can maybe give a more-useful error message)
         best_match_cnt = 0
         bestcmds = []
-        for cmdtag, cmd in sigdict.items():
+        for cmdtag, cmd in get_prefix_index(sigdict).candidates(args):
             sig = cmd['sig']
             matched = matchnum(args, sig, partial=True)
             if (matched >= math.floor(best_match_cnt) and
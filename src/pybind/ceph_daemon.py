@@ -10,11 +10,14 @@ License version 2, as published by the Free Software
 Foundation.  See file COPYING.
 """
 
+import errno
+import os
 import sys
 import json
 import socket
 import struct
 import time
+from array import array
 from collections import OrderedDict
 from fcntl import ioctl
 from fnmatch import fnmatch
@@ -22,69 +25,299 @@ from prettytable import PrettyTable, HEADER
 from signal import signal, SIGWINCH
 from termios import TIOCGWINSZ
 
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
 from ceph_argparse import parse_json_funcsigs, validate_command
 
 COUNTER = 0x8
 LONG_RUNNING_AVG = 0x4
-READ_CHUNK_SIZE = 4096
+READ_CHUNK_SIZE = 65536
 
 
-def admin_socket(asok_path, cmd, format=''):
+class AdminSocketClient(object):
     """
-    Send a daemon (--admin-daemon) command 'cmd'.  asok_path is the
-    path to the admin socket; cmd is a list of strings; format may be
-    set to one of the formatted forms to get output in that form
-    (daemon commands don't support 'plain' output).
+    Send commands to the admin sockets of local daemons.
+
+    The command descriptions of each socket are fetched once and reused
+    until the socket is recreated, e.g. by a daemon restart, so sending a
+    command usually takes a single connection.  Replies are read straight
+    into a buffer of the announced size.
     """
 
-    def do_sockio(path, cmd_bytes):
+    def __init__(self, timeout=None):
+        """
+        :param timeout: seconds to wait for each reply, or None to wait
+            forever
+        """
+        self.timeout = timeout
+        # asok path -> ((st_ino, st_mtime), descriptions json, sigdict)
+        self._descriptions = {}
+
+    @staticmethod
+    def _recv_into(sock, view):
+        got = 0
+        while got < len(view):
+            # recv() receives signed int, i.e max 2GB
+            # workaround by capping READ_CHUNK_SIZE per call.
+            n = sock.recv_into(view[got:], min(len(view) - got,
+                                               READ_CHUNK_SIZE))
+            if not n:
+                raise RuntimeError("admin socket closed before the whole "
+                                   "reply was read")
+            got += n
+
+    def _sockio(self, path, cmd_bytes):
         """ helper: do all the actual low-level stream I/O """
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.connect(path)
         try:
+            sock.settimeout(self.timeout)
+            sock.connect(path)
             sock.sendall(cmd_bytes + b'\0')
-            len_str = sock.recv(4)
-            if len(len_str) < 4:
+            len_buf = bytearray(4)
+            try:
+                self._recv_into(sock, memoryview(len_buf))
+            except RuntimeError:
                 raise RuntimeError("no data returned from admin socket")
-            l, = struct.unpack(">I", len_str)
-            sock_ret = b''
-
-            got = 0
-            while got < l:
-                # recv() receives signed int, i.e max 2GB
-                # workaround by capping READ_CHUNK_SIZE per call.
-                want = min(l - got, READ_CHUNK_SIZE)
-                bit = sock.recv(want)
-                sock_ret += bit
-                got += len(bit)
-
+            l, = struct.unpack(">I", bytes(len_buf))
+            reply = bytearray(l)
+            self._recv_into(sock, memoryview(reply))
         except Exception as sock_e:
             raise RuntimeError('exception: ' + str(sock_e))
-        return sock_ret
+        finally:
+            sock.close()
+        return bytes(reply)
+
+    @staticmethod
+    def _socket_id(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            # connecting will fail and tell why
+            return None
+        return st.st_ino, st.st_mtime
+
+    def _cached_descriptions(self, path):
+        """
+        Return the cached (descriptions json, sigdict) of path, or None if
+        they are missing or stale.
+        """
+        cached = self._descriptions.get(path)
+        if cached and cached[0] is not None and \
+                cached[0] == self._socket_id(path):
+            return cached[1:]
+        return None
+
+    def _add_descriptions(self, path, socket_id, cmd_json):
+        sigdict = parse_json_funcsigs(cmd_json.decode('utf-8'), 'cli')
+        self._descriptions[path] = (socket_id, cmd_json, sigdict)
+        return cmd_json, sigdict
+
+    def get_command_descriptions(self, path):
+        """
+        Return the (descriptions json, sigdict) of the daemon behind path.
+        """
+        cached = self._cached_descriptions(path)
+        if cached:
+            return cached
+        socket_id = self._socket_id(path)
+        try:
+            cmd_json = self._sockio(path,
+                                    b'{"prefix": "get_command_descriptions"}')
+        except Exception as e:
+            raise RuntimeError('exception getting command descriptions: ' +
+                               str(e))
+        return self._add_descriptions(path, socket_id, cmd_json)
+
+    @staticmethod
+    def _encode_command(sigdict, cmd, format):
+        valid_dict = validate_command(sigdict, cmd)
+        if not valid_dict:
+            raise RuntimeError('invalid command')
+        if format:
+            valid_dict['format'] = format
+        return json.dumps(valid_dict).encode('utf-8')
+
+    def command(self, path, cmd, format=''):
+        """
+        Send the command 'cmd' (a list of strings) to the daemon behind
+        the admin socket path and return its reply; format may be set to
+        one of the formatted forms to get output in that form.
+        """
+        cmd_json, sigdict = self.get_command_descriptions(path)
+        if cmd == 'get_command_descriptions':
+            return cmd_json
+
+        return self._sockio(path, self._encode_command(sigdict, cmd, format))
+
+    def command_many(self, paths, cmd, format=''):
+        """
+        Send the same command to the daemons behind all the admin sockets
+        in paths at once, e.g. to collect the counters of all the daemons
+        of a host.
+
+        :return: a (replies, errors) tuple of dicts keyed by path, holding
+            the reply, or the RuntimeError raised, for each path
+        """
+        replies = {}
+        errors = {}
+
+        # fetch the missing descriptions first, in one go as well
+        socket_ids = dict((path, self._socket_id(path)) for path in paths
+                          if not self._cached_descriptions(path))
+        fetched, failed = self._exchange_many(
+            dict((path, b'{"prefix": "get_command_descriptions"}')
+                 for path in socket_ids))
+        for path, e in failed.items():
+            errors[path] = RuntimeError(
+                'exception getting command descriptions: ' + str(e))
+        for path, cmd_json in fetched.items():
+            self._add_descriptions(path, socket_ids[path], cmd_json)
+
+        requests = {}
+        for path in paths:
+            if path in errors:
+                continue
+            cmd_json, sigdict = self._descriptions[path][1:]
+            if cmd == 'get_command_descriptions':
+                replies[path] = cmd_json
+                continue
+            try:
+                requests[path] = self._encode_command(sigdict, cmd, format)
+            except RuntimeError as e:
+                errors[path] = e
+
+        done, failed = self._exchange_many(requests)
+        replies.update(done)
+        errors.update(failed)
+        return replies, errors
+
+    def _exchange_many(self, requests):
+        """
+        Send each request (a path -> command dict) and wait for all the
+        replies concurrently.  Without the selectors module (python 2), the
+        requests are sent one after the other.
+        """
+        replies = {}
+        errors = {}
+        if selectors is None:
+            for path, cmd_bytes in requests.items():
+                try:
+                    replies[path] = self._sockio(path, cmd_bytes)
+                except RuntimeError as e:
+                    errors[path] = e
+            return replies, errors
+
+        sel = selectors.DefaultSelector()
+        try:
+            for path, cmd_bytes in requests.items():
+                try:
+                    exchange = _AdminSocketExchange(path, cmd_bytes,
+                                                    self.timeout)
+                except Exception as e:
+                    errors[path] = RuntimeError('exception: ' + str(e))
+                    continue
+                sel.register(exchange.sock, selectors.EVENT_READ, exchange)
+
+            deadline = None
+            if self.timeout is not None:
+                deadline = time.time() + self.timeout
+            while sel.get_map():
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                for key, _ in sel.select(timeout):
+                    exchange = key.data
+                    try:
+                        if not exchange.on_readable():
+                            continue
+                        replies[exchange.path] = exchange.reply()
+                    except Exception as e:
+                        errors[exchange.path] = RuntimeError(
+                            'exception: ' + str(e))
+                    sel.unregister(exchange.sock)
+                    exchange.sock.close()
+
+            for key in list(sel.get_map().values()):
+                errors[key.data.path] = RuntimeError(
+                    'exception: timed out waiting for the reply')
+                sel.unregister(key.fileobj)
+                key.fileobj.close()
+        finally:
+            sel.close()
+        return replies, errors
+
+
+class _AdminSocketExchange(object):
+    """
+    One command sent to an admin socket, whose reply is read as the
+    socket becomes readable.
+    """
 
-    try:
-        cmd_json = do_sockio(asok_path,
-                             b'{"prefix": "get_command_descriptions"}')
-    except Exception as e:
-        raise RuntimeError('exception getting command descriptions: ' + str(e))
+    def __init__(self, path, cmd_bytes, timeout):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # the command is small: only the reply is read asynchronously
+            self.sock.settimeout(timeout)
+            self.sock.connect(path)
+            self.sock.sendall(cmd_bytes + b'\0')
+            self.sock.setblocking(False)
+        except Exception:
+            self.sock.close()
+            raise
+        self._buf = bytearray(4)
+        self._view = memoryview(self._buf)
+        self._got = 0
+        self._header = True
+
+    def on_readable(self):
+        """
+        Read what is available; return True once the whole reply is in.
+        """
+        want = min(len(self._view) - self._got, READ_CHUNK_SIZE)
+        try:
+            n = self.sock.recv_into(self._view[self._got:], want)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return False
+            raise
+        if not n:
+            if self._header:
+                raise RuntimeError("no data returned from admin socket")
+            raise RuntimeError("admin socket closed before the whole "
+                               "reply was read")
+        self._got += n
+        if self._got < len(self._buf):
+            return False
+        if not self._header:
+            return True
+        l, = struct.unpack(">I", bytes(self._buf))
+        self._header = False
+        self._buf = bytearray(l)
+        self._view = memoryview(self._buf)
+        self._got = 0
+        return l == 0
 
-    if cmd == 'get_command_descriptions':
-        return cmd_json
+    def reply(self):
+        return bytes(self._buf)
 
-    sigdict = parse_json_funcsigs(cmd_json.decode('utf-8'), 'cli')
-    valid_dict = validate_command(sigdict, cmd)
-    if not valid_dict:
-        raise RuntimeError('invalid command')
 
-    if format:
-        valid_dict['format'] = format
+_client = AdminSocketClient()
 
-    try:
-        ret = do_sockio(asok_path, json.dumps(valid_dict).encode('utf-8'))
-    except Exception as e:
-        raise RuntimeError('exception: ' + str(e))
 
-    return ret
+def admin_socket(asok_path, cmd, format=''):
+    """
+    Send a daemon (--admin-daemon) command 'cmd'.  asok_path is the
+    path to the admin socket; cmd is a list of strings; format may be
+    set to one of the formatted forms to get output in that form
+    (daemon commands don't support 'plain' output).
+    """
+    return _client.command(asok_path, cmd, format)
 
 
 class Termsize(object):
@@ -125,6 +358,9 @@ class DaemonWatcher(object):
     Given a Ceph daemon's admin socket path, poll its performance counters
     and output a series of output lines showing the momentary values of
     counters of interest (those with the 'nick' property in Ceph's schema)
+
+    Given several admin socket paths, output one line per daemon and
+    interval, each starting with the name of the socket.
     """
     (
         BLACK,
@@ -143,8 +379,17 @@ class DaemonWatcher(object):
     BOLD_SEQ = "\033[1m"
     UNDERLINE_SEQ = "\033[4m"
 
+    # beyond this many sections displayed, dump all counters at once rather
+    # than one section per request
+    MAX_SECTION_REQUESTS = 4
+
     def __init__(self, asok, statpats=None, min_prio=0):
-        self.asok_path = asok
+        if isinstance(asok, (list, tuple)):
+            self.asok_paths = list(asok)
+        else:
+            self.asok_paths = [asok]
+        self.asok_path = self.asok_paths[0]
+        self._client = AdminSocketClient()
         self._colored = False
 
         self._stats = None
@@ -154,6 +399,13 @@ class DaemonWatcher(object):
         self._min_prio = min_prio
         self.termsize = Termsize()
 
+        # (section, name, nick, type, last of its section) of the
+        # displayed stats, and their sampled values per asok path: two
+        # slots per stat, for the avgcount and sum of averages
+        self._columns = []
+        self._values = {}
+        self._last_values = {}
+
     def supports_color(self, ostr):
         """
         Returns True if the running system's terminal supports color, and False
@@ -217,6 +469,24 @@ class DaemonWatcher(object):
         """
         return max(len(nick), 4)
 
+    def label(self, asok_path):
+        """
+        Name of the daemon behind `asok_path` at the beginning of its rows
+        """
+        label = os.path.basename(asok_path)
+        if label.endswith('.asok'):
+            label = label[:-len('.asok')]
+        return label
+
+    def label_width(self):
+        """
+        Width of the column of daemon names, including spacing; 0 when
+        watching a single daemon.
+        """
+        if len(self.asok_paths) < 2:
+            return 0
+        return max(len(self.label(p)) for p in self.asok_paths) + 1
+
     def get_stats_that_fit(self):
         '''
         Get a possibly-truncated list of stats to display based on
@@ -224,7 +494,7 @@ class DaemonWatcher(object):
         '''
         current_fit = OrderedDict()
         if self.termsize.changed or not self._stats_that_fit:
-            width = 0
+            width = self.label_width()
             for section_name, names in self._stats.items():
                 for name, stat_data in names.items():
                     width += self.col_width(stat_data) + 1
@@ -246,7 +516,7 @@ class DaemonWatcher(object):
         """
         Print a header row to `ostr`
         """
-        header = ""
+        header = " " * self.label_width()
         stats, _ = self.get_stats_that_fit()
         for section_name, names in stats.items():
             section_width = \
@@ -260,7 +530,7 @@ class DaemonWatcher(object):
         header += "\n"
         ostr.write(self.colorize(header, self.BLUE, True))
 
-        sub_header = ""
+        sub_header = " " * self.label_width()
         for section_name, names in stats.items():
             for stat_name, stat_nick in names.items():
                 sub_header += self.UNDERLINE_SEQ \
@@ -272,40 +542,107 @@ class DaemonWatcher(object):
         sub_header += "\n"
         ostr.write(sub_header)
 
-    def _print_vals(self, ostr, dump, last_dump):
+    def _update_columns(self, stats):
         """
-        Print a single row of values to `ostr`, based on deltas between `dump` and
-        `last_dump`.
+        Lay out the stats to display and allocate the arrays their values
+        are sampled into.
         """
-        val_row = ""
-        fit, changed = self.get_stats_that_fit()
-        if changed:
-            self._print_headers(ostr)
-        for section_name, names in fit.items():
-            for stat_name, stat_nick in names.items():
+        self._columns = []
+        for section_name, names in stats.items():
+            for i, (stat_name, stat_nick) in enumerate(names.items()):
                 stat_type = self._schema[section_name][stat_name]['type']
+                self._columns.append((section_name, stat_name, stat_nick,
+                                      stat_type, i == len(names) - 1))
+        nan = float('nan')
+        self._values = dict((path, array('d', [nan] * 2 * len(self._columns)))
+                            for path in self.asok_paths)
+        self._last_values = dict(
+            (path, array('d', values)) for path, values in self._values.items())
+
+    def _dump_commands(self):
+        """
+        The perf dump commands fetching the sections displayed
+        """
+        sections = []
+        for column in self._columns:
+            if column[0] not in sections:
+                sections.append(column[0])
+        if len(sections) > self.MAX_SECTION_REQUESTS:
+            return [["perf", "dump"]]
+        return [["perf", "dump", section] for section in sections]
+
+    def _sample(self):
+        """
+        Fetch the displayed counters of all the daemons into self._values.
+        A daemon failing to reply gets its values cleared; if all fail,
+        raise the error of the first one.
+        """
+        nan = float('nan')
+        dumps = dict((path, {}) for path in self.asok_paths)
+        failed = {}
+        for cmd in self._dump_commands():
+            replies, errors = self._client.command_many(self.asok_paths, cmd)
+            failed.update(errors)
+            for path, reply in replies.items():
+                dumps[path].update(json.loads(reply.decode('utf-8')))
+        if len(failed) == len(self.asok_paths):
+            raise failed[self.asok_paths[0]]
+
+        for path, dump in dumps.items():
+            values = self._values[path]
+            for i, column in enumerate(self._columns):
+                section_name, stat_name, _, stat_type, _ = column
+                value = dump.get(section_name, {}).get(stat_name)
+                try:
+                    if value is None:
+                        values[2 * i] = values[2 * i + 1] = nan
+                    elif not stat_type & COUNTER and \
+                            stat_type & LONG_RUNNING_AVG:
+                        values[2 * i] = value['avgcount']
+                        values[2 * i + 1] = value['sum']
+                    else:
+                        values[2 * i] = value
+                except (TypeError, KeyError):
+                    # e.g. histograms
+                    values[2 * i] = values[2 * i + 1] = nan
+
+    def _print_vals(self, ostr):
+        """
+        Print a row of values to `ostr` for each daemon, based on deltas
+        between the last two samples.
+        """
+        sep = self.colorize("|", self.BLUE)
+        label_width = self.label_width()
+        for path in self.asok_paths:
+            values = self._values[path]
+            last_values = self._last_values[path]
+            val_row = ""
+            if label_width:
+                val_row = self.label(path).ljust(label_width)
+            for i, column in enumerate(self._columns):
+                _, _, stat_nick, stat_type, end_of_section = column
+                width = self.col_width(stat_nick)
                 if bool(stat_type & COUNTER):
-                    n = max(dump[section_name][stat_name] -
-                            last_dump[section_name][stat_name], 0)
+                    n = max(values[2 * i] - last_values[2 * i], 0)
                 elif bool(stat_type & LONG_RUNNING_AVG):
-                    entries = dump[section_name][stat_name]['avgcount'] - \
-                            last_dump[section_name][stat_name]['avgcount']
+                    entries = values[2 * i] - last_values[2 * i]
                     if entries:
-                        n = (dump[section_name][stat_name]['sum'] -
-                             last_dump[section_name][stat_name]['sum']) \
-                            / float(entries)
+                        n = (values[2 * i + 1] - last_values[2 * i + 1]) \
+                            / entries
                         n *= 1000.0  # Present in milliseconds
                     else:
                         n = 0
                 else:
-                    n = dump[section_name][stat_name]
+                    n = values[2 * i]
 
-                val_row += self.format_dimless(n, self.col_width(stat_nick))
-                val_row += " "
-            val_row = val_row[0:-1]
-            val_row += self.colorize("|", self.BLUE)
-        val_row = val_row[0:-len(self.colorize("|", self.BLUE))]
-        ostr.write("{0}\n".format(val_row))
+                if n != n:
+                    # not sampled
+                    val_row += "-".rjust(width - 1) + " "
+                else:
+                    val_row += self.format_dimless(n, width)
+                val_row += sep if end_of_section else " "
+            val_row = val_row[0:-len(sep)]
+            ostr.write("{0}\n".format(val_row))
 
     def _should_include(self, sect, name, prio):
         '''
@@ -333,11 +670,23 @@ class DaemonWatcher(object):
     def _load_schema(self):
         """
         Populate our instance-local copy of the daemon's performance counter
-        schema, and work out which stats we will display.
+        schema, and work out which stats we will display.  With several
+        daemons, the schema is the union of theirs.
         """
-        self._schema = json.loads(
-            admin_socket(self.asok_path, ["perf", "schema"]).decode('utf-8'),
-            object_pairs_hook=OrderedDict)
+        replies, errors = self._client.command_many(self.asok_paths,
+                                                    ["perf", "schema"])
+        for path in self.asok_paths:
+            if path in errors:
+                raise errors[path]
+
+        self._schema = OrderedDict()
+        for path in self.asok_paths:
+            schema = json.loads(replies[path].decode('utf-8'),
+                                object_pairs_hook=OrderedDict)
+            for section_name, section_stats in schema.items():
+                merged = self._schema.setdefault(section_name, OrderedDict())
+                for name, schema_data in section_stats.items():
+                    merged.setdefault(name, schema_data)
 
         # Build list of which stats we will display
         self._stats = OrderedDict()
@@ -365,24 +714,37 @@ class DaemonWatcher(object):
         self._colored = self.supports_color(ostr)
 
         self._print_headers(ostr)
-
-        last_dump = json.loads(admin_socket(self.asok_path, ["perf", "dump"]).decode('utf-8'))
+        stats, _ = self.get_stats_that_fit()
+        self._update_columns(stats)
+        self._sample()
         rows_since_header = 0
 
         try:
             signal(SIGWINCH, self._handle_sigwinch)
             while True:
-                dump = json.loads(admin_socket(self.asok_path, ["perf", "dump"]).decode('utf-8'))
+                self._values, self._last_values = \
+                    self._last_values, self._values
+                stats, changed = self.get_stats_that_fit()
+                if changed:
+                    # no previous sample of the new columns: show a row
+                    # of zero deltas
+                    self._update_columns(stats)
+                    self._sample()
+                    for path, values in self._values.items():
+                        self._last_values[path][:] = values
+                    self._print_headers(ostr)
+                    rows_since_header = 0
+                else:
+                    self._sample()
                 if rows_since_header >= self.termsize.rows - 2:
                     self._print_headers(ostr)
                     rows_since_header = 0
-                self._print_vals(ostr, dump, last_dump)
+                self._print_vals(ostr)
                 if count is not None:
                     count -= 1
                     if count <= 0:
                         break
-                rows_since_header += 1
-                last_dump = dump
+                rows_since_header += len(self.asok_paths)
 
                 # time.sleep() is interrupted by SIGWINCH; avoid that
                 end = time.time() + interval
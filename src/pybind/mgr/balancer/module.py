@@ -9,10 +9,16 @@ import json
 import math
 import random
 import time
+from array import array
 from mgr_module import MgrModule, CommandResult
-from threading import Event
+from threading import Event, Thread
 from mgr_module import CRUSHMap
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # available modes: 'none', 'crush', 'crush-compat', 'upmap', 'osd_weight'
 default_mode = 'none'
 default_sleep_interval = 60   # seconds
@@ -20,33 +26,225 @@ default_max_misplaced = .05    # max ratio of pgs replaced at a time
 
 TIME_FORMAT = '%Y-%m-%d_%H:%M:%S'
 
-class MappingState:
+class PoolPGArrays:
+    """
+    Dense representation of the PGs of a pool: one entry per PG instance
+    (i.e. per OSD in the up set of each PG) with the OSD id and the
+    object and byte counts of the PG, so that per-OSD totals can be
+    computed in bulk instead of walking every PG's up set.
+    """
+    def __init__(self, pg_up, pg_stat):
+        self.osd = array('l')
+        self.objects = array('l')
+        self.bytes = array('l')
+        for pgid, up in pg_up.iteritems():
+            stat = pg_stat[pgid]
+            for osd in up:
+                osd = int(osd)
+                if osd == CRUSHMap.ITEM_NONE:
+                    continue
+                self.osd.append(osd)
+                self.objects.append(stat['num_objects'])
+                self.bytes.append(stat['num_bytes'])
+        self._sums = None
+
+    def osd_sums(self):
+        """
+        :return: a (pgs, objects, bytes) tuple of lists indexed by OSD id
+        """
+        if self._sums is not None:
+            return self._sums
+        size = max(self.osd) + 1 if len(self.osd) else 0
+        if numpy is not None:
+            osd = numpy.array(self.osd, dtype=numpy.int64)
+            pgs = numpy.bincount(osd, minlength=size)
+            objects = numpy.zeros(size, dtype=numpy.int64)
+            numpy.add.at(objects, osd,
+                         numpy.array(self.objects, dtype=numpy.int64))
+            bytes = numpy.zeros(size, dtype=numpy.int64)
+            numpy.add.at(bytes, osd,
+                         numpy.array(self.bytes, dtype=numpy.int64))
+            self._sums = (pgs.tolist(), objects.tolist(), bytes.tolist())
+        else:
+            pgs = [0] * size
+            objects = [0] * size
+            bytes = [0] * size
+            for i in xrange(len(self.osd)):
+                osd = self.osd[i]
+                pgs[osd] += 1
+                objects[osd] += self.objects[i]
+                bytes[osd] += self.bytes[i]
+            self._sums = (pgs, objects, bytes)
+        return self._sums
+
+    def updated(self, before, after, changed_pgids, pg_stat):
+        """
+        Return the arrays of the pool once the PGs in changed_pgids moved
+        from their up set in before to the one in after.  Only the
+        per-OSD totals are kept, adjusted by the changed PGs.
+        """
+        pgs, objects, bytes = [list(a) for a in self.osd_sums()]
+        for pgid in changed_pgids:
+            stat = pg_stat[pgid]
+            for up, sign in ((before.get(pgid, []), -1),
+                             (after.get(pgid, []), 1)):
+                for osd in up:
+                    osd = int(osd)
+                    if osd == CRUSHMap.ITEM_NONE:
+                        continue
+                    if osd >= len(pgs):
+                        grow = [0] * (osd + 1 - len(pgs))
+                        pgs += grow
+                        objects += grow
+                        bytes += grow
+                    pgs[osd] += sign
+                    objects[osd] += sign * stat['num_objects']
+                    bytes[osd] += sign * stat['num_bytes']
+        r = PoolPGArrays({}, pg_stat)
+        r._sums = (pgs, objects, bytes)
+        return r
+
+class MappingState(object):
     def __init__(self, osdmap, pg_dump, desc=''):
         self.desc = desc
         self.osdmap = osdmap
-        self.osdmap_dump = self.osdmap.dump()
+        self._osdmap_dump = self.osdmap.dump()
         self.crush = osdmap.get_crush()
-        self.crush_dump = self.crush.dump()
+        self._crush_dump = self.crush.dump()
         self.pg_dump = pg_dump
         self.pg_stat = {
             i['pgid']: i['stat_sum'] for i in pg_dump.get('pg_stats', [])
         }
-        osd_poolids = [p['pool'] for p in self.osdmap_dump.get('pools', [])]
+        self.pools = self._osdmap_dump.get('pools', [])
+        self.osd_weights = { a['osd']: a['weight']
+                             for a in self._osdmap_dump.get('osds', []) }
+        osd_poolids = [p['pool'] for p in self.pools]
         pg_poolids = [p['poolid'] for p in pg_dump.get('pool_stats', [])]
         self.poolids = set(osd_poolids) & set(pg_poolids)
-        self.pg_up = {}
         self.pg_up_by_poolid = {}
         for poolid in self.poolids:
             self.pg_up_by_poolid[poolid] = osdmap.map_pool_pgs_up(poolid)
-            for a,b in self.pg_up_by_poolid[poolid].iteritems():
-                self.pg_up[a] = b
+        self.pg_arrays_by_poolid = {}
+
+        # set for states derived from this one, see derive()
+        self.parent = None
+        self.changed_pgids_by_poolid = {}
+        self._poolids_by_osd = None
+
+    @property
+    def osdmap_dump(self):
+        if self._osdmap_dump is None:
+            self._osdmap_dump = self.osdmap.dump()
+        return self._osdmap_dump
+
+    @property
+    def crush_dump(self):
+        if self._crush_dump is None:
+            self._crush_dump = self.crush.dump()
+        return self._crush_dump
+
+    @property
+    def pg_up(self):
+        pg_up = {}
+        for m in self.pg_up_by_poolid.itervalues():
+            pg_up.update(m)
+        return pg_up
+
+    def get_poolids_by_osd(self):
+        """
+        :return: dict of osd id to the set of ids of the pools that
+            (through the take of their CRUSH rule) may map PGs to it
+        """
+        if self._poolids_by_osd is None:
+            self._poolids_by_osd = {}
+            for rootid in self.crush.find_takes():
+                poolids = self.osdmap.get_pools_by_take(rootid)
+                for osd in self.crush.get_take_weight_osd_map(rootid):
+                    self._poolids_by_osd.setdefault(osd, set()).update(poolids)
+        return self._poolids_by_osd
+
+    def derive(self, osdmap, desc, changed_osds, changed_poolids, osd_weights):
+        """
+        Build the state of osdmap, an OSDMap derived from ours by changing
+        the (compat weight-set or reweight) weights of changed_osds, the
+        reweights to osd_weights, and the upmaps of changed_poolids.
+
+        Only the pools that may be affected by those changes are mapped
+        again; the others share the mappings (and totals) of this state.
+        """
+        ms = MappingState.__new__(MappingState)
+        ms.desc = desc
+        ms.osdmap = osdmap
+        ms._osdmap_dump = None
+        ms.crush = osdmap.get_crush()
+        ms._crush_dump = None
+        ms.pg_dump = self.pg_dump
+        ms.pg_stat = self.pg_stat
+        ms.pools = self.pools
+        ms.osd_weights = dict(self.osd_weights)
+        ms.osd_weights.update(osd_weights)
+        ms.poolids = self.poolids
+        ms.parent = self
+        ms._poolids_by_osd = None
+
+        poolids_by_osd = self.get_poolids_by_osd()
+        covered = set()
+        for poolids in poolids_by_osd.itervalues():
+            covered |= poolids
+        remap = set(changed_poolids) | (self.poolids - covered)
+        for osd in changed_osds:
+            if osd not in poolids_by_osd:
+                # we do not know which pools may use it
+                remap = self.poolids
+                break
+            remap |= poolids_by_osd[osd]
+
+        ms.pg_up_by_poolid = dict(self.pg_up_by_poolid)
+        ms.pg_arrays_by_poolid = dict(self.pg_arrays_by_poolid)
+        ms.changed_pgids_by_poolid = {}
+        for poolid in remap & self.poolids:
+            before = self.pg_up_by_poolid[poolid]
+            after = osdmap.map_pool_pgs_up(poolid)
+            changed = [pgid for pgid, up in before.iteritems()
+                       if up != after.get(pgid, [])]
+            changed += [pgid for pgid in after if pgid not in before]
+            ms.changed_pgids_by_poolid[poolid] = changed
+            if not changed:
+                continue
+            ms.pg_up_by_poolid[poolid] = after
+            if poolid in self.pg_arrays_by_poolid:
+                ms.pg_arrays_by_poolid[poolid] = \
+                    self.pg_arrays_by_poolid[poolid].updated(
+                        before, after, changed, self.pg_stat)
+            else:
+                ms.pg_arrays_by_poolid.pop(poolid, None)
+        return ms
+
+    def get_pool_pg_arrays(self, poolid):
+        if poolid not in self.pg_arrays_by_poolid:
+            self.pg_arrays_by_poolid[poolid] = PoolPGArrays(
+                self.pg_up_by_poolid[poolid], self.pg_stat)
+        return self.pg_arrays_by_poolid[poolid]
 
-    def calc_misplaced_from(self, other_ms):
-        num = len(other_ms.pg_up)
+    def calc_misplaced_from(self, other_ms, poolids=None):
+        num = 0
         misplaced = 0
-        for pgid, before in other_ms.pg_up.iteritems():
-            if before != self.pg_up.get(pgid, []):
-                misplaced += 1
+        for poolid, before_by_pgid in other_ms.pg_up_by_poolid.iteritems():
+            if poolids is not None and poolid not in poolids:
+                continue
+            num += len(before_by_pgid)
+            after_by_pgid = self.pg_up_by_poolid.get(poolid, {})
+            if after_by_pgid is before_by_pgid:
+                continue
+            if self.parent is other_ms and \
+               poolid in self.changed_pgids_by_poolid:
+                misplaced += len([
+                    pgid for pgid in self.changed_pgids_by_poolid[poolid]
+                    if pgid in before_by_pgid])
+                continue
+            for pgid, before in before_by_pgid.iteritems():
+                if before != after_by_pgid.get(pgid, []):
+                    misplaced += 1
         if num > 0:
             return float(misplaced) / float(num)
         return 0.0
@@ -60,14 +258,27 @@ class Plan:
 
         self.osd_weights = {}
         self.compat_ws = {}
+        self.initial_compat_ws = {}
         self.inc = ms.osdmap.new_incremental()
 
     def final_state(self):
         self.inc.set_osd_reweights(self.osd_weights)
         self.inc.set_crush_compat_weight_set_weights(self.compat_ws)
-        return MappingState(self.initial.osdmap.apply_incremental(self.inc),
-                            self.initial.pg_dump,
-                            'plan %s final' % self.name)
+        changed_osds = set(
+            osd for osd, w in self.compat_ws.iteritems()
+            if self.initial_compat_ws.get(osd) != w)
+        changed_osds |= set(
+            osd for osd, w in self.osd_weights.iteritems()
+            if self.initial.osd_weights.get(osd) != w)
+        incdump = self.inc.dump()
+        changed_pgids = incdump.get('old_pg_upmap_items', []) + \
+            [i['pgid'] for i in incdump.get('new_pg_upmap_items', [])]
+        changed_poolids = set(int(pgid.split('.')[0])
+                              for pgid in changed_pgids)
+        return self.initial.derive(
+            self.initial.osdmap.apply_incremental(self.inc),
+            'plan %s final' % self.name,
+            changed_osds, changed_poolids, self.osd_weights)
 
     def dump(self):
         return json.dumps(self.inc.dump(), indent=4)
@@ -286,6 +497,8 @@ class Module(MgrModule):
     run = True
     plans = {}
     mode = ''
+    last_optimize_duration = None
+    last_optimize_root_durations = {}
 
     def __init__(self, *args, **kwargs):
         super(Module, self).__init__(*args, **kwargs)
@@ -298,6 +511,9 @@ class Module(MgrModule):
                 'plans': self.plans.keys(),
                 'active': self.active,
                 'mode': self.get_config('mode', default_mode),
+                'last_optimize_duration': self.last_optimize_duration,
+                'last_optimize_root_durations':
+                    self.last_optimize_root_durations,
             }
             return (0, json.dumps(s, indent=4), '')
         elif command['prefix'] == 'balancer mode':
@@ -437,7 +653,7 @@ class Module(MgrModule):
         pe = Eval(ms)
         pool_rule = {}
         pool_info = {}
-        for p in ms.osdmap_dump.get('pools',[]):
+        for p in ms.pools:
             if len(pools) and p['pool_name'] not in pools:
                 continue
             # skip dead or not-yet-ready pools too
@@ -455,8 +671,7 @@ class Module(MgrModule):
         self.log.debug('pools %s' % pools)
         self.log.debug('pool_rule %s' % pool_rule)
 
-        osd_weight = { a['osd']: a['weight']
-                       for a in ms.osdmap_dump.get('osds',[]) if a['weight'] > 0 }
+        osd_weight = { osd: w for osd, w in ms.osd_weights.iteritems() if w > 0 }
 
         # get expected distributions by root
         actual_by_root = {}
@@ -508,41 +723,45 @@ class Module(MgrModule):
         # pool and root actual
         for pool, pi in pool_info.iteritems():
             poolid = pi['pool']
-            pm = ms.pg_up_by_poolid[poolid]
+            # pick a root to associate each osd's pg instances with.
+            # note that this is imprecise if the roots have
+            # overlapping children.
+            # FIXME: divide bytes by k for EC pools.
+            osd_root = {}
+            osds = []
+            for root in pe.pool_roots[pool]:
+                for osd in pe.target_by_root[root].iterkeys():
+                    if osd not in osd_root:
+                        osd_root[osd] = root
+                        osds.append(osd)
+            pgs_sum, objects_sum, bytes_sum = \
+                ms.get_pool_pg_arrays(poolid).osd_sums()
             pgs = 0
             objects = 0
             bytes = 0
             pgs_by_osd = {}
             objects_by_osd = {}
             bytes_by_osd = {}
-            for root in pe.pool_roots[pool]:
-                for osd in pe.target_by_root[root].iterkeys():
-                    pgs_by_osd[osd] = 0
-                    objects_by_osd[osd] = 0
-                    bytes_by_osd[osd] = 0
-            for pgid, up in pm.iteritems():
-                for osd in [int(osd) for osd in up]:
-                    if osd == CRUSHMap.ITEM_NONE:
-                        continue
-                    pgs_by_osd[osd] += 1
-                    objects_by_osd[osd] += ms.pg_stat[pgid]['num_objects']
-                    bytes_by_osd[osd] += ms.pg_stat[pgid]['num_bytes']
-                    # pick a root to associate this pg instance with.
-                    # note that this is imprecise if the roots have
-                    # overlapping children.
-                    # FIXME: divide bytes by k for EC pools.
-                    for root in pe.pool_roots[pool]:
-                        if osd in pe.target_by_root[root]:
-                            actual_by_root[root]['pgs'][osd] += 1
-                            actual_by_root[root]['objects'][osd] += ms.pg_stat[pgid]['num_objects']
-                            actual_by_root[root]['bytes'][osd] += ms.pg_stat[pgid]['num_bytes']
-                            pgs += 1
-                            objects += ms.pg_stat[pgid]['num_objects']
-                            bytes += ms.pg_stat[pgid]['num_bytes']
-                            pe.total_by_root[root]['pgs'] += 1
-                            pe.total_by_root[root]['objects'] += ms.pg_stat[pgid]['num_objects']
-                            pe.total_by_root[root]['bytes'] += ms.pg_stat[pgid]['num_bytes']
-                            break
+            for osd in osds:
+                if osd < len(pgs_sum):
+                    osd_pgs = pgs_sum[osd]
+                    osd_objects = objects_sum[osd]
+                    osd_bytes = bytes_sum[osd]
+                else:
+                    osd_pgs = osd_objects = osd_bytes = 0
+                pgs_by_osd[osd] = osd_pgs
+                objects_by_osd[osd] = osd_objects
+                bytes_by_osd[osd] = osd_bytes
+                root = osd_root[osd]
+                actual_by_root[root]['pgs'][osd] += osd_pgs
+                actual_by_root[root]['objects'][osd] += osd_objects
+                actual_by_root[root]['bytes'][osd] += osd_bytes
+                pgs += osd_pgs
+                objects += osd_objects
+                bytes += osd_bytes
+                pe.total_by_root[root]['pgs'] += osd_pgs
+                pe.total_by_root[root]['objects'] += osd_objects
+                pe.total_by_root[root]['bytes'] += osd_bytes
             pe.count_by_pool[pool] = {
                 'pgs': {
                     k: v
@@ -730,11 +949,8 @@ class Module(MgrModule):
             return -errno.EINVAL, '"crush_compat_step" must be in (0, 1)'
         max_misplaced = float(self.get_config('max_misplaced',
                                               default_max_misplaced))
-        min_pg_per_osd = 2
 
         ms = plan.initial
-        osdmap = ms.osdmap
-        crush = osdmap.get_crush()
         pe = self.calc_eval(ms, plan.pools)
         min_score_to_optimize = float(self.get_config('min_score', 0))
         if pe.score <= min_score_to_optimize:
@@ -757,6 +973,7 @@ class Module(MgrModule):
         if not orig_ws:
             return -errno.EAGAIN, 'compat weight-set not available'
         orig_ws = { a: b for a, b in orig_ws.iteritems() if a >= 0 }
+        plan.initial_compat_ws = orig_ws
 
         # Make sure roots don't overlap their devices.  If so, we
         # can't proceed.
@@ -778,6 +995,106 @@ class Module(MgrModule):
             self.log.error(detail)
             return -errno.EOPNOTSUPP, detail
 
+        # Roots sharing no pool have independent weight-sets and PG
+        # mappings, so each group of roots sharing pools is optimized
+        # on its own, concurrently with the other groups.
+        groups = []
+        for root in roots:
+            group = set([root])
+            pools = set(pe.root_pools[root])
+            for other in groups[:]:
+                if pools & other[1]:
+                    groups.remove(other)
+                    group |= other[0]
+                    pools |= other[1]
+            groups.append((group, pools))
+
+        # warm up the lazily computed state shared by the workers
+        ms.get_poolids_by_osd()
+
+        results = {}
+        durations = {}
+
+        def optimize_group(i, group, pools):
+            start = time.time()
+            try:
+                results[i] = self.crush_compat_optimize_roots(
+                    '%s_%d' % (plan.name, i), ms, list(group), list(pools),
+                    orig_ws, orig_osd_weight, max_iterations, step,
+                    max_misplaced)
+            except Exception as e:
+                self.log.exception('Failed to optimize roots %s' % group)
+                results[i] = e
+            for root in group:
+                durations[root] = time.time() - start
+
+        start = time.time()
+        workers = []
+        for i, (group, pools) in enumerate(groups):
+            worker = Thread(target=optimize_group, args=(i, group, pools))
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        self.last_optimize_duration = time.time() - start
+        self.last_optimize_root_durations = durations
+        for root, duration in durations.iteritems():
+            self.log.info('Optimized root %s in %f seconds', root, duration)
+
+        # merge the weights found for each group of roots
+        best_ws = copy.deepcopy(orig_ws)
+        best_ow = copy.deepcopy(orig_osd_weight)
+        for i in range(len(groups)):
+            if isinstance(results[i], Exception):
+                return -errno.EINVAL, 'Failed to optimize roots %s: %s' % (
+                    list(groups[i][0]), results[i])
+            group_ws, group_ow = results[i]
+            best_ws.update({ osd: w for osd, w in group_ws.iteritems()
+                             if w != orig_ws.get(osd) })
+            best_ow.update({ osd: w for osd, w in group_ow.iteritems()
+                             if w != orig_osd_weight.get(osd) })
+        plan.compat_ws = best_ws
+        best_pe = self.calc_eval(plan.final_state(), plan.pools)
+
+        # allow a small regression if we are phasing out osd weights
+        fudge = 0
+        if best_ow != orig_osd_weight:
+            fudge = .001
+
+        if best_pe.score < pe.score + fudge:
+            self.log.info('Success, score %f -> %f', pe.score, best_pe.score)
+            plan.compat_ws = best_ws
+            for osd, w in best_ow.iteritems():
+                if w != orig_osd_weight[osd]:
+                    self.log.debug('osd.%d reweight %f', osd, w)
+                    plan.osd_weights[osd] = w
+            return 0, ''
+        else:
+            self.log.info('Failed to find further optimization, score %f',
+                          pe.score)
+            plan.compat_ws = {}
+            return -errno.EDOM, 'Unable to find further optimization, ' \
+                                'change balancer mode and retry might help'
+
+    def crush_compat_optimize_roots(self, name, ms, roots, pools, orig_ws,
+                                    orig_osd_weight, max_iterations, step,
+                                    max_misplaced):
+        """
+        Optimize the compat weight-set of the OSDs under the given roots,
+        which share no OSDs and no pools with any other root.
+
+        :return: a (weight-set, osd reweights) tuple with the best
+            weights found; only the weights of the OSDs under the
+            roots differ from the original ones
+        """
+        min_pg_per_osd = 2
+
+        plan = Plan(name, ms, pools)
+        plan.initial_compat_ws = orig_ws
+        poolids = set(p['pool'] for p in ms.pools if p['pool_name'] in pools)
+        crush = ms.osdmap.get_crush()
+        pe = self.calc_eval(ms, pools)
+
         key = 'pgs'  # pgs objects or bytes
 
         # go
@@ -852,7 +1169,7 @@ class Module(MgrModule):
             plan.compat_ws = copy.deepcopy(next_ws)
             next_ms = plan.final_state()
             next_pe = self.calc_eval(next_ms, plan.pools)
-            next_misplaced = next_ms.calc_misplaced_from(ms)
+            next_misplaced = next_ms.calc_misplaced_from(ms, poolids)
             self.log.debug('Step result score %f -> %f, misplacing %f',
                            best_pe.score, next_pe.score, next_misplaced)
 
@@ -880,31 +1197,15 @@ class Module(MgrModule):
                 else:
                     bad_steps = 0
                     best_pe = next_pe
-                    best_ws = next_ws
-                    best_ow = next_ow
+                    best_ws = copy.deepcopy(next_ws)
+                    best_ow = copy.deepcopy(next_ow)
                     if best_pe.score == 0:
                         break
             left -= 1
 
-        # allow a small regression if we are phasing out osd weights
-        fudge = 0
-        if next_ow != orig_osd_weight:
-            fudge = .001
-
-        if best_pe.score < pe.score + fudge:
-            self.log.info('Success, score %f -> %f', pe.score, best_pe.score)
-            plan.compat_ws = best_ws
-            for osd, w in best_ow.iteritems():
-                if w != orig_osd_weight[osd]:
-                    self.log.debug('osd.%d reweight %f', osd, w)
-                    plan.osd_weights[osd] = w
-            return 0, ''
-        else:
-            self.log.info('Failed to find further optimization, score %f',
-                          pe.score)
-            plan.compat_ws = {}
-            return -errno.EDOM, 'Unable to find further optimization, ' \
-                                'change balancer mode and retry might help'
+        if best_pe.score < pe.score:
+            return best_ws, best_ow
+        return orig_ws, orig_osd_weight
 
     def get_compat_weight_set_weights(self, ms):
         if not CRUSHMap.have_default_choose_args(ms.crush_dump):
@@ -39,7 +39,7 @@ class Osd(RESTController):
                 o['stats_history'][prop] = CephService.get_rates('osd', osd_spec, s)
             # Gauge stats
             for s in ['osd.numpg', 'osd.stat_bytes', 'osd.stat_bytes_used']:
-                o['stats'][s.split('.')[1]] = mgr.get_latest('osd', osd_spec, s)
+                o['stats'][s.split('.')[1]] = CephService.get_latest('osd', osd_spec, s)
         return list(osds.values())
 
     def get_osd_map(self):
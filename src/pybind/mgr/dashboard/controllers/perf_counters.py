@@ -10,7 +10,8 @@ class PerfCounter(RESTController):
     service_type = None  # type: str
 
     def get(self, service_id):
-        schema_dict = mgr.get_perf_schema(self.service_type, str(service_id))
+        schema_dict = mgr.get_perf_counters(self.service_type, str(service_id),
+                                            mgr.PRIO_DEBUGONLY)
         schema = schema_dict["{}.{}".format(self.service_type, service_id)]
         counters = []
 
@@ -24,8 +25,7 @@ class PerfCounter(RESTController):
                     self.service_type, service_id, key)
                 counter['unit'] = mgr._unit_to_str(value['units'])
             else:
-                counter['value'] = mgr.get_latest(
-                    self.service_type, service_id, key)
+                counter['value'] = value['value']
                 counter['unit'] = ''
             counters.append(counter)
 
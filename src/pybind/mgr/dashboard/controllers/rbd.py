@@ -5,6 +5,7 @@ from __future__ import absolute_import
 
 import math
 from functools import partial
+from multiprocessing.pool import ThreadPool
 
 import cherrypy
 import six
@@ -14,6 +15,8 @@ import rbd
 from . import ApiController, AuthRequired, RESTController, Task
 from .. import mgr
 from ..services.ceph_service import CephService
+from ..services.rbd import RbdDiskUsage
+from ..exceptions import DashboardException, ViewCacheNoDataException
 from ..tools import ViewCache
 from ..services.exception import handle_rados_error, handle_rbd_error, \
     serialize_dashboard_exception
@@ -126,31 +129,20 @@ class Rbd(RESTController):
     ALLOW_DISABLE_FEATURES = set(["exclusive-lock", "object-map", "fast-diff",
                                   "deep-flatten", "journaling"])
 
-    @classmethod
-    def _rbd_disk_usage(cls, image, snaps, whole_object=True):
-        class DUCallback(object):
-            def __init__(self):
-                self.used_size = 0
-
-            def __call__(self, offset, length, exists):
-                if exists:
-                    self.used_size += length
-
-        snap_map = {}
-        prev_snap = None
-        total_used_size = 0
-        for _, size, name in snaps:
-            image.set_snap(name)
-            du_callb = DUCallback()
-            image.diff_iterate(0, size, prev_snap, du_callb,
-                               whole_object=whole_object)
-            snap_map[name] = du_callb.used_size
-            total_used_size += du_callb.used_size
-            prev_snap = name
-
-        return total_used_size, snap_map
-
-    def _rbd_image(self, ioctx, pool_name, image_name):
+    # maximum number of images of a pool opened concurrently while listing
+    MAX_WORKERS = 8
+
+    # image keys the list can be sorted by
+    SORT_KEYS = set(["name", "id", "size", "obj_size", "num_objs", "order",
+                     "features", "timestamp", "data_pool", "stripe_count",
+                     "stripe_unit", "total_disk_usage", "disk_usage"])
+
+    def _rbd_image(self, ioctx, pool_name, image_name, disk_usage=True,
+                   pool_names=None):
+        """
+        :param pool_names: dict of pool id to pool name, looked up in the
+            OSD map if not given
+        """
         with rbd.Image(ioctx, image_name) as img:
             stat = img.stat()
             stat['name'] = image_name
@@ -170,8 +162,11 @@ class Rbd(RESTController):
             stat['stripe_count'] = img.stripe_count()
             stat['stripe_unit'] = img.stripe_unit()
 
-            data_pool_name = CephService.get_pool_name_from_id(
-                img.data_pool_id())
+            if pool_names is None:
+                data_pool_name = CephService.get_pool_name_from_id(
+                    img.data_pool_id())
+            else:
+                data_pool_name = pool_names.get(img.data_pool_id())
             if data_pool_name == pool_name:
                 data_pool_name = None
             stat['data_pool'] = data_pool_name
@@ -203,47 +198,151 @@ class Rbd(RESTController):
                     })
                 stat['snapshots'].append(snap)
 
-            # disk usage
-            img_flags = img.flags()
-            if 'fast-diff' in stat['features_name'] and \
-                    not rbd.RBD_FLAG_FAST_DIFF_INVALID & img_flags:
-                snaps = [(s['id'], s['size'], s['name'])
-                         for s in stat['snapshots']]
-                snaps.sort(key=lambda s: s[0])
-                snaps += [(snaps[-1][0]+1 if snaps else 0, stat['size'], None)]
-                total_prov_bytes, snaps_prov_bytes = self._rbd_disk_usage(
-                    img, snaps, True)
-                stat['total_disk_usage'] = total_prov_bytes
-                for snap, prov_bytes in snaps_prov_bytes.items():
-                    if snap is None:
-                        stat['disk_usage'] = prov_bytes
-                        continue
-                    for ss in stat['snapshots']:
-                        if ss['name'] == snap:
-                            ss['disk_usage'] = prov_bytes
-                            break
-            else:
-                stat['total_disk_usage'] = None
-                stat['disk_usage'] = None
+            if disk_usage:
+                self._rbd_image_disk_usage(img, stat)
 
             return stat
 
+    @classmethod
+    def _rbd_image_disk_usage(cls, img, stat):
+        img_flags = img.flags()
+        if 'fast-diff' in stat['features_name'] and \
+                not rbd.RBD_FLAG_FAST_DIFF_INVALID & img_flags:
+            usage = RbdDiskUsage.calc(stat['pool_name'], img, stat['snapshots'],
+                                      stat['size'])
+            stat['total_disk_usage'] = usage['total_disk_usage']
+            stat['disk_usage'] = usage['disk_usage']
+            stat['disk_usage_timestamp'] = usage['timestamp']
+            for ss in stat['snapshots']:
+                ss['disk_usage'] = usage['snapshots'].get(ss['name'])
+        else:
+            stat['total_disk_usage'] = None
+            stat['disk_usage'] = None
+            stat['disk_usage_timestamp'] = None
+
+    @classmethod
+    def _rbd_pool_map(cls, pool_name, func):
+        """
+        Calls `func(ioctx, image_name)` for every image of the pool, on at
+        most `MAX_WORKERS` threads sharing the pool's ioctx.
+
+        :return: the results of the images that still exist, in the order
+            of `RBD().list()`
+        """
+        def _call(name):
+            try:
+                return func(ioctx, name)
+            except rbd.ImageNotFound:
+                # may have been removed in the meanwhile
+                return None
+
+        with mgr.rados.open_ioctx(pool_name) as ioctx:
+            names = rbd.RBD().list(ioctx)
+            if not names:
+                return []
+            workers = ThreadPool(min(cls.MAX_WORKERS, len(names)))
+            try:
+                result = workers.map(_call, names)
+            finally:
+                workers.terminate()
+        return [r for r in result if r is not None]
+
     @ViewCache()
     def _rbd_pool_list(self, pool_name):
-        rbd_inst = rbd.RBD()
-        with mgr.rados.open_ioctx(pool_name) as ioctx:
-            names = rbd_inst.list(ioctx)
-            result = []
-            for name in names:
-                try:
-                    stat = self._rbd_image(ioctx, pool_name, name)
-                except rbd.ImageNotFound:
-                    # may have been removed in the meanwhile
-                    continue
-                result.append(stat)
-            return result
-
-    def _rbd_list(self, pool_name=None):
+        pool_names = dict((p['pool'], p['pool_name']) for p in CephService.get_pool_list())
+        return self._rbd_pool_map(
+            pool_name, lambda ioctx, name: self._rbd_image(ioctx, pool_name, name,
+                                                           disk_usage=False,
+                                                           pool_names=pool_names))
+
+    @ViewCache(timeout=0)
+    def _rbd_pool_disk_usage(self, pool_name):
+        """
+        Computing the disk usage requires iterating over the diffs of the
+        new snapshots and of the HEAD of every image, which may take much
+        longer than listing the images, so it is cached separately and never
+        waited for.
+
+        :return: dict of image id to a stat dict only containing the disk
+            usage keys
+        """
+        def _image_disk_usage(ioctx, name):
+            with rbd.Image(ioctx, name, read_only=True) as img:
+                stat = {
+                    'pool_name': pool_name,
+                    'features_name': _format_bitmask(img.features()),
+                    'size': img.size(),
+                    'snapshots': list(img.list_snaps())
+                }
+                self._rbd_image_disk_usage(img, stat)
+                return img.id(), stat
+
+        disk_usage = dict(self._rbd_pool_map(pool_name, _image_disk_usage))
+        RbdDiskUsage.prune(pool_name, disk_usage.keys())
+        return disk_usage
+
+    def _rbd_pool_list_with_disk_usage(self, pool_name):
+        # pylint: disable=unbalanced-tuple-unpacking
+        status, value = self._rbd_pool_list(pool_name)
+        try:
+            _, disk_usage = self._rbd_pool_disk_usage(pool_name)
+        except ViewCacheNoDataException:
+            disk_usage = {}
+
+        result = []
+        for image in value:
+            # do not modify the cached image list
+            stat = dict(image)
+            usage = disk_usage.get(stat['id'], {})
+            stat['total_disk_usage'] = usage.get('total_disk_usage')
+            stat['disk_usage'] = usage.get('disk_usage')
+            stat['disk_usage_timestamp'] = usage.get('disk_usage_timestamp')
+            snaps_usage = dict((snap['name'], snap.get('disk_usage'))
+                               for snap in usage.get('snapshots', []))
+            stat['snapshots'] = [dict(snap, disk_usage=snaps_usage.get(snap['name']))
+                                 for snap in stat['snapshots']]
+            result.append(stat)
+        return status, result
+
+    @staticmethod
+    def _count_param(name, value):
+        if value is None or value == '':
+            return None
+        try:
+            count = int(value)
+        except (TypeError, ValueError):
+            count = -1
+        if count < 0:
+            raise DashboardException(code='invalid_{}'.format(name),
+                                     msg="Invalid {} {}".format(name, value),
+                                     component='rbd')
+        return count
+
+    @classmethod
+    def _paginate(cls, images, offset, limit, sort):
+        """
+        :param sort: name of the key to sort by, prefixed with '-' for
+            descending order.  Images without a value for the key (e.g.
+            whose disk usage is unknown yet) come last.
+        """
+        offset = cls._count_param('offset', offset) or 0
+        limit = cls._count_param('limit', limit)
+        if sort:
+            key = sort[1:] if sort.startswith('-') else sort
+            if key not in cls.SORT_KEYS:
+                raise DashboardException(code='invalid_sort_key',
+                                         msg="Invalid sort key {}".format(key),
+                                         component='rbd')
+            images = sorted([image for image in images
+                             if image.get(key) is not None],
+                            key=lambda image: image[key],
+                            reverse=sort.startswith('-')) + \
+                [image for image in images if image.get(key) is None]
+        if limit is not None:
+            return images[offset:offset + limit]
+        return images[offset:]
+
+    def _rbd_list(self, pool_name=None, offset=None, limit=None, sort=None):
         if pool_name:
             pools = [pool_name]
         else:
@@ -252,23 +351,33 @@ class Rbd(RESTController):
         result = []
         for pool in pools:
             # pylint: disable=unbalanced-tuple-unpacking
-            status, value = self._rbd_pool_list(pool)
-            result.append({'status': status, 'value': value, 'pool_name': pool})
+            status, value = self._rbd_pool_list_with_disk_usage(pool)
+            result.append({'status': status,
+                           'value': self._paginate(value, offset, limit, sort),
+                           'total': len(value),
+                           'pool_name': pool})
         return result
 
     @handle_rbd_error()
     @handle_rados_error('pool')
-    def list(self, pool_name=None):
-        return self._rbd_list(pool_name)
+    def list(self, pool_name=None, offset=None, limit=None, sort=None):
+        """
+        :param offset: index of the first image returned for each pool
+        :param limit: maximum number of images returned for each pool
+        :param sort: image key to sort by, e.g. 'name' or '-size'
+        """
+        return self._rbd_list(pool_name, offset, limit, sort)
 
     @handle_rbd_error()
     @handle_rados_error('pool')
     def get(self, pool_name, image_name):
         ioctx = mgr.rados.open_ioctx(pool_name)
         try:
-            return self._rbd_image(ioctx, pool_name, image_name)
+            stat = self._rbd_image(ioctx, pool_name, image_name)
         except rbd.ImageNotFound:
             raise cherrypy.HTTPError(404)
+        RbdDiskUsage.save(pool_name)
+        return stat
 
     @RbdTask('create',
              {'pool_name': '{pool_name}', 'image_name': '{name}'}, 2.0)
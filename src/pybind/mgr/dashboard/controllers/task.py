@@ -12,5 +12,6 @@ class Task(RESTController):
         executing_t, finished_t = TaskManager.list_serializable(name)
         return {
             'executing_tasks': executing_t,
-            'finished_tasks': finished_t
+            'finished_tasks': finished_t,
+            'progress': TaskManager.aggregate_progress(name)
         }
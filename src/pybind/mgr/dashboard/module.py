@@ -5,6 +5,7 @@ openATTIC mgr plugin (based on CherryPy)
 from __future__ import absolute_import
 
 import errno
+import json
 from distutils.version import StrictVersion
 import os
 import socket
@@ -60,7 +61,8 @@ from . import logger, mgr
 from .controllers import generate_routes, json_error_page
 from .controllers.auth import Auth
 from .tools import SessionExpireAtBrowserCloseTool, NotificationQueue, \
-                   RequestLoggingTool, TaskManager
+                   RequestLoggingTool, TaskManager, ViewCache
+from .services.ceph_service import TimeSeriesStore
 from .services.exception import dashboard_exception_handler
 from .settings import options_command_list, options_schema_list, \
                       handle_option_command
@@ -225,6 +227,11 @@ class Module(MgrModule, SSLCherryPyConfig):
             "desc": "Create self signed certificate",
             "perm": "w"
         },
+        {
+            "cmd": "dashboard get-view-cache-stats",
+            "desc": "Show the statistics of the dashboard view caches",
+            "perm": "r"
+        },
     ]
     COMMANDS.extend(options_command_list())
 
@@ -294,6 +301,7 @@ class Module(MgrModule, SSLCherryPyConfig):
 
         cherrypy.engine.start()
         NotificationQueue.start_queue()
+        NotificationQueue.register(TimeSeriesStore.update, 'pg_summary')
         TaskManager.init()
         logger.info('Engine started.')
         # wait for the shutdown event
@@ -325,6 +333,8 @@ class Module(MgrModule, SSLCherryPyConfig):
         elif cmd['prefix'] == 'dashboard create-self-signed-cert':
             self.create_self_signed_cert()
             return 0, 'Self-signed certificate created', ''
+        elif cmd['prefix'] == 'dashboard get-view-cache-stats':
+            return 0, json.dumps(ViewCache.all_stats(), indent=2), ''
 
         return (-errno.EINVAL, '', 'Command not found \'{0}\''
                 .format(cmd['prefix']))
@@ -2,8 +2,7 @@
 from __future__ import absolute_import
 
 import time
-import collections
-from collections import defaultdict
+import threading
 import json
 
 import rados
@@ -20,6 +19,7 @@ except ImportError:
         return zip(a, b)
 
 from .. import logger, mgr
+from ..tools import TimeSeries
 
 
 class SendCommandError(rados.Error):
@@ -86,37 +86,22 @@ class CephService(object):
 
     @classmethod
     def get_pool_list_with_stats(cls, application=None):
-        # pylint: disable=too-many-locals
         pools = cls.get_pool_list(application)
 
         pools_w_stats = []
 
         pg_summary = mgr.get("pg_summary")
-        pool_stats = defaultdict(lambda: defaultdict(
-            lambda: collections.deque(maxlen=10)))
-
-        df = mgr.get("df")
-        pool_stats_dict = dict([(p['id'], p['stats']) for p in df['pools']])
-        now = time.time()
-        for pool_id, stats in pool_stats_dict.items():
-            for stat_name, stat_val in stats.items():
-                pool_stats[pool_id][stat_name].appendleft((now, stat_val))
+        if not TimeSeriesStore.has_samples('pool'):
+            TimeSeriesStore.update()
 
         for pool in pools:
             pool['pg_status'] = pg_summary['by_pool'][pool['pool'].__str__()]
-            stats = pool_stats[pool['pool']]
             s = {}
-
-            def get_rate(series):
-                if len(series) >= 2:
-                    return differentiate(*series[0:1])
-                return 0
-
-            for stat_name, stat_series in stats.items():
+            for stat_name, series in TimeSeriesStore.get_all('pool', pool['pool']).items():
                 s[stat_name] = {
-                    'latest': stat_series[0][1],
-                    'rate': get_rate(stat_series),
-                    'series': [i for i in stat_series]
+                    'latest': series.latest(),
+                    'rate': series.rate(),
+                    'series': series.series()
                 }
             pool['stats'] = s
             pools_w_stats.append(pool)
@@ -174,6 +159,9 @@ class CephService(object):
         """
         :return: the derivative of mgr.get_counter()
         :rtype: list[tuple[int, float]]"""
+        series = TimeSeriesStore.get(svc_type, svc_name, path)
+        if series is not None:
+            return series.rates()
         data = mgr.get_counter(svc_type, svc_name, path)[path]
         if not data:
             return [(0, 0.0)]
@@ -184,12 +172,94 @@ class CephService(object):
     @classmethod
     def get_rate(cls, svc_type, svc_name, path):
         """returns most recent rate"""
+        series = TimeSeriesStore.get(svc_type, svc_name, path)
+        if series is not None:
+            return series.rate()
         data = mgr.get_counter(svc_type, svc_name, path)[path]
 
         if data and len(data) > 1:
             return differentiate(*data[-2:])
         return 0.0
 
+    @classmethod
+    def get_latest(cls, svc_type, svc_name, path):
+        """returns most recent value"""
+        series = TimeSeriesStore.get(svc_type, svc_name, path)
+        if series is not None:
+            return series.latest()
+        return mgr.get_latest(svc_type, svc_name, path)
+
+
+class TimeSeriesStore(object):
+    """
+    Keeps the recent history of the pool statistics and of the OSD perf
+    counters used by the dashboard in fixed size ring buffers.
+
+    The store is refreshed on every ``pg_summary`` notification, i.e. each
+    time the mgr has received a new digest, so the REST controllers are
+    able to compute rates without having to keep state between requests.
+    """
+    SIZE = 20
+
+    OSD_COUNTERS = ['osd.op_w', 'osd.op_in_bytes', 'osd.op_r', 'osd.op_out_bytes',
+                    'osd.numpg', 'osd.stat_bytes', 'osd.stat_bytes_used']
+
+    _lock = threading.Lock()
+    _series = {}  # (svc_type, svc_name) -> {path: TimeSeries}
+
+    @classmethod
+    def _append(cls, seen, svc_key, path, timestamp, value):
+        svc_series = cls._series.setdefault(svc_key, {})
+        series = svc_series.get(path)
+        if series is None:
+            series = TimeSeries(cls.SIZE)
+            svc_series[path] = series
+        series.append(timestamp, value)
+        seen.add(svc_key)
+
+    @classmethod
+    def update(cls, _notify_id=None):
+        now = time.time()
+        df = mgr.get('df')
+        counters = mgr.get_latest_counters('osd', '', mgr.PRIO_USEFUL)
+        with cls._lock:
+            seen = set()
+            for pool in df['pools']:
+                svc_key = ('pool', str(pool['id']))
+                for stat_name, stat_val in pool['stats'].items():
+                    cls._append(seen, svc_key, stat_name, now, stat_val)
+            for svc_full_name, latest in counters.items():
+                svc_key = ('osd', svc_full_name.split('.', 1)[1])
+                for path in cls.OSD_COUNTERS:
+                    datapoint = latest.get(path)
+                    if datapoint is None or not datapoint[0]:
+                        continue
+                    cls._append(seen, svc_key, path, datapoint[0], datapoint[1])
+            for svc_key in set(cls._series) - seen:
+                del cls._series[svc_key]
+
+    @classmethod
+    def has_samples(cls, svc_type):
+        with cls._lock:
+            return any(svc_key[0] == svc_type for svc_key in cls._series)
+
+    @classmethod
+    def get(cls, svc_type, svc_name, path):
+        """
+        :rtype: TimeSeries | None
+        """
+        with cls._lock:
+            return cls._series.get((svc_type, str(svc_name)), {}).get(path)
+
+    @classmethod
+    def get_all(cls, svc_type, svc_name):
+        """
+        :return: dict of path to series of the given service
+        :rtype: dict[str, TimeSeries]
+        """
+        with cls._lock:
+            return dict(cls._series.get((svc_type, str(svc_name)), {}))
+
 
 def differentiate(data1, data2):
     """
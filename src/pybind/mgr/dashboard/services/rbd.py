@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import json
+import threading
+from datetime import datetime
+
+from .. import logger, mgr
+
+
+class RbdDiskUsage(object):
+    """
+    Computes the disk usage of RBD images and of their snapshots.
+
+    The usage of a snapshot is the size of its diff against the previous
+    snapshot, which does not change as long as both snapshots exist.  It is
+    therefore only computed once per (pool, image id, snapshot id) and kept
+    in the module's store, so that only new snapshots and the image HEAD
+    have to be diffed on later calls, even after a mgr failover.
+
+    Each store write waits for the monitors, so the usage of all the
+    images of a pool is kept under a single key, written by `save()` once
+    the images were gone through rather than once per image.
+    """
+    STORE_PREFIX = 'rbd_disk_usage/'
+
+    _lock = threading.Lock()
+    # serializes the writes, so that the latest state is stored last
+    _save_lock = threading.Lock()
+    # (pool_name, image_id) -> {snap_id: (prev_snap_id, used_bytes)}
+    _snaps = {}
+    _loaded_pools = set()
+    # pools whose usage changed since it was last saved
+    _dirty_pools = set()
+
+    class DUCallback(object):
+        def __init__(self):
+            self.used_size = 0
+
+        def __call__(self, offset, length, exists):
+            if exists:
+                self.used_size += length
+
+    @classmethod
+    def _store_key(cls, pool_name):
+        return '{}{}'.format(cls.STORE_PREFIX, pool_name)
+
+    @classmethod
+    def _load(cls, pool_name):
+        # called with cls._lock held
+        if pool_name in cls._loaded_pools:
+            return
+        value = mgr.get_store(cls._store_key(pool_name))
+        try:
+            images = json.loads(value) if value else {}
+        except ValueError:
+            logger.warning('RBD: ignoring invalid disk usage of pool %s', pool_name)
+            images = {}
+        for image_id, snaps in images.items():
+            cls._snaps[(pool_name, image_id)] = dict(
+                (int(snap_id), tuple(usage)) for snap_id, usage in snaps.items())
+        cls._loaded_pools.add(pool_name)
+
+    @classmethod
+    def save(cls, pool_name):
+        """
+        Stores the usage of the snapshots of the images of the pool, if it
+        changed since the last call.
+        """
+        with cls._save_lock:
+            with cls._lock:
+                if pool_name not in cls._dirty_pools:
+                    return
+                cls._dirty_pools.discard(pool_name)
+                images = dict(
+                    (image_id, dict((str(snap_id), usage)
+                                    for snap_id, usage in snaps.items()))
+                    for (pool, image_id), snaps in cls._snaps.items()
+                    if pool == pool_name)
+            mgr.set_store(cls._store_key(pool_name),
+                          json.dumps(images) if images else None)
+
+    @classmethod
+    def _diff_usage(cls, img, snap_name, size, prev_snap_name):
+        img.set_snap(snap_name)
+        du_callb = cls.DUCallback()
+        img.diff_iterate(0, size, prev_snap_name, du_callb, whole_object=True)
+        return du_callb.used_size
+
+    @classmethod
+    def calc(cls, pool_name, img, snapshots, size):
+        """
+        :param img: the open image, must have the fast-diff feature enabled
+        :param snapshots: the snapshots of the image, as returned by
+            `img.list_snaps()`
+        :param size: the size of the image HEAD
+        :return: a dict with the `total_disk_usage` and `disk_usage` (HEAD)
+            of the image, the usage of each snapshot by name in
+            `snapshots`, and the time of the computation in `timestamp`
+        """
+        image_id = img.id()
+        with cls._lock:
+            cls._load(pool_name)
+            cached = dict(cls._snaps.get((pool_name, image_id), {}))
+
+        snaps = {}
+        snaps_usage = {}
+        prev_snap = None
+        for snap in sorted(snapshots, key=lambda s: s['id']):
+            prev_snap_id = prev_snap['id'] if prev_snap else None
+            usage = cached.get(snap['id'])
+            if usage is None or usage[0] != prev_snap_id:
+                used_bytes = cls._diff_usage(img, snap['name'], snap['size'],
+                                             prev_snap['name'] if prev_snap else None)
+                usage = (prev_snap_id, used_bytes)
+            snaps[snap['id']] = usage
+            snaps_usage[snap['name']] = usage[1]
+            prev_snap = snap
+
+        head_usage = cls._diff_usage(img, None, size,
+                                     prev_snap['name'] if prev_snap else None)
+
+        if snaps != cached:
+            with cls._lock:
+                cls._snaps[(pool_name, image_id)] = snaps
+                cls._dirty_pools.add(pool_name)
+
+        return {
+            'total_disk_usage': head_usage + sum(snaps_usage.values()),
+            'disk_usage': head_usage,
+            'snapshots': snaps_usage,
+            'timestamp': "{}Z".format(datetime.utcnow().isoformat())
+        }
+
+    @classmethod
+    def prune(cls, pool_name, image_ids):
+        """
+        Forgets the snapshots of the images of the pool that are not in
+        `image_ids` anymore, and saves the usage of the pool.
+        """
+        image_ids = set(image_ids)
+        with cls._lock:
+            cls._load(pool_name)
+            removed = [key for key in cls._snaps
+                       if key[0] == pool_name and key[1] not in image_ids]
+            for key in removed:
+                del cls._snaps[key]
+            if removed:
+                cls._dirty_pools.add(pool_name)
+        cls.save(pool_name)
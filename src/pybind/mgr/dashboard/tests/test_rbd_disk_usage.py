@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import json
+import unittest
+
+from .. import mgr
+from ..services.rbd import RbdDiskUsage
+
+
+class FakeImage(object):
+    """
+    Image whose diffs are `used` bytes per snapshot name (None for HEAD)
+    """
+    def __init__(self, image_id, used):
+        self._id = image_id
+        self._used = used
+        self._snap = None
+        self.diffs = []
+
+    def id(self):
+        return self._id
+
+    def set_snap(self, name):
+        self._snap = name
+
+    def diff_iterate(self, offset, length, from_snapshot, iterate_cb, whole_object=False):
+        self.diffs.append((from_snapshot, self._snap))
+        iterate_cb(offset, self._used[self._snap], True)
+
+
+class RbdDiskUsageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = {}
+        mgr.get_store.side_effect = lambda key, default=None: self.store.get(key, default)
+        mgr.set_store.side_effect = self._set_store
+        mgr.set_store.reset_mock()
+        RbdDiskUsage._snaps = {}
+        RbdDiskUsage._loaded_pools = set()
+        RbdDiskUsage._dirty_pools = set()
+
+    def tearDown(self):
+        mgr.get_store.side_effect = None
+        mgr.set_store.side_effect = None
+
+    def _set_store(self, key, value):
+        if value is None:
+            self.store.pop(key, None)
+        else:
+            self.store[key] = value
+
+    @staticmethod
+    def _snaps(*names):
+        return [{'id': i, 'name': name, 'size': 100} for i, name in enumerate(names)]
+
+    def test_calc(self):
+        img = FakeImage('abc', {'s1': 10, 's2': 20, None: 5})
+        usage = RbdDiskUsage.calc('rbd', img, self._snaps('s1', 's2'), 100)
+        self.assertEqual(usage['total_disk_usage'], 35)
+        self.assertEqual(usage['disk_usage'], 5)
+        self.assertEqual(usage['snapshots'], {'s1': 10, 's2': 20})
+        self.assertIn('timestamp', usage)
+        self.assertEqual(img.diffs, [(None, 's1'), ('s1', 's2'), ('s2', None)])
+        self.assertEqual(self.store, {})
+        RbdDiskUsage.save('rbd')
+        self.assertEqual(json.loads(self.store['rbd_disk_usage/rbd']),
+                         {'abc': {'0': [None, 10], '1': [0, 20]}})
+
+    def test_only_new_snapshots_and_head(self):
+        img = FakeImage('abc', {'s1': 10, 's2': 20, 's3': 30, None: 5})
+        RbdDiskUsage.calc('rbd', img, self._snaps('s1', 's2'), 100)
+        img.diffs = []
+        usage = RbdDiskUsage.calc('rbd', img, self._snaps('s1', 's2', 's3'), 100)
+        self.assertEqual(img.diffs, [('s2', 's3'), ('s3', None)])
+        self.assertEqual(usage['total_disk_usage'], 65)
+
+    def test_removed_previous_snapshot(self):
+        img = FakeImage('abc', {'s1': 10, 's2': 20, 's3': 30, None: 5})
+        snaps = self._snaps('s1', 's2', 's3')
+        RbdDiskUsage.calc('rbd', img, snaps, 100)
+        img.diffs = []
+        del snaps[1]
+        RbdDiskUsage.calc('rbd', img, snaps, 100)
+        self.assertEqual(img.diffs, [('s1', 's3'), ('s3', None)])
+
+    def test_persisted(self):
+        img = FakeImage('abc', {'s1': 10, None: 5})
+        RbdDiskUsage.calc('rbd', img, self._snaps('s1'), 100)
+        RbdDiskUsage.save('rbd')
+        # e.g. after a mgr failover
+        RbdDiskUsage._snaps = {}
+        RbdDiskUsage._loaded_pools = set()
+        img.diffs = []
+        usage = RbdDiskUsage.calc('rbd', img, self._snaps('s1'), 100)
+        self.assertEqual(img.diffs, [('s1', None)])
+        self.assertEqual(usage['snapshots'], {'s1': 10})
+
+    def test_prune(self):
+        RbdDiskUsage.calc('rbd', FakeImage('abc', {'s1': 10, None: 5}), self._snaps('s1'), 100)
+        RbdDiskUsage.calc('rbd', FakeImage('def', {'s1': 10, None: 5}), self._snaps('s1'), 100)
+        RbdDiskUsage.calc('other', FakeImage('abc', {None: 5}), self._snaps(), 100)
+        RbdDiskUsage.prune('rbd', ['def'])
+        self.assertEqual(mgr.set_store.call_count, 1)
+        self.assertEqual(list(self.store.keys()), ['rbd_disk_usage/rbd'])
+        self.assertEqual(json.loads(self.store['rbd_disk_usage/rbd']),
+                         {'def': {'0': [None, 10]}})
+        # nothing changed since
+        RbdDiskUsage.prune('rbd', ['def'])
+        self.assertEqual(mgr.set_store.call_count, 1)
+        RbdDiskUsage.prune('rbd', [])
+        self.assertEqual(self.store, {})
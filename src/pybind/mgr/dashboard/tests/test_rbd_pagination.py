@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import unittest
+
+from ..controllers.rbd import Rbd
+from ..exceptions import DashboardException
+
+
+class RbdPaginationTest(unittest.TestCase):
+    images = [
+        {'name': 'b', 'size': 2, 'disk_usage': 10},
+        {'name': 'a', 'size': 3, 'disk_usage': None},
+        {'name': 'c', 'size': 1, 'disk_usage': 5},
+    ]
+
+    def names(self, offset=None, limit=None, sort=None):
+        return [image['name']
+                for image in Rbd._paginate(self.images, offset, limit, sort)]
+
+    def test_sort(self):
+        self.assertEqual(self.names(sort='name'), ['a', 'b', 'c'])
+        self.assertEqual(self.names(sort='-size'), ['a', 'b', 'c'])
+
+    def test_sort_none_last(self):
+        self.assertEqual(self.names(sort='disk_usage'), ['c', 'b', 'a'])
+        self.assertEqual(self.names(sort='-disk_usage'), ['b', 'c', 'a'])
+
+    def test_sort_bad_key(self):
+        with self.assertRaises(DashboardException) as ctx:
+            self.names(sort='-no_such_key')
+        self.assertEqual(ctx.exception.status, 400)
+
+    def test_offset_limit(self):
+        self.assertEqual(self.names(offset='1', limit='1', sort='name'), ['b'])
+        self.assertEqual(self.names(offset=2, sort='name'), ['c'])
+        self.assertEqual(self.names(limit='', sort='name'), ['a', 'b', 'c'])
+        self.assertEqual(self.names(limit='0', sort='name'), [])
+        self.assertEqual(self.names(offset=1, limit=0), [])
+
+    def test_bad_offset_limit(self):
+        for offset, limit in [('x', None), ('-1', None), (None, '1.5'),
+                              (None, '-2')]:
+            with self.assertRaises(DashboardException) as ctx:
+                self.names(offset=offset, limit=limit)
+            self.assertEqual(ctx.exception.status, 400)
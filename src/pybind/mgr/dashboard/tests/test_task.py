@@ -9,7 +9,7 @@ from collections import defaultdict
 from functools import partial
 
 from ..services.exception import serialize_dashboard_exception
-from ..tools import NotificationQueue, TaskManager, TaskExecutor
+from ..tools import NotificationQueue, TaskManager, TaskExecutor, ThreadedExecutor
 
 
 class MyTask(object):
@@ -285,11 +285,12 @@ class TaskTest(unittest.TestCase):
             self.fail("Failed to serialize finished tasks: {}".format(str(ex)))
 
         # validate executing tasks attributes
-        self.assertEqual(len(ex_t[0].keys()), 4)
+        self.assertEqual(len(ex_t[0].keys()), 5)
         self.assertEqual(ex_t[0]['name'], 'test8/task1')
         self.assertEqual(ex_t[0]['metadata'], task1.metadata())
         self.assertIsNotNone(ex_t[0]['begin_time'])
         self.assertEqual(ex_t[0]['progress'], 20)
+        self.assertEqual(ex_t[0]['state'], TaskManager.VALUE_EXECUTING)
         # validate finished tasks attributes
         self.assertEqual(len(fn_t[0].keys()), 9)
         self.assertEqual(fn_t[0]['name'], 'test8/task2')
@@ -367,6 +368,35 @@ class TaskTest(unittest.TestCase):
         self.assertIsNone(fn_t[0].ret_value)
         self.assertEqual(str(fn_t[0].exception), "Task Unexpected Exception")
 
+    def test_queued_tasks(self):
+        ThreadedExecutor.CONCURRENCY = {'test16/*': 1}
+        try:
+            task1 = MyTask(0, wait=True, progress=40)
+            task2 = MyTask(0, wait=True, progress=60)
+            state, _ = task1.run('test16/task', 0.5)
+            self.assertEqual(state, TaskManager.VALUE_EXECUTING)
+            state, _ = task2.run('test16/task', 0.5)
+            self.assertEqual(state, TaskManager.VALUE_EXECUTING)
+            ex_t, _ = TaskManager.list_serializable('test16/*')
+            states = dict((t['metadata']['progress'], t['state']) for t in ex_t)
+            self.assertEqual(states, {40: TaskManager.VALUE_EXECUTING,
+                                      60: TaskManager.VALUE_QUEUED})
+            self.assertEqual(TaskManager.aggregate_progress('test16/*'), {
+                'test16/task': {'queued': 1, 'executing': 1, 'progress': 20}
+            })
+            task2.resume()
+            task1.resume()
+            self.wait_for_task('test16/task')
+            for _ in range(50):
+                ex_t, fn_t = TaskManager.list('test16/*')
+                if not ex_t:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(len(ex_t), 0)
+            self.assertEqual(len(fn_t), 2)
+        finally:
+            ThreadedExecutor.CONCURRENCY = {}
+
     def test_task_serialization_format_on_failure(self):
         task1 = MyTask(1, fail=True)
         task1.run('test14/task1', 0.5)
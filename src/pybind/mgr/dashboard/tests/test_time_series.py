@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import unittest
+
+from ..tools import TimeSeries
+
+
+class TimeSeriesTest(unittest.TestCase):
+
+    def test_empty(self):
+        series = TimeSeries(3)
+        self.assertEqual(len(series), 0)
+        self.assertEqual(series.latest(), 0)
+        self.assertEqual(series.rate(), 0.0)
+        self.assertEqual(series.rates(), [(0, 0.0)])
+        self.assertEqual(series.series(), [])
+
+    def test_single_sample(self):
+        series = TimeSeries(3)
+        series.append(10, 5)
+        self.assertEqual(series.latest(), 5)
+        self.assertEqual(series.rate(), 0.0)
+        self.assertEqual(series.rates(), [(10, 0.0)])
+
+    def test_rates(self):
+        series = TimeSeries(3)
+        series.append(10, 100)
+        series.append(12, 110)
+        series.append(14, 130)
+        self.assertEqual(series.rate(), 10.0)
+        self.assertEqual(series.rates(), [(12, 5.0), (14, 10.0)])
+        self.assertEqual(series.series(), [(14, 130), (12, 110), (10, 100)])
+
+    def test_wrap_around(self):
+        series = TimeSeries(3)
+        for t in range(1, 6):
+            series.append(t, t * 10)
+        self.assertEqual(len(series), 3)
+        self.assertEqual(series.latest(), 50)
+        self.assertEqual(series.series(), [(5, 50), (4, 40), (3, 30)])
+        self.assertEqual(series.rates(), [(4, 10.0), (5, 10.0)])
+
+    def test_ignore_stale_sample(self):
+        series = TimeSeries(3)
+        series.append(10, 1)
+        series.append(10, 2)
+        series.append(9, 3)
+        self.assertEqual(series.series(), [(10, 1)])
+
+    def test_float_values(self):
+        series = TimeSeries(3)
+        series.append(1, 1)
+        series.append(2, 1.5)
+        self.assertEqual(series.series(), [(2, 1.5), (1, 1)])
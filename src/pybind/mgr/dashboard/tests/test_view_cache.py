@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+from ..exceptions import ViewCacheNoDataException
+from ..tools import ViewCache
+
+
+class ViewCacheTest(unittest.TestCase):
+
+    def test_hit(self):
+        vc = ViewCache(timeout=5)
+
+        @vc
+        def _get(x):
+            return x * 2
+
+        self.assertEqual(_get(2), (ViewCache.VALUE_OK, 4))
+        self.assertEqual(_get(2), (ViewCache.VALUE_OK, 4))
+        stats = vc.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertTrue(stats['name'].endswith('_get'))
+
+    def test_no_data(self):
+        vc = ViewCache(timeout=0)
+        ev = threading.Event()
+
+        @vc
+        def _get():
+            ev.wait()
+
+        with self.assertRaises(ViewCacheNoDataException):
+            _get()
+        ev.set()
+        self.assertEqual(vc.stats()['no_data'], 1)
+
+    def test_error(self):
+        vc = ViewCache(timeout=5)
+
+        @vc
+        def _get():
+            raise ValueError('hi')
+
+        with self.assertRaises(ValueError):
+            _get()
+        self.assertEqual(vc.stats()['errors'], 1)
+
+    def test_max_entries(self):
+        vc = ViewCache(timeout=5, max_entries=2)
+
+        @vc
+        def _get(x):
+            return x
+
+        _get(1)
+        _get(2)
+        _get(1)
+        _get(3)
+        self.assertEqual(list(vc.cache_by_args.keys()), [(1,), (3,)])
+        self.assertEqual(vc.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        vc = ViewCache(timeout=5, ttl=0.1)
+
+        @vc
+        def _get(x):
+            return x
+
+        _get(1)
+        time.sleep(0.2)
+        _get(2)
+        self.assertEqual(list(vc.cache_by_args.keys()), [(2,)])
+
+    def test_worker_pool_bounded(self):
+        vc = ViewCache(timeout=0)
+        ev = threading.Event()
+
+        @vc
+        def _get(_x):
+            ev.wait()
+
+        for x in range(ViewCache.WorkerPool.MAX_WORKERS * 2):
+            with self.assertRaises(ViewCacheNoDataException):
+                _get(x)
+        self.assertLessEqual(ViewCache.WorkerPool._workers,
+                             ViewCache.WorkerPool.MAX_WORKERS)
+        ev.set()
+
+    def test_all_stats(self):
+        vc = ViewCache()
+
+        @vc
+        def _get():
+            return 1
+
+        _get()
+        self.assertIn(vc.stats(), ViewCache.all_stats())
@@ -6,11 +6,13 @@ import inspect
 import functools
 
 import collections
+from array import array
 from datetime import datetime, timedelta
 import fnmatch
 import time
 import threading
 import socket
+import weakref
 from six.moves import urllib
 import cherrypy
 
@@ -102,13 +104,26 @@ class RequestLoggingTool(cherrypy.Tool):
 
 # pylint: disable=too-many-instance-attributes
 class ViewCache(object):
+    """
+    Decorator caching the return value of a function per positional
+    arguments.  Values are refreshed in the background by a shared pool of
+    worker threads, the number of cached argument tuples is bounded and
+    entries that have not been accessed for `ttl` seconds are evicted.
+    """
     VALUE_OK = 0
     VALUE_STALE = 1
     VALUE_NONE = 2
 
-    class GetterThread(threading.Thread):
+    MAX_ENTRIES = 128
+    TTL = 300.0
+
+    COUNTERS = ['hits', 'misses', 'stale', 'no_data', 'errors', 'evictions']
+
+    _instances = weakref.WeakSet()
+    _instances_lock = threading.Lock()
+
+    class GetterJob(object):
         def __init__(self, view, fn, args, kwargs):
-            super(ViewCache.GetterThread, self).__init__()
             self._view = view
             self.event = threading.Event()
             self.fn = fn
@@ -130,33 +145,74 @@ class ViewCache(object):
                                      str(ex))
                     self._view.value = None
                     self._view.value_when = None
-                    self._view.getter_thread = None
+                    self._view.getter_job = None
                     self._view.exception = ex
             else:
                 with self._view.lock:
                     self._view.latency = t1 - t0
                     self._view.value = val
                     self._view.value_when = datetime.now()
-                    self._view.getter_thread = None
+                    self._view.getter_job = None
                     self._view.exception = None
+                self._view.owner.add_latency(t1 - t0)
 
             logger.debug("VC: execution of %s finished in: %s", self.fn,
                          t1 - t0)
             self.event.set()
 
+    class WorkerPool(object):
+        """
+        Threads executing the GetterJobs of all the view caches.  Threads are
+        started on demand, up to `MAX_WORKERS`, and exit after having been
+        idle for `IDLE_TIMEOUT` seconds.
+        """
+        MAX_WORKERS = 8
+        IDLE_TIMEOUT = 60.0
+
+        _jobs = collections.deque()
+        _cond = threading.Condition()
+        _workers = 0
+        _idle = 0
+
+        @classmethod
+        def submit(cls, job):
+            with cls._cond:
+                cls._jobs.append(job)
+                if len(cls._jobs) > cls._idle and cls._workers < cls.MAX_WORKERS:
+                    cls._workers += 1
+                    worker = threading.Thread(target=cls._run)
+                    worker.daemon = True
+                    worker.start()
+                cls._cond.notify()
+
+        @classmethod
+        def _run(cls):
+            while True:
+                with cls._cond:
+                    if not cls._jobs:
+                        cls._idle += 1
+                        cls._cond.wait(cls.IDLE_TIMEOUT)
+                        cls._idle -= 1
+                    if not cls._jobs:
+                        cls._workers -= 1
+                        return
+                    job = cls._jobs.popleft()
+                job.run()
+
     class RemoteViewCache(object):
         # Return stale data if
         STALE_PERIOD = 1.0
 
-        def __init__(self, timeout):
-            self.getter_thread = None
+        def __init__(self, owner, timeout):
+            self.owner = owner
+            self.getter_job = None
             # Consider data within 1s old to be sufficiently fresh
             self.timeout = timeout
-            self.event = threading.Event()
             self.value_when = None
             self.value = None
             self.latency = 0
             self.exception = None
+            self.last_access = time.time()
             self.lock = threading.Lock()
 
         def run(self, fn, args, kwargs):
@@ -177,17 +233,19 @@ class ViewCache(object):
                 now = datetime.now()
                 if self.value_when and now - self.value_when < timedelta(
                         seconds=self.STALE_PERIOD):
+                    self.owner.count('hits')
                     return ViewCache.VALUE_OK, self.value
 
-                if self.getter_thread is None:
-                    self.getter_thread = ViewCache.GetterThread(self, fn, args,
-                                                                kwargs)
-                    self.getter_thread.start()
+                if self.getter_job is None:
+                    self.getter_job = ViewCache.GetterJob(self, fn, args,
+                                                          kwargs)
+                    ViewCache.WorkerPool.submit(self.getter_job)
                 else:
-                    logger.debug("VC: getter_thread still alive for: %s", fn)
+                    logger.debug("VC: getter_job still pending for: %s", fn)
 
-                ev = self.getter_thread.event
+                ev = self.getter_job.event
 
+            self.owner.count('misses')
             success = ev.wait(timeout=self.timeout)
 
             with self.lock:
@@ -195,28 +253,161 @@ class ViewCache(object):
                     # We fetched the data within the timeout
                     if self.exception:
                         # execution raised an exception
+                        self.owner.count('errors')
                         # pylint: disable=raising-bad-type
                         raise self.exception
                     return ViewCache.VALUE_OK, self.value
                 elif self.value_when is not None:
                     # We have some data, but it doesn't meet freshness requirements
+                    self.owner.count('stale')
                     return ViewCache.VALUE_STALE, self.value
                 # We have no data, not even stale data
+                self.owner.count('no_data')
                 raise ViewCacheNoDataException()
 
-    def __init__(self, timeout=5):
+    def __init__(self, timeout=5, max_entries=None, ttl=None):
         self.timeout = timeout
-        self.cache_by_args = {}
+        self.max_entries = max_entries if max_entries is not None else self.MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else self.TTL
+        self.name = None
+        # Ordered by last access, least recently used first
+        self.cache_by_args = collections.OrderedDict()
+        self.counters = dict((counter, 0) for counter in self.COUNTERS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.lock = threading.Lock()
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def add_latency(self, latency):
+        with self.lock:
+            self.latency_sum += latency
+            self.latency_count += 1
+
+    def _get_entry(self, args):
+        now = time.time()
+        with self.lock:
+            rvc = self.cache_by_args.pop(args, None)
+            if rvc is None:
+                rvc = ViewCache.RemoteViewCache(self, self.timeout)
+            rvc.last_access = now
+            # Expire entries that have not been accessed for a while and
+            # the least recently used ones exceeding `max_entries`.
+            for key, entry in list(self.cache_by_args.items()):
+                if now - entry.last_access < self.ttl and \
+                        len(self.cache_by_args) < self.max_entries:
+                    break
+                del self.cache_by_args[key]
+                self.counters['evictions'] += 1
+            self.cache_by_args[args] = rvc
+            return rvc
 
     def __call__(self, fn):
+        self.name = '{}.{}'.format(fn.__module__, fn.__name__)
+        with ViewCache._instances_lock:
+            ViewCache._instances.add(self)
+
         def wrapper(*args, **kwargs):
-            rvc = self.cache_by_args.get(args, None)
-            if not rvc:
-                rvc = ViewCache.RemoteViewCache(self.timeout)
-                self.cache_by_args[args] = rvc
-            return rvc.run(fn, args, kwargs)
+            return self._get_entry(args).run(fn, args, kwargs)
         return wrapper
 
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['name'] = self.name
+            stats['entries'] = len(self.cache_by_args)
+            stats['avg_latency'] = self.latency_sum / self.latency_count \
+                if self.latency_count else 0.0
+        return stats
+
+    @classmethod
+    def all_stats(cls):
+        """
+        :return: the statistics of every decorated function
+        :rtype: list[dict]
+        """
+        with cls._instances_lock:
+            instances = list(cls._instances)
+        return sorted((vc.stats() for vc in instances), key=lambda s: s['name'])
+
+
+class TimeSeries(object):
+    """
+    Fixed size ring buffer of (timestamp, value) samples.  The samples are
+    kept in preallocated arrays, so the memory used by a series does not
+    change over time.
+    """
+
+    def __init__(self, size):
+        assert size >= 2
+        self._size = size
+        self._times = array('d', [0.0]) * size
+        self._values = array('l', [0]) * size
+        self._len = 0
+        self._next = 0
+
+    def __len__(self):
+        return self._len
+
+    def _index(self, age):
+        return (self._next - 1 - age) % self._size
+
+    def _sample(self, age):
+        i = self._index(age)
+        return self._times[i], self._values[i]
+
+    def append(self, timestamp, value):
+        """
+        Add a sample.  Samples not newer than the latest one are ignored.
+        """
+        if self._len and timestamp <= self._times[self._index(0)]:
+            return
+        if isinstance(value, float) and self._values.typecode != 'd':
+            self._values = array('d', self._values)
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self._len = min(self._len + 1, self._size)
+
+    def latest(self):
+        if not self._len:
+            return 0
+        return self._values[self._index(0)]
+
+    def rate(self):
+        """
+        :return: the derivative between the two most recent samples
+        """
+        if self._len < 2:
+            return 0.0
+        (t1, v1), (t2, v2) = self._sample(1), self._sample(0)
+        return (v2 - v1) / float(t2 - t1)
+
+    def rates(self):
+        """
+        :return: the derivatives between consecutive samples, oldest first,
+            like ``CephService.get_rates()``
+        :rtype: list[tuple[float, float]]
+        """
+        if not self._len:
+            return [(0, 0.0)]
+        if self._len == 1:
+            return [(self._times[self._index(0)], 0.0)]
+        result = []
+        for age in range(self._len - 1, 0, -1):
+            (t1, v1), (t2, v2) = self._sample(age), self._sample(age - 1)
+            result.append((t2, (v2 - v1) / float(t2 - t1)))
+        return result
+
+    def series(self):
+        """
+        :return: the samples, most recent first
+        :rtype: list[tuple[float, int|float]]
+        """
+        return [self._sample(age) for age in range(self._len)]
+
 
 class Session(object):
     """
@@ -406,6 +597,7 @@ class TaskManager(object):
 
     VALUE_DONE = "done"
     VALUE_EXECUTING = "executing"
+    VALUE_QUEUED = "queued"
 
     _executing_tasks = set()
     _finished_tasks = []
@@ -493,7 +685,8 @@ class TaskManager(object):
             'name': t.name,
             'metadata': t.metadata,
             'begin_time': "{}Z".format(datetime.fromtimestamp(t.begin_time).isoformat()),
-            'progress': t.progress
+            'progress': t.progress,
+            'state': cls.VALUE_QUEUED if t.queued else cls.VALUE_EXECUTING
         } for t in ex_t if t.begin_time], [{
             'name': t.name,
             'metadata': t.metadata,
@@ -507,6 +700,27 @@ class TaskManager(object):
                 {'detail': str(t.exception)} if t.exception else None)
         } for t in fn_t]
 
+    @classmethod
+    def aggregate_progress(cls, ns_glob=None):
+        """
+        Aggregates the progress of the executing and queued tasks by name,
+        e.g. to follow the deletion of many RBD images.
+
+        :return: dict of task name to the number of `queued` and `executing`
+            tasks and their average `progress`
+        """
+        ex_t, _ = cls.list(ns_glob)
+        result = {}
+        for t in ex_t:
+            agg = result.setdefault(t.name, {cls.VALUE_QUEUED: 0,
+                                             cls.VALUE_EXECUTING: 0,
+                                             'progress': 0})
+            agg[cls.VALUE_QUEUED if t.queued else cls.VALUE_EXECUTING] += 1
+            agg['progress'] += t.progress or 0
+        for agg in result.values():
+            agg['progress'] //= agg[cls.VALUE_QUEUED] + agg[cls.VALUE_EXECUTING]
+        return result
+
 
 # pylint: disable=protected-access
 class TaskExecutor(object):
@@ -535,12 +749,83 @@ class TaskExecutor(object):
 
 # pylint: disable=protected-access
 class ThreadedExecutor(TaskExecutor):
-    def __init__(self):
-        super(ThreadedExecutor, self).__init__()
-        self._thread = threading.Thread(target=self._run)
+    """
+    Executes the tasks on a shared pool of at most `MAX_WORKERS` threads,
+    started on demand.
+
+    At most `MAX_CONCURRENCY` tasks with the same name (e.g. ``rbd/delete``)
+    are executed concurrently, unless another limit is configured for the
+    name in `CONCURRENCY`.  The remaining tasks are queued and started in
+    FIFO order.
+    """
+    MAX_WORKERS = 16
+    MAX_CONCURRENCY = 8
+    CONCURRENCY = {}  # task name glob -> max. number of concurrent tasks
+    IDLE_TIMEOUT = 60.0
+
+    _queue = collections.deque()
+    _executing = collections.defaultdict(int)  # task name -> number of tasks
+    _cond = threading.Condition()
+    _workers = 0
+    _idle = 0
 
     def start(self):
-        self._thread.start()
+        cls = ThreadedExecutor
+        with cls._cond:
+            self.task.queued = True
+            cls._queue.append(self)
+            if len(cls._queue) > cls._idle and cls._workers < cls.MAX_WORKERS:
+                cls._workers += 1
+                worker = threading.Thread(target=cls._worker)
+                worker.daemon = True
+                worker.start()
+            cls._cond.notify()
+
+    @classmethod
+    def concurrency(cls, name):
+        for name_glob, limit in cls.CONCURRENCY.items():
+            if fnmatch.fnmatch(name, name_glob):
+                return limit
+        return cls.MAX_CONCURRENCY
+
+    @classmethod
+    def _dequeue(cls):
+        # called with cls._cond held
+        for idx, executor in enumerate(cls._queue):
+            name = executor.task.name
+            if cls._executing[name] < cls.concurrency(name):
+                del cls._queue[idx]
+                cls._executing[name] += 1
+                return executor
+        return None
+
+    @classmethod
+    def _worker(cls):
+        while True:
+            with cls._cond:
+                executor = cls._dequeue()
+                idle_since = time.time()
+                while executor is None:
+                    if time.time() - idle_since >= cls.IDLE_TIMEOUT:
+                        cls._workers -= 1
+                        return
+                    cls._idle += 1
+                    cls._cond.wait(cls.IDLE_TIMEOUT)
+                    cls._idle -= 1
+                    executor = cls._dequeue()
+            with executor.task.lock:
+                executor.task.queued = False
+                executor.task.begin_time = time.time()
+            try:
+                executor._run()
+            finally:
+                with cls._cond:
+                    name = executor.task.name
+                    cls._executing[name] -= 1
+                    if not cls._executing[name]:
+                        del cls._executing[name]
+                    # queued tasks of this name may be started now
+                    cls._cond.notify_all()
 
     # pylint: disable=broad-except
     def _run(self):
@@ -566,6 +851,7 @@ class Task(object):
         self.executor = executor
         self.ex_handler = exception_handler
         self.running = False
+        self.queued = False
         self.event = threading.Event()
         self.progress = None
         self.ret_value = None
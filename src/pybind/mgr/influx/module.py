@@ -1,5 +1,6 @@
 from datetime import datetime
-from threading import Event
+from threading import Event, Lock
+from itertools import chain, islice
 import json
 import errno
 import time
@@ -48,6 +49,14 @@ class Module(MgrModule):
                 'name': 'verify_ssl',
                 'default': 'true'
             },
+            {
+                'name': 'batch_size',
+                'default': 5000
+            },
+            {
+                'name': 'changed_only',
+                'default': 'false'
+            },
     ]
 
     @property
@@ -77,6 +86,11 @@ class Module(MgrModule):
             "desc": "debug the module",
             "perm": "rw"
         },
+        {
+            "cmd": "influx stats",
+            "desc": "Show statistics of the last send",
+            "perm": "r"
+        },
     ]
 
     def __init__(self, *args, **kwargs):
@@ -84,6 +98,12 @@ class Module(MgrModule):
         self.event = Event()
         self.run = True
         self.config = dict()
+        self.client = None
+        self.client_config = None
+        # (measurement, tags) -> value last sent, for 'changed_only' mode
+        self.last_sent = dict()
+        self.send_lock = Lock()
+        self.stats = dict()
 
     def get_fsid(self):
         return self.get('mon_map')['fsid']
@@ -108,6 +128,7 @@ class Module(MgrModule):
         pool_info = {}
 
         now = datetime.utcnow().isoformat() + 'Z'
+        fsid = self.get_fsid()
 
         df_types = [
             'bytes_used',
@@ -132,7 +153,7 @@ class Module(MgrModule):
                         "pool_name": pool['name'],
                         "pool_id": pool['id'],
                         "type_instance": df_type,
-                        "fsid": self.get_fsid()
+                        "fsid": fsid
                     },
                     "time": now,
                     "fields": {
@@ -144,11 +165,13 @@ class Module(MgrModule):
         return data, pool_info
 
     def get_pg_summary(self, pool_info):
+        """
+        Generate the PG summary points of every OSD and pool
+        """
         time = datetime.utcnow().isoformat() + 'Z'
         pg_sum = self.get('pg_summary')
         osd_sum = pg_sum['by_osd']
         pool_sum = pg_sum['by_pool']
-        data = []
         for osd_id, stats in osd_sum.iteritems():
             metadata = self.get_metadata('osd', "%s" % osd_id)
             for stat in stats:
@@ -164,7 +187,7 @@ class Module(MgrModule):
                         "value": stats[stat]
                     }
                 }
-                data.append(point_1)
+                yield point_1
         for pool_id, stats in pool_sum.iteritems():
             for stat in stats:
                 point_2 = {
@@ -179,14 +202,15 @@ class Module(MgrModule):
                         "value" : stats[stat],
                     }
                 }
-                data.append(point_2)
-        return data 
+                yield point_2
 
 
     def get_daemon_stats(self):
-        data = []
-
+        """
+        Generate the perf counter points of every daemon
+        """
         now = datetime.utcnow().isoformat() + 'Z'
+        fsid = self.get_fsid()
 
         for daemon, counters in self.get_all_perf_counters().iteritems():
             svc_type, svc_id = daemon.split(".", 1)
@@ -198,28 +222,26 @@ class Module(MgrModule):
 
                 value = counter_info['value']
 
-                data.append({
+                yield {
                     "measurement": "ceph_daemon_stats",
                     "tags": {
                         "ceph_daemon": daemon,
                         "type_instance": path,
                         "host": metadata['hostname'],
-                        "fsid": self.get_fsid()
+                        "fsid": fsid
                     },
                     "time": now,
                     "fields": {
                         "value": value
                     }
-                })
-
-        return data
+                }
 
     def set_config_option(self, option, value):
         if option not in self.config_keys.keys():
             raise RuntimeError('{0} is a unknown configuration '
                                'option'.format(option))
 
-        if option in ['port', 'interval']:
+        if option in ['port', 'interval', 'batch_size']:
             try:
                 value = int(value)
             except (ValueError, TypeError):
@@ -229,7 +251,10 @@ class Module(MgrModule):
         if option == 'interval' and value < 5:
             raise RuntimeError('interval should be set to at least 5 seconds')
 
-        if option in ['ssl', 'verify_ssl']:
+        if option == 'batch_size' and value < 1:
+            raise RuntimeError('batch_size should be at least 1')
+
+        if option in ['ssl', 'verify_ssl', 'changed_only']:
             value = value.lower() == 'true'
 
         self.config[option] = value
@@ -253,6 +278,58 @@ class Module(MgrModule):
         verify_ssl = \
             self.get_config("verify_ssl", default=self.config_keys['verify_ssl'])
         self.config['verify_ssl'] = verify_ssl.lower() == 'true'
+        self.config['batch_size'] = \
+            int(self.get_config("batch_size",
+                                default=self.config_keys['batch_size']))
+        changed_only = \
+            self.get_config("changed_only",
+                            default=self.config_keys['changed_only'])
+        self.config['changed_only'] = changed_only.lower() == 'true'
+
+    def get_client(self):
+        """
+        Return the InfluxDB client, creating a new one when the connection
+        settings changed.
+        """
+        client_config = tuple(self.config[key] for key in [
+            'hostname', 'port', 'username', 'password', 'database', 'ssl',
+            'verify_ssl'])
+        if self.client is None or client_config != self.client_config:
+            self.client = InfluxDBClient(*client_config)
+            self.client_config = client_config
+            self.last_sent = dict()
+        return self.client
+
+    def filter_changed(self, points, sent):
+        """
+        Skip the points whose value did not change since they were last
+        sent.  The value of every point is recorded in `sent`.
+        """
+        for point in points:
+            key = (point['measurement'],
+                   tuple(sorted(point['tags'].items())))
+            value = point['fields']['value']
+            sent[key] = value
+            if key in self.last_sent and self.last_sent[key] == value:
+                self.stats['points_skipped'] += 1
+                continue
+            yield point
+
+    def write_points(self, client, points):
+        """
+        Write the points in chunks of 'batch_size' points.
+        """
+        batch_size = self.config['batch_size']
+        points = iter(points)
+        while True:
+            batch = list(islice(points, batch_size))
+            if not batch:
+                break
+            start = time.time()
+            client.write_points(batch, 'ms')
+            self.stats['send_time'] += time.time() - start
+            self.stats['points_sent'] += len(batch)
+            self.stats['batches_sent'] += 1
 
     def send_to_influx(self):
         if not self.config['hostname']:
@@ -272,21 +349,31 @@ class Module(MgrModule):
         # missing username/password is valid.
         self.log.debug("Sending data to Influx host: %s",
                        self.config['hostname'])
-        client = InfluxDBClient(self.config['hostname'], self.config['port'],
-                                self.config['username'],
-                                self.config['password'],
-                                self.config['database'],
-                                self.config['ssl'],
-                                self.config['verify_ssl'])
+        with self.send_lock:
+            self._send_to_influx()
+
+    def _send_to_influx(self):
+        client = self.get_client()
+        start = time.time()
+        self.stats = {
+            'points_sent': 0,
+            'points_skipped': 0,
+            'batches_sent': 0,
+            'send_time': 0.0,
+        }
+        sent = dict()
 
         # using influx client get_list_database requires admin privs,
         # instead we'll catch the not found exception and inform the user if
         # db can not be created
         try:
             df_stats, pools = self.get_df_stats()
-            client.write_points(df_stats, 'ms')
-            client.write_points(self.get_daemon_stats(), 'ms')
-            client.write_points(self.get_pg_summary(pools))
+            points = chain(df_stats, self.get_daemon_stats(),
+                           self.get_pg_summary(pools))
+            if self.config['changed_only']:
+                points = self.filter_changed(points, sent)
+            self.write_points(client, points)
+            self.last_sent = sent
             self.set_health_checks(dict())
         except ConnectionError as e:
             self.log.exception("Failed to connect to Influx host %s:%d",
@@ -320,6 +407,17 @@ class Module(MgrModule):
                     }
                 })
                 raise
+        finally:
+            self.stats['total_time'] = time.time() - start
+            self.stats['collect_time'] = \
+                self.stats['total_time'] - self.stats['send_time']
+            self.log.debug('Collected data in %.3f seconds, sent %d points '
+                           '(%d unchanged skipped) in %d batches in %.3f '
+                           'seconds', self.stats['collect_time'],
+                           self.stats['points_sent'],
+                           self.stats['points_skipped'],
+                           self.stats['batches_sent'],
+                           self.stats['send_time'])
 
     def shutdown(self):
         self.log.info('Stopping influx module')
@@ -342,8 +440,10 @@ class Module(MgrModule):
         elif cmd['prefix'] == 'influx send':
             self.send_to_influx()
             return 0, 'Sending data to Influx', ''
+        elif cmd['prefix'] == 'influx stats':
+            return 0, json.dumps(self.stats, indent=2), ''
         if cmd['prefix'] == 'influx self-test':
-            daemon_stats = self.get_daemon_stats()
+            daemon_stats = list(self.get_daemon_stats())
             assert len(daemon_stats)
             df_stats, pools = self.get_df_stats()
 
@@ -72,6 +72,35 @@ class CommandResult(object):
         return self.r, self.outb, self.outs
 
 
+class ImmutableDict(dict):
+    """
+    A read-only dict, as returned by ``MgrModule.get`` for cached maps.
+
+    Copies (``copy.deepcopy``, pickling) are plain, mutable dicts.
+    """
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("'{}' object does not support item assignment".format(
+            type(self).__name__))
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def _freeze(obj):
+    """
+    Return a read-only view of a structure returned by ``_ceph_get``:
+    dicts become ImmutableDicts and lists become tuples.
+    """
+    if isinstance(obj, dict):
+        return ImmutableDict((k, _freeze(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
 class OSDMap(ceph_module.BasePyOSDMap):
     def get_epoch(self):
         return self._get_epoch()
@@ -243,7 +272,31 @@ class MgrModule(ceph_module.BaseMgrModule):
     # units supported
     BYTES = 0
     NONE = 1
-    
+
+    # Set to True to have ``get`` cache the cluster maps until their
+    # epoch (or version) changes.  Cached maps are shared between calls
+    # and are therefore returned as read-only views (see ImmutableDict).
+    MAP_CACHE = False
+
+    # The maps whose epoch/version a cached ``get`` result depends on
+    MAP_CACHE_KEYS = {
+        'osd_map': ('osd_map',),
+        'osd_map_tree': ('osd_map',),
+        'osd_map_crush': ('osd_map',),
+        'osdmap_crush_map_text': ('osd_map',),
+        'fs_map': ('fs_map',),
+        'mon_map': ('mon_map',),
+        'service_map': ('service_map',),
+        'mgr_map': ('mgr_map',),
+        'pg_summary': ('pg_map',),
+        'pg_status': ('pg_map',),
+        'pg_dump': ('pg_map',),
+        'io_rate': ('pg_map',),
+        'osd_stats': ('pg_map',),
+        'df': ('osd_map', 'pg_map'),
+        'osd_pool_stats': ('osd_map', 'pg_map'),
+    }
+
     def __init__(self, module_name, py_modules_ptr, this_ptr):
         self.module_name = module_name
 
@@ -257,10 +310,17 @@ class MgrModule(ceph_module.BaseMgrModule):
         self._version = self._ceph_get_version()
 
         self._perf_schema_cache = None
+        self._perf_schema_lock = threading.Lock()
 
         # Keep a librados instance for those that need it.
         self._rados = None
 
+        # data_name -> (map versions, frozen result)
+        self._map_cache = {}
+        self._map_cache_lock = threading.Lock()
+        self._map_cache_hits = 0
+        self._map_cache_misses = 0
+
     def __del__(self):
         unconfigure_logger(self, self.module_name)
 
@@ -317,8 +377,50 @@ class MgrModule(ceph_module.BaseMgrModule):
         Note:
             All these structures have their own JSON representations: experiment
             or look at the C++ ``dump()`` methods to learn about them.
+
+        If the module sets ``MAP_CACHE``, the results depending only on the
+        cluster maps are cached until the epoch of those maps changes, and
+        are returned as read-only views: use ``copy.deepcopy`` to get a copy
+        that may be modified.
+        """
+        keys = self.MAP_CACHE_KEYS.get(data_name) if self.MAP_CACHE else None
+        if keys is None:
+            return self._ceph_get(data_name)
+
+        versions = self._ceph_get('map_versions')
+        version = tuple(versions[k] for k in keys)
+        with self._map_cache_lock:
+            cached = self._map_cache.get(data_name)
+            if cached is not None and cached[0] == version:
+                self._map_cache_hits += 1
+                return cached[1]
+            self._map_cache_misses += 1
+
+        # The maps may move on while we are fetching: the result is then
+        # newer than `version`, and refetched by the next call
+        result = _freeze(self._ceph_get(data_name))
+        with self._map_cache_lock:
+            self._map_cache[data_name] = (version, result)
+        return result
+
+    def _get_map_cache_stats(self):
         """
-        return self._ceph_get(data_name)
+        Called by ceph-mgr to report the statistics of the ``get`` cache
+        (``ceph mgr cache stats``).
+
+        :return: a dict of numbers, or None if ``MAP_CACHE`` is not set
+        """
+        if not self.MAP_CACHE:
+            return None
+        with self._map_cache_lock:
+            lookups = self._map_cache_hits + self._map_cache_misses
+            return {
+                'hits': self._map_cache_hits,
+                'misses': self._map_cache_misses,
+                'entries': len(self._map_cache),
+                'hit_rate': float(self._map_cache_hits) / lookups
+                            if lookups else 0.0,
+            }
 
     def _stattype_to_str(self, stattype):
         
@@ -699,7 +801,60 @@ class MgrModule(ceph_module.BaseMgrModule):
         else:
             return (0, 0)
 
-    def get_all_perf_counters(self, prio_limit=PRIO_USEFUL):
+    def get_perf_counters(self, svc_type='', svc_id='',
+                          prio_limit=PRIO_USEFUL):
+        """
+        Fetch the schema and the latest value of every perf counter of
+        the matching services in a single call.  svc_type and svc_id
+        may be empty, in which case they are wildcards.
+
+        Unlike ``get_counter``, only the most recent data point of each
+        counter is transferred.
+
+        :param str svc_type:
+        :param str svc_id:
+        :param int prio_limit: skip counters with a lower priority
+        :return: dict of service name (e.g. "osd.3") to a dict of counter
+            path to the counter schema, plus a "value" member holding the
+            latest value (and a "count" member for long running averages)
+        """
+        return self._ceph_get_perf_counters(svc_type, svc_id, prio_limit)
+
+    def get_latest_counters(self, svc_type='', svc_id='',
+                            prio_limit=PRIO_USEFUL):
+        """
+        Like ``get_perf_counters``, but without the schema.
+
+        :return: dict of service name to a dict of counter path to the
+            latest data point, in the form returned by ``get_counter``:
+            ``[timestamp, value]``, or ``[timestamp, sum, count]`` for long
+            running averages
+        """
+        return self._ceph_get_latest_counters(svc_type, svc_id, prio_limit)
+
+    def _get_cached_perf_schema(self, svc_full_name, latest, prio_limit):
+        """
+        Return the schema of a service's counters, only refetching it
+        when the set of counters reported by the service no longer
+        matches the cached one (e.g. after a daemon upgrade).
+        """
+        cached = self._perf_schema_cache.get(svc_full_name)
+        if cached is not None and cached[0] == prio_limit and \
+                len(cached[1]) == len(latest) and \
+                all(path in cached[1] for path in latest):
+            return cached[1]
+
+        svc_type, svc_id = svc_full_name.split('.', 1)
+        schema = self.get_perf_counters(svc_type, svc_id, prio_limit).get(
+            svc_full_name, {})
+        for counter_schema in schema.values():
+            counter_schema.pop('value', None)
+            counter_schema.pop('count', None)
+        self._perf_schema_cache[svc_full_name] = (prio_limit, schema)
+        return schema
+
+    def get_all_perf_counters(self, prio_limit=PRIO_USEFUL,
+                              services=("rgw", "mds", "osd", "mon")):
         """
         Return the perf counters currently known to this ceph-mgr
         instance, filtered by priority equal to or greater than `prio_limit`.
@@ -710,55 +865,50 @@ class MgrModule(ceph_module.BaseMgrModule):
         info structure, which is the information from
         the schema, plus an additional "value" member with the latest
         value.
+
+        The schemas are cached between calls, so that a call only
+        fetches the latest values unless the counters of a service
+        have changed.
         """
 
         result = defaultdict(dict)
 
+        with self._perf_schema_lock:
+            if self._perf_schema_cache is None:
+                self._perf_schema_cache = {}
+
+            seen = set()
+            for svc_type in services:
+                latest_by_svc = self.get_latest_counters(svc_type, '',
+                                                         prio_limit)
+                for svc_full_name, latest in latest_by_svc.items():
+                    seen.add(svc_full_name)
+                    schema = self._get_cached_perf_schema(
+                        svc_full_name, latest, prio_limit)
+
+                    # Populate latest values
+                    for counter_path, datapoint in latest.items():
+                        counter_schema = schema.get(counter_path)
+                        if counter_schema is None:
+                            continue
+
+                        counter_info = dict(counter_schema)
+
+                        # Also populate count for the long running avgs
+                        if counter_schema['type'] & \
+                                self.PERFCOUNTER_LONGRUNAVG:
+                            counter_info['value'], counter_info['count'] = \
+                                datapoint[1], datapoint[2]
+                        else:
+                            counter_info['value'] = datapoint[1]
 
-        for server in self.list_servers():
-            for service in server['services']:
-                if service['type'] not in ("rgw", "mds", "osd", "mon"):
-                    continue
-
-                schema = self.get_perf_schema(service['type'], service['id'])
-                if not schema:
-                    self.log.warn("No perf counter schema for {0}.{1}".format(
-                        service['type'], service['id']
-                    ))
-                    continue
-
-                # Value is returned in a potentially-multi-service format,
-                # get just the service we're asking about
-                svc_full_name = "{0}.{1}".format(service['type'], service['id'])
-                schema = schema[svc_full_name]
-
-                # Populate latest values
-                for counter_path, counter_schema in schema.items():
-                    # self.log.debug("{0}: {1}".format(
-                    #     counter_path, json.dumps(counter_schema)
-                    # ))
-                    if counter_schema['priority'] < prio_limit:
-                        continue
-
-                    counter_info = dict(counter_schema)
-
-                    # Also populate count for the long running avgs
-                    if counter_schema['type'] & self.PERFCOUNTER_LONGRUNAVG:
-                        v, c = self.get_latest_avg(
-                            service['type'],
-                            service['id'],
-                            counter_path
-                        )
-                        counter_info['value'], counter_info['count'] = v, c
                         result[svc_full_name][counter_path] = counter_info
-                    else:
-                        counter_info['value'] = self.get_latest(
-                            service['type'],
-                            service['id'],
-                            counter_path
-                        )
-
-                    result[svc_full_name][counter_path] = counter_info
+
+            # Forget about services that went away
+            for svc_full_name in list(self._perf_schema_cache.keys()):
+                if svc_full_name not in seen and \
+                        svc_full_name.split('.', 1)[0] in services:
+                    del self._perf_schema_cache[svc_full_name]
 
         self.log.debug("returning {0} counter".format(len(result)))
 
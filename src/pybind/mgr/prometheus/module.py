@@ -5,6 +5,8 @@ import math
 import os
 import socket
 import threading
+import time
+import zlib
 from collections import OrderedDict
 from mgr_module import MgrModule, MgrStandbyModule, CommandResult
 
@@ -15,6 +17,10 @@ from mgr_module import MgrModule, MgrStandbyModule, CommandResult
 DEFAULT_ADDR = '::'
 DEFAULT_PORT = 9283
 
+# How often (in seconds) the cached exposition is refreshed from the
+# cluster state.  Scrapes are always served from that cache.
+DEFAULT_SCRAPE_INTERVAL = 15.0
+
 
 # cherrypy likes to sys.exit on error.  don't let it take us down too!
 def os_exit_noop(*args, **kwargs):
@@ -265,6 +271,12 @@ class Metrics(object):
                 'Number of {} objects'.format(state),
             )
 
+        metrics['mgr_scrape_duration_seconds'] = Metric(
+            'gauge',
+            'mgr_scrape_duration_seconds',
+            'Time spent collecting the metrics from the cluster state'
+        )
+
         return metrics
 
 
@@ -276,16 +288,32 @@ class Metric(object):
         self.desc = desc
         self.labelnames = labels    # tuple if present
         self.value = {}             # indexed by label values
+        self._expfmt = None         # rendered exposition, if up to date
 
     def set(self, value, labelvalues=None):
         # labelvalues must be a tuple
         labelvalues = labelvalues or ('',)
-        self.value[labelvalues] = value
+        if labelvalues not in self.value or \
+                self.value[labelvalues] != value:
+            self.value[labelvalues] = value
+            self._expfmt = None
 
     def reset(self, values):
-        self.value = {}
-        for labelvalues, value in values:
-            self.value[labelvalues] = value
+        value = {}
+        for labelvalues, v in values:
+            value[labelvalues] = v
+        if value != self.value:
+            self.value = value
+            self._expfmt = None
+
+    def expfmt(self):
+        '''
+        Return the text exposition of this metric family as bytes.  It is
+        only rendered again when the values changed since the last call.
+        '''
+        if self._expfmt is None:
+            self._expfmt = self.str_expfmt().encode('utf-8')
+        return self._expfmt
 
     def str_expfmt(self):
 
@@ -356,13 +384,20 @@ class Module(MgrModule):
     OPTIONS = [
             {'name': 'server_addr'},
             {'name': 'server_port'},
+            {'name': 'scrape_interval'},
     ]
 
+    # The maps are only read, and mostly unchanged between two scrapes
+    MAP_CACHE = True
+
     def __init__(self, *args, **kwargs):
         super(Module, self).__init__(*args, **kwargs)
         self.metrics = Metrics()
         self.schema = OrderedDict()
         self.shutdown_event = threading.Event()
+        self.collect_lock = threading.Lock()
+        self.collect_cache = None
+        self.collect_cache_gzip = None
         _global_instance['plugin'] = self
 
     def get_health(self):
@@ -613,6 +648,39 @@ class Module(MgrModule):
 
         return self.metrics.metrics
 
+    def refresh_cache(self):
+        '''
+        Collect the metrics and store their exposition, so that scrapes
+        can be served without touching the cluster state.  Only the
+        metric families whose values changed are rendered again.
+        '''
+        with self.collect_lock:
+            start = time.time()
+            self.collect()
+            self.metrics.set('mgr_scrape_duration_seconds',
+                             time.time() - start)
+            body = b''.join(m.expfmt()
+                            for m in self.metrics.metrics.values()) + b'\n'
+            self.collect_cache = body
+            self.collect_cache_gzip = None
+
+    def get_cached_metrics(self, compress=False):
+        '''
+        Return the cached exposition, refreshing it first if no
+        collection happened yet.  The gzip encoded variant is computed
+        at most once per refresh.
+        '''
+        if self.collect_cache is None:
+            self.refresh_cache()
+        with self.collect_lock:
+            if not compress:
+                return self.collect_cache
+            if self.collect_cache_gzip is None:
+                z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                self.collect_cache_gzip = \
+                    z.compress(self.collect_cache) + z.flush()
+            return self.collect_cache_gzip
+
     def get_file_sd_config(self):
         servers = self.list_servers()
         targets = []
@@ -651,7 +719,8 @@ class Module(MgrModule):
 
     def handle_command(self, cmd):
         if cmd['prefix'] == 'prometheus self-test':
-            self.collect()
+            self.refresh_cache()
+            self.get_cached_metrics(compress=True)
             self.get_file_sd_config()
             return 0, '', 'Self-test OK'
         elif cmd['prefix'] == 'prometheus file_sd_config':
@@ -669,12 +738,6 @@ class Module(MgrModule):
                 cherrypy.request.path = ''
                 return self
 
-            def format_metrics(self, metrics):
-                formatted = ''
-                for m in metrics.values():
-                    formatted += m.str_expfmt()
-                return formatted + '\n'
-
             @cherrypy.expose
             def index(self):
                 return '''<!DOCTYPE html>
@@ -689,18 +752,24 @@ class Module(MgrModule):
             @cherrypy.expose
             def metrics(self):
                 if global_instance().have_mon_connection():
-                    metrics = global_instance().collect()
-                    cherrypy.response.headers['Content-Type'] = 'text/plain'
-                    if metrics:
-                        return self.format_metrics(metrics)
+                    headers = cherrypy.response.headers
+                    headers['Content-Type'] = 'text/plain'
+                    headers['Vary'] = 'Accept-Encoding'
+                    compress = 'gzip' in cherrypy.request.headers.get(
+                        'Accept-Encoding', '')
+                    if compress:
+                        headers['Content-Encoding'] = 'gzip'
+                    return global_instance().get_cached_metrics(compress)
                 else:
                     raise cherrypy.HTTPError(503, 'No MON connection')
 
         server_addr = self.get_localized_config('server_addr', DEFAULT_ADDR)
         server_port = self.get_localized_config('server_port', DEFAULT_PORT)
+        scrape_interval = float(self.get_localized_config(
+            'scrape_interval', DEFAULT_SCRAPE_INTERVAL))
         self.log.info(
-            "server_addr: %s server_port: %s" %
-            (server_addr, server_port)
+            "server_addr: %s server_port: %s scrape_interval: %s" %
+            (server_addr, server_port, scrape_interval)
         )
 
         # Publish the URI that others may use to access the service we're
@@ -719,8 +788,14 @@ class Module(MgrModule):
         self.log.info('Starting engine...')
         cherrypy.engine.start()
         self.log.info('Engine started.')
-        # wait for the shutdown event
-        self.shutdown_event.wait()
+        # refresh the cached metrics until the shutdown event
+        while not self.shutdown_event.is_set():
+            if self.have_mon_connection():
+                try:
+                    self.refresh_cache()
+                except Exception:
+                    self.log.exception('Failed to collect metrics')
+            self.shutdown_event.wait(scrape_interval)
         self.shutdown_event.clear()
         cherrypy.engine.stop()
         self.log.info('Engine stopped.')
@@ -12,7 +12,7 @@ class ConfigOsd(RestController):
         """
         Show OSD configuration options
         """
-        flags = context.instance.get("osd_map")['flags']
+        flags = context.instance.get_osd_map_index().osd_map['flags']
 
         # pause is a valid osd config command that sets pauserd,pausewr
         flags = flags.replace('pauserd,pausewr', 'pause')
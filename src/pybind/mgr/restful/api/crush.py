@@ -14,11 +14,11 @@ class CrushRule(RestController):
         """
         Show crush rules
         """
-        rules = context.instance.get('osd_map_crush')['rules']
-        nodes = context.instance.get('osd_map_tree')['nodes']
+        index = context.instance.get_osd_map_index()
 
+        rules = [dict(x) for x in index.crush_rules]
         for rule in rules:
-            rule['osd_count'] = len(common.crush_rule_osds(nodes, rule))
+            rule['osd_count'] = len(index.rule_osds[rule['rule_id']])
 
         return rules
 
@@ -84,7 +84,7 @@ class Pool(RestController):
         """
         Show the information for all the pools
         """
-        pools = context.instance.get('osd_map')['pools']
+        pools = context.instance.get_pools()
 
         # pgp_num is called pg_placement_num, deal with that
         for pool in pools:
@@ -2,7 +2,7 @@ from pecan import expose, request, response
 from pecan.rest import RestController
 
 from restful import context
-from restful.decorators import auth, lock, paginate
+from restful.decorators import auth, paginate
 
 
 class RequestId(RestController):
@@ -16,29 +16,24 @@ class RequestId(RestController):
         """
         Show the information for the request id
         """
-        request = filter(
-            lambda x: x.id == self.request_id,
-            context.instance.requests
-        )
+        request = context.instance.get_request(self.request_id)
 
-        if len(request) != 1:
+        if request is None:
             response.status = 500
             return {'message': 'Unknown request id "%s"' % str(self.request_id)}
 
-        request = request[0]
         return request
 
 
     @expose(template='json')
     @auth
-    @lock
     def delete(self, **kwargs):
         """
         Remove the request id from the database
         """
-        for index in range(len(context.instance.requests)):
-            if context.instance.requests[index].id == self.request_id:
-                return context.instance.requests.pop(index)
+        request = context.instance.remove_request(self.request_id)
+        if request is not None:
+            return request
 
         # Failed to find the job to cancel
         response.status = 500
@@ -54,26 +49,20 @@ class Request(RestController):
         """
         List all the available requests
         """
-        return context.instance.requests
+        return context.instance.list_requests()
 
 
     @expose(template='json')
     @auth
-    @lock
     def delete(self, **kwargs):
         """
         Remove all the finished requests
         """
-        num_requests = len(context.instance.requests)
-
-        context.instance.requests = filter(
-            lambda x: not x.is_finished(),
-            context.instance.requests
-        )
+        cleaned = context.instance.remove_finished_requests()
 
         # Return the job statistics
         return {
-            'cleaned': num_requests - len(context.instance.requests),
+            'cleaned': cleaned,
             'remaining': len(context.instance.requests),
         }
 
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+
 # List of valid osd flags
 OSD_FLAGS = [
     'pause', 'noup', 'nodown', 'noout', 'noin', 'nobackfill',
@@ -146,3 +149,39 @@ def crush_rule_osds(nodes, rule):
         if step['op'] == 'take':
             osds |= _gather_osds(nodes_by_id[step['item']], rule['steps'][i + 1:])
     return osds
+
+
+class OsdMapIndex(object):
+    """
+    Lookup tables over one epoch of the OSD map, built once and shared by
+    all the endpoints until the next OSD map.  The dicts are shared as
+    well: copy them before modifying them.
+    """
+    def __init__(self, osd_map, crush, tree):
+        self.epoch = osd_map['epoch']
+        self.osd_map = osd_map
+        self.crush_rules = crush['rules']
+
+        # osd id -> osd
+        self.osds = OrderedDict((x['osd'], x) for x in osd_map['osds'])
+        # pool id -> pool
+        self.pools = OrderedDict((x['pool'], x) for x in osd_map['pools'])
+        # osd id -> reweight
+        self.reweights = dict((x.get('id'), x.get('reweight', None))
+                              for x in tree['nodes'])
+        # rule id -> set of osd ids
+        self.rule_osds = dict(
+            (rule['rule_id'], crush_rule_osds(tree['nodes'], rule))
+            for rule in self.crush_rules)
+
+        # osd id -> list of pool ids
+        self.osd_pools = dict((osd_id, []) for osd_id in self.osds)
+        for pool_id, pool in self.pools.items():
+            pool_osds = None
+            for rule in self.crush_rules:
+                if rule['rule_id'] == pool['crush_rule'] and \
+                        rule['min_size'] <= pool['size'] <= rule['max_size']:
+                    pool_osds = self.rule_osds[rule['rule_id']]
+
+            for osd_id in pool_osds or ():
+                self.osd_pools.setdefault(osd_id, []).append(pool_id)
@@ -8,11 +8,14 @@ import json
 import time
 import errno
 import inspect
+import itertools
 import tempfile
 import threading
 import traceback
 import socket
 
+from collections import OrderedDict
+
 from . import common
 from . import context
 
@@ -52,8 +55,11 @@ class CommandsRequest(object):
     """
 
 
+    # Request ids, unique for the life of the module
+    _ids = itertools.count(1)
+
     def __init__(self, commands_arrays):
-        self.id = str(id(self))
+        self.id = str(next(CommandsRequest._ids))
 
         # Filter out empty sub-requests
         commands_arrays = [x for x in commands_arrays
@@ -65,20 +71,29 @@ class CommandsRequest(object):
         self.failed = []
 
         self.lock = threading.RLock()
+        # Notified when the request finishes
+        self.cond = threading.Condition(self.lock)
+
+        self.submitted_at = time.time()
+        self.finished_at = None
+
         if not len(commands_arrays):
             # Nothing to run
+            self.finished_at = self.submitted_at
             return
 
-        # Process first iteration of commands_arrays in parallel
-        results = self.run(commands_arrays[0])
-
-        self.running.extend(results)
+        # Process first iteration of commands_arrays in parallel.  Hold
+        # the lock so that a reply arriving before the results are
+        # running waits for them in finish()
+        with self.lock:
+            self.running.extend(self.run(commands_arrays[0]))
 
 
     def run(self, commands):
         """
         A static method that will execute the given list of commands in
-        parallel and will return the list of command results.
+        parallel and will return the list of command results.  Must be
+        called with self.lock held.
         """
 
         # Gather the results (in parallel)
@@ -91,6 +106,11 @@ class CommandsRequest(object):
             result.command = common.humanify_command(commands[index])
             results.append(result)
 
+            # Index the request by tag before the command may complete.
+            # The caller holds self.lock, so finish() waits until the
+            # result is running
+            context.instance.track_command(tag, self)
+
             # Run the command
             context.instance.send_command(result, 'mon', '', json.dumps(commands[index]), tag)
 
@@ -118,12 +138,44 @@ class CommandsRequest(object):
                         self.finished.append(self.running.pop(index))
                     else:
                         self.failed.append(self.running.pop(index))
+                    if self.is_ready():
+                        self.next()
+                    if self.is_finished():
+                        self.finished_at = time.time()
+                        self.cond.notify_all()
                     return True
 
             # No such tag found
             return False
 
 
+    def wait(self, timeout=None):
+        """
+        Wait for the request to finish, at most timeout seconds if set.
+        Returns whether it is finished.
+        """
+        with self.lock:
+            if timeout is not None:
+                deadline = time.time() + timeout
+            while not self.is_finished():
+                if timeout is None:
+                    self.cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            return self.is_finished()
+
+
+    def get_latency(self):
+        """
+        Seconds from the submission of the request until it finished, or
+        until now if it is still running.
+        """
+        return (self.finished_at or time.time()) - self.submitted_at
+
+
     def is_running(self, tag):
         for result in self.running:
             if result.tag == tag:
@@ -198,6 +250,7 @@ class CommandsRequest(object):
             'is_finished': self.is_finished(),
             'has_failed': self.has_failed(),
             'state': self.get_state(),
+            'latency': self.get_latency(),
         }
 
 
@@ -207,6 +260,7 @@ class Module(MgrModule):
         {'name': 'server_addr'},
         {'name': 'server_port'},
         {'name': 'key_file'},
+        {'name': 'request_ttl'},
     ]
 
     COMMANDS = [
@@ -235,14 +289,39 @@ class Module(MgrModule):
             "desc": "Restart API server",
             "perm": "rw"
         },
+        {
+            "cmd": "restful request-stats",
+            "desc": "Show statistics of the requests",
+            "perm": "r"
+        },
     ]
 
+    # Seconds finished requests are kept for, unless the request_ttl
+    # option says otherwise
+    DEFAULT_REQUEST_TTL = 3600
+
     def __init__(self, *args, **kwargs):
         super(Module, self).__init__(*args, **kwargs)
         context.instance = self
 
-        self.requests = []
+        # request id -> CommandsRequest, in submission order
+        self.requests = OrderedDict()
+        # tag -> CommandsRequest, for the running commands
+        self.requests_by_tag = {}
+        # The requests take requests_lock with their own lock held, to
+        # track the commands they run: never take the lock of a request
+        # with requests_lock held, or both could wait for each other
         self.requests_lock = threading.RLock()
+        self.osd_map_index = None
+        self.osd_map_index_lock = threading.Lock()
+
+        self.request_stats = {
+            'submitted': 0,
+            'finished': 0,
+            'failed': 0,
+            'latency_sum': 0.0,
+            'latency_max': 0.0,
+        }
 
         self.keys = {}
         self.disable_auth = False
@@ -370,15 +449,17 @@ class Module(MgrModule):
             if tag == 'seq':
                 return
 
-            request = [x for x in self.requests if x.is_running(tag)]
-            if len(request) != 1:
+            with self.requests_lock:
+                request = self.requests_by_tag.pop(tag, None)
+            if request is None or not request.finish(tag):
                 self.log.warn("Unknown request '%s'" % str(tag))
                 return
 
-            request = request[0]
-            request.finish(tag)
-            if request.is_ready():
-                request.next()
+            if request.is_finished():
+                self._account_request(request)
+        elif notify_type == "osd_map":
+            with self.osd_map_index_lock:
+                self.osd_map_index = None
         else:
             self.log.debug("Unhandled notification type '%s'" % notify_type)
 
@@ -453,6 +534,13 @@ class Module(MgrModule):
                 ""
             )
 
+        elif command['prefix'] == "restful request-stats":
+            return (
+                0,
+                json.dumps(self.get_request_stats(), indent=2),
+                "",
+            )
+
         elif command['prefix'] == 'restful restart':
             self.restart();
             return (
@@ -506,95 +594,167 @@ class Module(MgrModule):
         return mon_map_mons
 
 
-    def get_osd_pools(self):
-        osds = dict(map(lambda x: (x['osd'], []), self.get('osd_map')['osds']))
-        pools = dict(map(lambda x: (x['pool'], x), self.get('osd_map')['pools']))
-        crush_rules = self.get('osd_map_crush')['rules']
-
-        osds_by_pool = {}
-        for pool_id, pool in pools.items():
-            pool_osds = None
-            for rule in [r for r in crush_rules if r['rule_id'] == pool['crush_rule']]:
-                if rule['min_size'] <= pool['size'] <= rule['max_size']:
-                    pool_osds = common.crush_rule_osds(self.get('osd_map_tree')['nodes'], rule)
-
-            osds_by_pool[pool_id] = pool_osds
+    def get_osd_map_index(self):
+        """
+        The OsdMapIndex of the current OSD map, built on first use after
+        each OSD map notification.
+        """
+        with self.osd_map_index_lock:
+            if self.osd_map_index is None:
+                self.osd_map_index = common.OsdMapIndex(
+                    self.get('osd_map'),
+                    self.get('osd_map_crush'),
+                    self.get('osd_map_tree'),
+                )
+            return self.osd_map_index
 
-        for pool_id in pools.keys():
-            for in_pool_id in osds_by_pool[pool_id]:
-                osds[in_pool_id].append(pool_id)
 
-        return osds
+    def get_osd_pools(self):
+        index = self.get_osd_map_index()
+        return dict((osd_id, list(pools))
+                    for osd_id, pools in index.osd_pools.items())
 
 
     def get_osds(self, pool_id=None, ids=None):
         # Get data
-        osd_map = self.get('osd_map')
+        index = self.get_osd_map_index()
         osd_metadata = self.get('osd_metadata')
 
-        # Update the data with the additional info from the osd map
-        osds = osd_map['osds']
-
         # Filter by osd ids
         if ids is not None:
-            osds = [x for x in osds if str(x['osd']) in ids]
-
-        # Get list of pools per osd node
-        pools_map = self.get_osd_pools()
+            osds = [index.osds[int(x)] for x in ids
+                    if str(x).isdigit() and int(x) in index.osds]
+        else:
+            osds = index.osds.values()
 
-        # map osd IDs to reweight
-        reweight_map = dict([
-            (x.get('id'), x.get('reweight', None))
-            for x in self.get('osd_map_tree')['nodes']
-        ])
+        # Filter by pool
+        if pool_id:
+            pool_id = int(pool_id)
+            osds = [x for x in osds if pool_id in index.osd_pools[x['osd']]]
 
-        # Build OSD data objects
+        # Build OSD data objects, leaving the shared ones untouched
+        osds = [dict(x) for x in osds]
         for osd in osds:
-            osd['pools'] = pools_map[osd['osd']]
+            osd['pools'] = list(index.osd_pools[osd['osd']])
             osd['server'] = osd_metadata.get(str(osd['osd']), {}).get('hostname', None)
 
-            osd['reweight'] = reweight_map.get(osd['osd'], 0.0)
+            osd['reweight'] = index.reweights.get(osd['osd'], 0.0)
 
             if osd['up']:
                 osd['valid_commands'] = common.OSD_IMPLEMENTED_COMMANDS
             else:
                 osd['valid_commands'] = []
 
-        # Filter by pool
-        if pool_id:
-            pool_id = int(pool_id)
-            osds = [x for x in osds if pool_id in x['pools']]
-
         return osds
 
 
     def get_osd_by_id(self, osd_id):
-        osd = [x for x in self.get('osd_map')['osds']
-               if x['osd'] == osd_id]
-
-        if len(osd) != 1:
+        osd = self.get_osd_map_index().osds.get(osd_id)
+        if osd is None:
             return None
 
-        return osd[0]
+        return dict(osd)
 
 
-    def get_pool_by_id(self, pool_id):
-        pool = [x for x in self.get('osd_map')['pools']
-                if x['pool'] == pool_id]
+    def get_pools(self):
+        return [dict(x) for x in self.get_osd_map_index().pools.values()]
+
 
-        if len(pool) != 1:
+    def get_pool_by_id(self, pool_id):
+        pool = self.get_osd_map_index().pools.get(pool_id)
+        if pool is None:
             return None
 
-        return pool[0]
+        return dict(pool)
+
+
+    def track_command(self, tag, request):
+        with self.requests_lock:
+            self.requests_by_tag[tag] = request
+
+
+    def _account_request(self, request):
+        latency = request.get_latency()
+        with self.requests_lock:
+            stats = self.request_stats
+            stats['finished'] += 1
+            if request.has_failed():
+                stats['failed'] += 1
+            stats['latency_sum'] += latency
+            stats['latency_max'] = max(stats['latency_max'], latency)
+
+
+    def get_request_stats(self):
+        with self.requests_lock:
+            stats = dict(self.request_stats)
+            requests = list(self.requests.values())
+        stats['pending'] = len(
+            [x for x in requests if not x.is_finished()])
+        stats['retained'] = len(requests)
+        stats['latency_avg'] = \
+            stats['latency_sum'] / stats['finished'] if stats['finished'] else 0.0
+        return stats
+
+
+    def prune_requests(self):
+        """
+        Forget the requests finished for longer than the request_ttl
+        """
+        ttl = float(self.get_config('request_ttl', self.DEFAULT_REQUEST_TTL))
+        expired = time.time() - ttl
+        with self.requests_lock:
+            requests = list(self.requests.items())
+        self._remove_requests(
+            [(request_id, request) for request_id, request in requests
+             if request.is_finished() and request.finished_at < expired])
+
+
+    def _remove_requests(self, requests):
+        with self.requests_lock:
+            for request_id, request in requests:
+                if self.requests.get(request_id) is request:
+                    del self.requests[request_id]
+
+
+    def get_request(self, request_id):
+        with self.requests_lock:
+            return self.requests.get(request_id)
+
+
+    def list_requests(self):
+        self.prune_requests()
+        with self.requests_lock:
+            return list(self.requests.values())
+
+
+    def remove_request(self, request_id):
+        with self.requests_lock:
+            return self.requests.pop(request_id, None)
+
+
+    def remove_finished_requests(self):
+        """
+        Returns the number of requests removed
+        """
+        with self.requests_lock:
+            requests = list(self.requests.items())
+        finished = [(request_id, request) for request_id, request in requests
+                    if request.is_finished()]
+        self._remove_requests(finished)
+        return len(finished)
 
 
     def submit_request(self, _request, **kwargs):
+        self.prune_requests()
         request = CommandsRequest(_request)
         with self.requests_lock:
-            self.requests.append(request)
+            self.requests[request.id] = request
+            self.request_stats['submitted'] += 1
+        if not (request.running or request.finished or request.failed):
+            # Nothing to run, finished already
+            self._account_request(request)
         if kwargs.get('wait', 0):
-            while not request.is_finished():
-                time.sleep(0.001)
+            request.wait()
         return request
 
 
@@ -173,6 +173,9 @@ class Module(MgrModule):
     def _self_test_perf_counters(self):
         self.get_perf_schema("osd", "0")
         self.get_counter("osd", "0", "osd.op")
+        self.get_perf_counters("osd", "0")
+        self.get_latest_counters("osd", "0")
+        self.get_all_perf_counters()
         #get_counter
         #get_all_perf_coutners
 
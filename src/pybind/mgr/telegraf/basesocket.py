@@ -34,6 +34,44 @@ class BaseSocket(object):
     def send(self, data, flags=0):
         return self.sock.send(data.encode('utf-8') + b'\n', flags)
 
+    @property
+    def is_datagram(self):
+        return self.sock.type == socket.SOCK_DGRAM
+
+    def send_lines(self, lines, max_payload):
+        """
+        Send newline terminated lines.  On datagram sockets the lines are
+        packed into datagrams of at most max_payload bytes (a longer line
+        is sent on its own), on stream sockets they are sent in a single
+        write.
+
+        :param lines: list of encoded lines
+        :return: tuple of the number of datagrams or writes and of bytes sent
+        """
+        if not lines:
+            return 0, 0
+
+        if not self.is_datagram:
+            data = b'\n'.join(lines) + b'\n'
+            self.sock.sendall(data)
+            return 1, len(data)
+
+        batches = 0
+        sent = 0
+        batch = []
+        batch_size = 0
+        for line in lines:
+            if batch and batch_size + len(line) + 1 > max_payload:
+                sent += self.sock.send(b'\n'.join(batch) + b'\n')
+                batches += 1
+                batch = []
+                batch_size = 0
+            batch.append(line)
+            batch_size += len(line) + 1
+        sent += self.sock.send(b'\n'.join(batch) + b'\n')
+        batches += 1
+        return batches, sent
+
     def __del__(self):
         self.sock.close()
 
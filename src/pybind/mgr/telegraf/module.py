@@ -2,7 +2,7 @@ import errno
 import json
 import socket
 import time
-from threading import Event
+from threading import Event, Lock
 
 from telegraf.basesocket import BaseSocket
 from telegraf.protocol import Line
@@ -47,9 +47,16 @@ class Module(MgrModule):
         {
             'name': 'interval',
             'default': 15
+        },
+        {
+            'name': 'max_payload',
+            'default': 1400
         }
     ]
 
+    # Maximum delay between attempts to connect to Telegraf, in seconds
+    MAX_BACKOFF = 300
+
     ceph_health_mapping = {'HEALTH_OK': 0, 'HEALTH_WARN': 1, 'HEALTH_ERR': 2}
 
     @property
@@ -62,6 +69,12 @@ class Module(MgrModule):
         self.run = True
         self.fsid = None
         self.config = dict()
+        self.sock = None
+        self.sock_lock = Lock()
+        self.backoff = 0
+        self.next_connect = 0
+        self.stats = dict((key, 0) for key in ['lines', 'bytes', 'batches',
+                                                'errors'])
 
     def get_fsid(self):
         if not self.fsid:
@@ -216,7 +229,7 @@ class Module(MgrModule):
             raise RuntimeError('{0} is a unknown configuration '
                                'option'.format(option))
 
-        if option in ['interval']:
+        if option in ['interval', 'max_payload']:
             try:
                 value = int(value)
             except (ValueError, TypeError):
@@ -226,6 +239,10 @@ class Module(MgrModule):
         if option == 'interval' and value < 5:
             raise RuntimeError('interval should be set to at least 5 seconds')
 
+        if option == 'max_payload' and value < 512:
+            raise RuntimeError('max_payload should be set to at least 512 '
+                               'bytes')
+
         self.config[option] = value
 
     def init_module_config(self):
@@ -234,6 +251,9 @@ class Module(MgrModule):
         self.config['interval'] = \
             int(self.get_config("interval",
                                 default=self.config_keys['interval']))
+        self.config['max_payload'] = \
+            int(self.get_config("max_payload",
+                                default=self.config_keys['max_payload']))
 
     def now(self):
         return int(round(time.time() * 1000000000))
@@ -245,28 +265,95 @@ class Module(MgrModule):
         measurements += self.get_cluster_stats()
         return measurements
 
-    def send_to_telegraf(self):
+    def get_sender_stats(self):
+        data = list()
+        for key, value in self.stats.items():
+            data.append({
+                'measurement': 'ceph_telegraf_stats',
+                'tags': {
+                    'type_instance': key,
+                    'fsid': self.get_fsid()
+                },
+                'value': value
+            })
+        return data
+
+    def get_socket(self):
+        """
+        Return the socket connected to Telegraf, connecting it first if
+        required.  After a failed attempt, connecting is retried with an
+        exponential backoff.
+
+        :return: BaseSocket or None if not connected
+        """
         url = urlparse(self.config['address'])
+        if self.sock is not None and self.sock.url != url:
+            self.close_socket()
 
-        sock = BaseSocket(url)
-        self.log.debug('Sending data to Telegraf at %s', sock.address)
+        if self.sock is None:
+            if time.time() < self.next_connect:
+                return None
+
+            self.log.debug('Connecting to Telegraf at %s', url.geturl())
+            try:
+                sock = BaseSocket(url)
+                sock.connect()
+            except (socket.error, RuntimeError, IOError):
+                self.backoff = min(max(self.backoff * 2, 1), self.MAX_BACKOFF)
+                self.next_connect = time.time() + self.backoff
+                self.log.exception('Failed to connect to Telegraf, retrying in '
+                                   '%d seconds:', self.backoff)
+                self.stats['errors'] += 1
+                return None
+            self.sock = sock
+            self.backoff = 0
+
+        return self.sock
+
+    def close_socket(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send_to_telegraf(self):
         now = self.now()
-        with sock as s:
+        lines = []
+        for measurement in self.gather_measurements() + \
+                self.get_sender_stats():
+            line = Line(measurement['measurement'],
+                        measurement['value'],
+                        measurement['tags'], now)
+            lines.append(line.to_line_protocol().encode('utf-8'))
+
+        with self.sock_lock:
+            sock = self.get_socket()
+            if sock is None:
+                self.log.warning('Not connected to Telegraf, dropping %d lines',
+                                 len(lines))
+                return
+
+            self.log.debug('Sending %d lines to Telegraf at %s', len(lines),
+                           sock.address)
             try:
-                for measurement in self.gather_measurements():
-                    self.log.debug(measurement)
-                    line = Line(measurement['measurement'],
-                                measurement['value'],
-                                measurement['tags'], now)
-                    self.log.debug(line.to_line_protocol())
-                    s.send(line.to_line_protocol())
-            except (socket.error, RuntimeError, errno, IOError):
+                batches, sent = sock.send_lines(lines,
+                                                self.config['max_payload'])
+            except (socket.error, RuntimeError, IOError):
                 self.log.exception('Failed to send statistics to Telegraf:')
+                self.stats['errors'] += 1
+                # reconnect on the next interval
+                self.close_socket()
+                return
+
+            self.stats['lines'] += len(lines)
+            self.stats['bytes'] += sent
+            self.stats['batches'] += batches
 
     def shutdown(self):
         self.log.info('Stopping Telegraf module')
         self.run = False
         self.event.set()
+        with self.sock_lock:
+            self.close_socket()
 
     def handle_command(self, cmd):
         if cmd['prefix'] == 'telegraf config-show':
@@ -2,11 +2,14 @@
 Zabbix module for ceph-mgr
 
 Collect statistics from Ceph cluster and every X seconds send data to a Zabbix
-server using the zabbix_sender executable.
+server using the Zabbix sender protocol.
 """
 import json
 import errno
-from subprocess import Popen, PIPE
+import re
+import socket
+import struct
+import time
 from threading import Event
 from mgr_module import MgrModule
 
@@ -19,32 +22,109 @@ def avg(data):
 
 
 class ZabbixSender(object):
-    def __init__(self, sender, host, port, log):
-        self.sender = sender
+    """
+    Client for the protocol spoken by zabbix_sender to the trapper of a
+    Zabbix server or proxy: a 'ZBXD' header followed by a JSON request, to
+    which the server replies in the same format.
+    """
+    HEADER = b'ZBXD\x01'
+    HEADER_LEN = len(HEADER) + 8
+    # zabbix_sender sends at most 250 values per request
+    BATCH_SIZE = 250
+    TIMEOUT = 10
+
+    def __init__(self, host, port, log):
         self.host = host
         self.port = port
         self.log = log
+        self.sock = None
+
+    def connect(self):
+        self.close()
+        self.log.debug('Connecting to Zabbix server %s:%d', self.host,
+                       self.port)
+        self.sock = socket.create_connection((self.host, self.port),
+                                             self.TIMEOUT)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _recv(self, length):
+        data = b''
+        while len(data) < length:
+            chunk = self.sock.recv(length - len(data))
+            if not chunk:
+                raise socket.error('Connection closed by Zabbix server')
+            data += chunk
+        return data
 
-    def send(self, hostname, data):
-        if len(data) == 0:
-            return
-
-        cmd = [self.sender, '-z', self.host, '-p', str(self.port), '-s',
-               hostname, '-vv', '-i', '-']
-
-        self.log.debug('Executing: %s', cmd)
-
-        proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
-
-        for key, value in data.items():
-            proc.stdin.write('{0} ceph.{1} {2}\n'.format(hostname, key, value))
+    def _send(self, payload):
+        self.sock.sendall(self.HEADER + struct.pack('<Q', len(payload)) +
+                          payload)
+
+    def _receive(self):
+        header = self._recv(self.HEADER_LEN)
+        if header[:len(self.HEADER)] != self.HEADER:
+            raise RuntimeError('Invalid response header from Zabbix server')
+        length, = struct.unpack('<Q', header[len(self.HEADER):])
+        return json.loads(self._recv(length).decode('utf-8'))
+
+    def request(self, request):
+        """
+        Send a request on a new connection, as the server closes the
+        connection after each response.
+
+        Sending the request is tried once more on a new connection if it
+        fails, but not once it is sent: the server may have processed it
+        even if no response came back.
+
+        :return: the decoded response
+        """
+        payload = json.dumps(request).encode('utf-8')
+        try:
+            try:
+                self.connect()
+                self._send(payload)
+            except socket.error as e:
+                self.log.debug('Failed to send to Zabbix server (%s), '
+                               'retrying', e)
+                self.connect()
+                self._send(payload)
+            return self._receive()
+        finally:
+            self.close()
+
+    def send(self, items):
+        """
+        :param items: list of (host, key, value) tuples, possibly for
+            different hosts
+        :return: tuple of the number of processed and failed items
+        """
+        processed = 0
+        failed = 0
+        clock = int(time.time())
+        for i in range(0, len(items), self.BATCH_SIZE):
+            response = self.request({
+                'request': 'sender data',
+                'data': [{'host': host, 'key': key, 'value': str(value),
+                          'clock': clock}
+                         for host, key, value in items[i:i + self.BATCH_SIZE]],
+                'clock': clock
+            })
+            if response.get('response') != 'success':
+                raise RuntimeError('Zabbix server rejected data: %s' %
+                                   response.get('info', response))
 
-        stdout, stderr = proc.communicate()
-        if proc.returncode != 0:
-            raise RuntimeError('%s exited non-zero: %s' % (self.sender,
-                                                           stderr))
+            info = response.get('info', '')
+            self.log.debug('Zabbix Sender: %s', info)
+            match = re.search(r'processed:? (\d+).*failed:? (\d+)', info)
+            if match:
+                processed += int(match.group(1))
+                failed += int(match.group(2))
 
-        self.log.debug('Zabbix Sender: %s', stdout.rstrip())
+        return processed, failed
 
 
 class Module(MgrModule):
@@ -57,8 +137,13 @@ class Module(MgrModule):
         return dict((o['name'], o.get('default', None))
                 for o in self.OPTIONS)
 
+    # Send the OSD discovery data at least every DISCOVERY_INTERVAL intervals
+    DISCOVERY_INTERVAL = 10
+
     OPTIONS = [
             {
+                # unused, the module speaks the Zabbix sender protocol
+                # itself; kept for compatibility with existing configurations
                 'name': 'zabbix_sender',
                 'default': '/usr/bin/zabbix_sender'
             },
@@ -107,6 +192,9 @@ class Module(MgrModule):
     def __init__(self, *args, **kwargs):
         super(Module, self).__init__(*args, **kwargs)
         self.event = Event()
+        self.zabbix = None
+        self.discovered_osds = None
+        self.sends_since_discovery = 0
 
     def init_module_config(self):
         self.fsid = self.get('mon_map')['fsid']
@@ -235,9 +323,68 @@ class Module(MgrModule):
 
         return data
 
-    def send(self):
-        data = self.get_data()
+    def get_osd_data(self):
+        """
+        :return: dict of OSD id to dict of per-OSD item to value
+        """
+        osds = dict()
+        for osd in self.get('osd_map')['osds']:
+            osds[osd['osd']] = {
+                'up': osd['up'],
+                'in': osd['in']
+            }
 
+        for osd in self.get('osd_stats')['osd_stats']:
+            data = osds.get(osd['osd'])
+            if data is None:
+                continue
+            if osd['kb'] != 0:
+                data['fill'] = \
+                    (float(osd['kb_used']) / float(osd['kb'])) * 100
+            data['num_pgs'] = osd['num_pgs']
+            data['latency_apply'] = \
+                osd['perf_stat']['apply_latency_ns'] / 1000000.0  # ns -> ms
+            data['latency_commit'] = \
+                osd['perf_stat']['commit_latency_ns'] / 1000000.0  # ns -> ms
+
+        return osds
+
+    def get_items(self, identifier):
+        """
+        :return: list of (host, key, value) items to send
+        """
+        items = [(identifier, 'ceph.{0}'.format(key), value)
+                 for key, value in self.get_data().items()]
+
+        osds = self.get_osd_data()
+        osd_ids = sorted(osds.keys())
+        self.sends_since_discovery += 1
+        if osd_ids != self.discovered_osds or \
+                self.sends_since_discovery >= self.DISCOVERY_INTERVAL:
+            discovery = [{'{#OSD}': osd_id} for osd_id in osd_ids]
+            items.append((identifier, 'ceph.zabbix.osd.discovery',
+                          json.dumps({'data': discovery})))
+            self.discovered_osds = osd_ids
+            self.sends_since_discovery = 0
+
+        for osd_id in osd_ids:
+            for key, value in osds[osd_id].items():
+                items.append((identifier,
+                              'ceph.osd[{0},{1}]'.format(osd_id, key), value))
+
+        return items
+
+    def get_sender(self):
+        host = self.config['zabbix_host']
+        port = self.config['zabbix_port']
+        if self.zabbix is None or \
+                (self.zabbix.host, self.zabbix.port) != (host, port):
+            if self.zabbix is not None:
+                self.zabbix.close()
+            self.zabbix = ZabbixSender(host, port, self.log)
+        return self.zabbix
+
+    def send(self):
         identifier = self.config['identifier']
         if identifier is None or len(identifier) == 0:
             identifier = 'ceph-{0}'.format(self.fsid)
@@ -258,17 +405,18 @@ class Module(MgrModule):
             self.log.info(
                 'Sending data to Zabbix server %s as host/identifier %s',
                 self.config['zabbix_host'], identifier)
-            self.log.debug(data)
-
-            zabbix = ZabbixSender(self.config['zabbix_sender'],
-                                  self.config['zabbix_host'],
-                                  self.config['zabbix_port'], self.log)
+            items = self.get_items(identifier)
+            self.log.debug(items)
 
-            zabbix.send(identifier, data)
+            processed, failed = self.get_sender().send(items)
+            self.log.debug('Zabbix server processed %d items, %d failed',
+                           processed, failed)
             self.set_health_checks(dict())
             return True
         except Exception as exc:
             self.log.error('Exception when sending: %s', exc)
+            # resend the discovery data with the next items
+            self.discovered_osds = None
             self.set_health_checks({
                 'MGR_ZABBIX_SEND_FAILED': {
                     'severity': 'warning',
@@ -312,6 +460,8 @@ class Module(MgrModule):
         self.log.info('Stopping zabbix')
         self.run = False
         self.event.set()
+        if self.zabbix is not None:
+            self.zabbix.close()
 
     def serve(self):
         self.log.info('Zabbix module starting up')
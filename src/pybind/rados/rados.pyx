@@ -14,6 +14,8 @@ method.
 # Copyright 2016 Mehdi Abaakouk <sileht@redhat.com>
 
 from cpython cimport PyObject, ref
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, \
+    PyBUF_SIMPLE, PyBUF_WRITABLE
 from cpython.pycapsule cimport *
 from libc cimport errno
 from libc.stdint cimport *
@@ -23,7 +25,12 @@ import sys
 import threading
 import time
 
-from collections import Callable
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from collections import Callable, deque
 from datetime import datetime
 from functools import partial, wraps
 from itertools import chain
@@ -91,11 +98,19 @@ cdef extern from "rados/librados.h" nogil:
     ctypedef void* rados_xattrs_iter_t
     ctypedef void* rados_omap_iter_t
     ctypedef void* rados_list_ctx_t
+    ctypedef void* rados_object_list_cursor
     ctypedef uint64_t rados_snap_t
     ctypedef void *rados_write_op_t
     ctypedef void *rados_read_op_t
     ctypedef void *rados_completion_t
     ctypedef void (*rados_callback_t)(rados_completion_t cb, void *arg)
+    ctypedef struct rados_object_list_item:
+        size_t oid_length
+        char *oid
+        size_t nspace_length
+        char *nspace
+        size_t locator_length
+        char *locator
     ctypedef void (*rados_log_callback_t)(void *arg, const char *line, const char *who,
                                           uint64_t sec, uint64_t nsec, uint64_t seq, const char *level, const char *msg)
     ctypedef void (*rados_log_callback2_t)(void *arg, const char *line, const char *channel, const char *who, const char *name,
@@ -223,6 +238,18 @@ cdef extern from "rados/librados.h" nogil:
     int rados_nobjects_list_next(rados_list_ctx_t ctx, const char **entry, const char **key, const char **nspace)
     void rados_nobjects_list_close(rados_list_ctx_t ctx)
 
+    rados_object_list_cursor rados_object_list_begin(rados_ioctx_t io)
+    rados_object_list_cursor rados_object_list_end(rados_ioctx_t io)
+    void rados_object_list_cursor_free(rados_ioctx_t io, rados_object_list_cursor cur)
+    int rados_object_list_cursor_cmp(rados_ioctx_t io, rados_object_list_cursor lhs, rados_object_list_cursor rhs)
+    int rados_object_list(rados_ioctx_t io, const rados_object_list_cursor start, const rados_object_list_cursor finish,
+                          const size_t result_size, const char *filter_buf, const size_t filter_buf_len,
+                          rados_object_list_item *results, rados_object_list_cursor *next)
+    void rados_object_list_free(const size_t result_size, rados_object_list_item *results)
+    void rados_object_list_slice(rados_ioctx_t io, const rados_object_list_cursor start, const rados_object_list_cursor finish,
+                                 const size_t n, const size_t m, rados_object_list_cursor *split_start,
+                                 rados_object_list_cursor *split_finish)
+
     int rados_ioctx_pool_requires_alignment2(rados_ioctx_t io, int * requires)
     int rados_ioctx_pool_required_alignment2(rados_ioctx_t io, uint64_t * alignment)
 
@@ -294,6 +321,7 @@ cdef extern from "rados/librados.h" nogil:
     int rados_aio_read_op_operate(rados_read_op_t read_op, rados_ioctx_t io, rados_completion_t completion, const char *oid, int flags)
     void rados_read_op_set_flags(rados_read_op_t read_op, int flags)
     int rados_omap_get_next(rados_omap_iter_t iter, const char * const* key, const char * const* val, size_t * len)
+    int rados_omap_get_next2(rados_omap_iter_t iter, char **key, char **val, size_t *key_len, size_t *val_len)
     void rados_omap_get_end(rados_omap_iter_t iter)
 
 
@@ -577,6 +605,26 @@ cdef char ** to_bytes_array(list_bytes):
 
 
 
+cdef class _Buffer(object):
+    """
+    The contiguous memory of an object supporting the buffer protocol
+    (bytes, bytearray, memoryview, mmap...), held until this is freed,
+    so that librados can read from or write to it without a copy.
+    """
+    cdef:
+        Py_buffer view
+        bint held
+
+    def __cinit__(self, obj, writable=False):
+        PyObject_GetBuffer(obj, &self.view,
+                           PyBUF_WRITABLE if writable else PyBUF_SIMPLE)
+        self.held = True
+
+    def __dealloc__(self):
+        if self.held:
+            PyBuffer_Release(&self.view)
+
+
 cdef int __monitor_callback(void *arg, const char *line, const char *who,
                              uint64_t sec, uint64_t nsec, uint64_t seq,
                              const char *level, const char *msg) with gil:
@@ -1572,6 +1620,108 @@ cdef class OmapIterator(object):
             rados_omap_get_end(self.ctx)
 
 
+cdef class _OmapReadOp(object):
+    """
+    Read op getting omap values, which keeps the results of the operation
+    until they are collected, so that it can be sent asynchronously
+    """
+
+    cdef:
+        ReadOp read_op
+        rados_omap_iter_t iter
+        unsigned char more
+        int prval
+        bint raw
+        Completion completion
+
+    def __cinit__(self, raw=False):
+        self.read_op = ReadOp().create()
+        self.raw = raw
+
+    def get_vals(self, start_after, filter_prefix, max_return):
+        start_after = cstr(start_after, 'start_after') if start_after else None
+        filter_prefix = cstr(filter_prefix, 'filter_prefix') if filter_prefix else None
+        cdef:
+            char *_start_after = opt_str(start_after)
+            char *_filter_prefix = opt_str(filter_prefix)
+            uint64_t _max_return = max_return
+
+        with nogil:
+            rados_read_op_omap_get_vals2(self.read_op.read_op, _start_after,
+                                         _filter_prefix, _max_return,
+                                         &self.iter, &self.more, &self.prval)
+
+    def get_vals_by_keys(self, keys):
+        keys = cstr_list(keys, 'keys')
+        cdef:
+            char **_keys = to_bytes_array(keys)
+            size_t key_num = len(keys)
+
+        try:
+            with nogil:
+                rados_read_op_omap_get_vals_by_keys(self.read_op.read_op,
+                                                    <const char**>_keys,
+                                                    key_num, &self.iter,
+                                                    &self.prval)
+        finally:
+            free(_keys)
+
+    def send(self, Ioctx ioctx, oid, oncomplete=None):
+        self.completion = ioctx.operate_aio_read_op(self.read_op, oid,
+                                                    oncomplete)
+        return self.completion
+
+    def wait(self):
+        if self.completion is not None:
+            self.completion.wait_for_complete_and_cb()
+
+    def has_more(self):
+        return bool(self.more)
+
+    def items(self, msg):
+        """
+        Wait for the operation and get the (key, value) pairs it read
+
+        :raises: :class:`Error`
+        :returns: list of (key, value) pairs, sorted by key
+        """
+        self.wait()
+        ret = self.completion.get_return_value()
+        if ret >= 0:
+            ret = self.prval
+        if ret < 0:
+            raise make_ex(ret, msg)
+
+        cdef:
+            char *key_ = NULL
+            char *val_ = NULL
+            size_t key_len_ = 0
+            size_t val_len_ = 0
+            int r
+
+        items = []
+        while True:
+            # the values were all read by the operation, there is no
+            # point in releasing the GIL to step through them
+            r = rados_omap_get_next2(self.iter, &key_, &val_, &key_len_,
+                                     &val_len_)
+            if r != 0:
+                raise make_ex(r, msg)
+            if key_ == NULL:
+                break
+            key = key_[:key_len_]
+            if not self.raw:
+                key = decode_cstr(key)
+            items.append((key, val_[:val_len_] if val_ != NULL else None))
+        return items
+
+    def __dealloc__(self):
+        if self.iter != NULL:
+            with nogil:
+                rados_omap_get_end(self.iter)
+        self.read_op.release()
+
+
 cdef class ObjectIterator(object):
     """rados.Ioctx Object iterator"""
 
@@ -1951,49 +2101,50 @@ cdef class WriteOp(object):
         with nogil:
             rados_write_op_set_flags(self.write_op, _flags)
 
-    @requires(('to_write', bytes))
     def append(self, to_write):
         """
         Append data to an object synchronously
         :param to_write: data to write
-        :type to_write: bytes
+        :type to_write: bytes-like object
         """
 
         cdef:
-            char *_to_write = to_write
-            size_t length = len(to_write)
+            _Buffer to_write_buf = _Buffer(to_write)
+            char *_to_write = <char *>to_write_buf.view.buf
+            size_t length = to_write_buf.view.len
 
         with nogil:
             rados_write_op_append(self.write_op, _to_write, length)
 
-    @requires(('to_write', bytes))
     def write_full(self, to_write):
         """
         Write whole object, atomically replacing it.
         :param to_write: data to write
-        :type to_write: bytes
+        :type to_write: bytes-like object
         """
 
         cdef:
-            char *_to_write = to_write
-            size_t length = len(to_write)
+            _Buffer to_write_buf = _Buffer(to_write)
+            char *_to_write = <char *>to_write_buf.view.buf
+            size_t length = to_write_buf.view.len
 
         with nogil:
             rados_write_op_write_full(self.write_op, _to_write, length)
 
-    @requires(('to_write', bytes), ('offset', int))
+    @requires(('to_write', object), ('offset', int))
     def write(self, to_write, offset=0):
         """
         Write to offset.
         :param to_write: data to write
-        :type to_write: bytes
+        :type to_write: bytes-like object
         :param offset: byte offset in the object to begin writing at
         :type offset: int
         """
 
         cdef:
-            char *_to_write = to_write
-            size_t length = len(to_write)
+            _Buffer to_write_buf = _Buffer(to_write)
+            char *_to_write = <char *>to_write_buf.view.buf
+            size_t length = to_write_buf.view.len
             uint64_t _offset = offset
 
         with nogil:
@@ -2199,7 +2350,7 @@ cdef class Ioctx(object):
             raise make_ex(ret, "error stating %s" % object_name)
         return completion
 
-    @requires(('object_name', str_type), ('to_write', bytes), ('offset', int),
+    @requires(('object_name', str_type), ('to_write', object), ('offset', int),
               ('oncomplete', opt(Callable)), ('onsafe', opt(Callable)))
     def aio_write(self, object_name, to_write, offset=0,
                   oncomplete=None, onsafe=None):
@@ -2211,7 +2362,7 @@ cdef class Ioctx(object):
         :param object_name: name of the object
         :type object_name: str
         :param to_write: data to write
-        :type to_write: bytes
+        :type to_write: bytes-like object
         :param offset: byte offset in the object to begin writing at
         :type offset: int
         :param oncomplete: what to do when the write is safe and complete in memory
@@ -2230,8 +2381,9 @@ cdef class Ioctx(object):
         cdef:
             Completion completion
             char* _object_name = object_name
-            char* _to_write = to_write
-            size_t size = len(to_write)
+            _Buffer to_write_buf = _Buffer(to_write)
+            char *_to_write = <char *>to_write_buf.view.buf
+            size_t size = to_write_buf.view.len
             uint64_t _offset = offset
 
         completion = self.__get_completion(oncomplete, onsafe)
@@ -2244,7 +2396,7 @@ cdef class Ioctx(object):
             raise make_ex(ret, "error writing object %s" % object_name)
         return completion
 
-    @requires(('object_name', str_type), ('to_write', bytes), ('oncomplete', opt(Callable)),
+    @requires(('object_name', str_type), ('to_write', object), ('oncomplete', opt(Callable)),
               ('onsafe', opt(Callable)))
     def aio_write_full(self, object_name, to_write,
                        oncomplete=None, onsafe=None):
@@ -2258,7 +2410,7 @@ cdef class Ioctx(object):
         :param object_name: name of the object
         :type object_name: str
         :param to_write: data to write
-        :type to_write: str
+        :type to_write: bytes-like object
         :param oncomplete: what to do when the write is safe and complete in memory
             on all replicas
         :type oncomplete: completion
@@ -2275,8 +2427,9 @@ cdef class Ioctx(object):
         cdef:
             Completion completion
             char* _object_name = object_name
-            char* _to_write = to_write
-            size_t size = len(to_write)
+            _Buffer to_write_buf = _Buffer(to_write)
+            char *_to_write = <char *>to_write_buf.view.buf
+            size_t size = to_write_buf.view.len
 
         completion = self.__get_completion(oncomplete, onsafe)
         self.__track_completion(completion)
@@ -2289,7 +2442,7 @@ cdef class Ioctx(object):
             raise make_ex(ret, "error writing object %s" % object_name)
         return completion
 
-    @requires(('object_name', str_type), ('to_append', bytes), ('oncomplete', opt(Callable)),
+    @requires(('object_name', str_type), ('to_append', object), ('oncomplete', opt(Callable)),
               ('onsafe', opt(Callable)))
     def aio_append(self, object_name, to_append, oncomplete=None, onsafe=None):
         """
@@ -2300,7 +2453,7 @@ cdef class Ioctx(object):
         :param object_name: name of the object
         :type object_name: str
         :param to_append: data to append
-        :type to_append: str
+        :type to_append: bytes-like object
         :param offset: byte offset in the object to begin writing at
         :type offset: int
         :param oncomplete: what to do when the write is safe and complete in memory
@@ -2318,8 +2471,9 @@ cdef class Ioctx(object):
         cdef:
             Completion completion
             char* _object_name = object_name
-            char* _to_append = to_append
-            size_t size = len(to_append)
+            _Buffer to_append_buf = _Buffer(to_append)
+            char *_to_append = <char *>to_append_buf.view.buf
+            size_t size = to_append_buf.view.len
 
         completion = self.__get_completion(oncomplete, onsafe)
         self.__track_completion(completion)
@@ -2380,7 +2534,7 @@ cdef class Ioctx(object):
         def oncomplete_(completion_v):
             cdef Completion _completion_v = completion_v
             return_value = _completion_v.get_return_value()
-            if return_value > 0 and return_value != length:
+            if return_value >= 0 and return_value != length:
                 _PyBytes_Resize(&_completion_v.buf, return_value)
             return oncomplete(_completion_v, <object>_completion_v.buf if return_value >= 0 else None)
 
@@ -2396,6 +2550,61 @@ cdef class Ioctx(object):
             raise make_ex(ret, "error reading %s" % object_name)
         return completion
 
+    @requires(('object_name', str_type), ('buffer', object), ('offset', int),
+              ('oncomplete', opt(Callable)))
+    def aio_readinto(self, object_name, buffer, offset, oncomplete):
+        """
+        Asychronously read data from an object into a writable buffer
+
+        Up to len(buffer) bytes are read.  The buffer must not be resized
+        or released until the read is complete.
+
+        oncomplete will be called with the number of bytes read as well
+        as the completion:
+
+        oncomplete(completion, length_read)
+
+        :param object_name: name of the object to read from
+        :type object_name: str
+        :param buffer: where to read the data to
+        :type buffer: writable bytes-like object (bytearray, memoryview...)
+        :param offset: byte offset in the object to begin reading from
+        :type offset: int
+        :param oncomplete: what to do when the read is complete
+        :type oncomplete: completion
+
+        :raises: :class:`Error`
+        :returns: completion object
+        """
+
+        object_name = cstr(object_name, 'object_name')
+
+        cdef:
+            Completion completion
+            char* _object_name = object_name
+            uint64_t _offset = offset
+            _Buffer buf = _Buffer(buffer, writable=True)
+            char *_buf = <char *>buf.view.buf
+            size_t _length = buf.view.len
+
+        def oncomplete_(completion_v):
+            cdef Completion _completion_v = completion_v
+            return_value = _completion_v.get_return_value()
+            return oncomplete(_completion_v, return_value if return_value >= 0 else None)
+
+        completion = self.__get_completion(oncomplete_, None)
+        # the completion holds the buffer until librados is done with it
+        ref.Py_INCREF(buf)
+        completion.buf = <PyObject*>buf
+        self.__track_completion(completion)
+        with nogil:
+            ret = rados_aio_read(self.io, _object_name, completion.rados_comp,
+                                 _buf, _length, _offset)
+        if ret < 0:
+            completion._cleanup()
+            raise make_ex(ret, "error reading %s" % object_name)
+        return completion
+
     @requires(('object_name', str_type), ('cls', str_type), ('method', str_type),
               ('data', bytes), ('length', int),
               ('oncomplete', opt(Callable)), ('onsafe', opt(Callable)))
@@ -2446,7 +2655,7 @@ cdef class Ioctx(object):
         def oncomplete_(completion_v):
             cdef Completion _completion_v = completion_v
             return_value = _completion_v.get_return_value()
-            if return_value > 0 and return_value != length:
+            if return_value >= 0 and return_value != length:
                 _PyBytes_Resize(&_completion_v.buf, return_value)
             return oncomplete(_completion_v, <object>_completion_v.buf if return_value >= 0 else None)
 
@@ -2500,6 +2709,101 @@ cdef class Ioctx(object):
             raise make_ex(ret, "error removing %s" % object_name)
         return completion
 
+    @requires(('items', object), ('max_in_flight', int))
+    def write_many(self, items, max_in_flight=128):
+        """
+        Write many objects, replacing their content
+
+        The writes are sent asynchronously, with at most `max_in_flight`
+        of them in flight, as earlier ones complete.  A failed write does
+        not stop the others.
+
+        :param items: the data to write of each object
+        :type items: iterable of (object name, bytes) pairs, or a dict
+        :param max_in_flight: maximum number of writes sent at once
+        :type max_in_flight: int
+
+        :raises: :class:`Error`
+        :returns: dict of the error of each object which could not be
+            written, empty on success
+        """
+        self.require_ioctx_open()
+        if isinstance(items, dict):
+            items = items.items()
+
+        def op(object_name, data):
+            return (object_name,
+                    lambda cb: self.aio_write_full(object_name, data, cb),
+                    lambda: None, "error writing %s" % object_name)
+
+        return dict((name, result) for name, result in _pipeline(
+            (op(name, data) for name, data in items), max_in_flight, False)
+            if isinstance(result, Exception))
+
+    @requires(('object_names', object), ('length', int), ('max_in_flight', int),
+              ('ordered', bool))
+    def read_many(self, object_names, length=8192, max_in_flight=128,
+                  ordered=True):
+        """
+        Read many objects
+
+        The reads are sent asynchronously, with at most `max_in_flight`
+        of them in flight, as earlier ones complete and as the results are
+        consumed.  A failed read does not stop the others.
+
+        :param object_names: the names of the objects
+        :type object_names: iterable of str
+        :param length: the number of bytes to read of each object
+        :type length: int
+        :param max_in_flight: maximum number of reads sent at once
+        :type max_in_flight: int
+        :param ordered: return the objects in the order of `object_names`
+            rather than as their reads complete
+        :type ordered: bool
+
+        :raises: :class:`Error`
+        :returns: iterator over (object name, data) pairs, where data is
+            the bytes read, or the :class:`Error` of the object
+        """
+        self.require_ioctx_open()
+
+        def op(object_name):
+            return (object_name,
+                    lambda cb: self.aio_read(object_name, length, 0, cb),
+                    lambda data: data, "error reading %s" % object_name)
+
+        return _pipeline((op(name) for name in object_names), max_in_flight,
+                         ordered)
+
+    @requires(('object_names', object), ('max_in_flight', int))
+    def remove_many(self, object_names, max_in_flight=128):
+        """
+        Remove many objects
+
+        The removals are sent asynchronously, with at most `max_in_flight`
+        of them in flight, as earlier ones complete.  A failed removal
+        does not stop the others.
+
+        :param object_names: the names of the objects
+        :type object_names: iterable of str
+        :param max_in_flight: maximum number of removals sent at once
+        :type max_in_flight: int
+
+        :raises: :class:`Error`
+        :returns: dict of the error of each object which could not be
+            removed, empty on success
+        """
+        self.require_ioctx_open()
+
+        def op(object_name):
+            return (object_name,
+                    lambda cb: self.aio_remove(object_name, cb),
+                    lambda: None, "error removing %s" % object_name)
+
+        return dict((name, result) for name, result in _pipeline(
+            (op(name) for name in object_names), max_in_flight, False)
+            if isinstance(result, Exception))
+
     def require_ioctx_open(self):
         """
         Checks if the rados.Ioctx object state is 'open'
@@ -2625,7 +2929,7 @@ cdef class Ioctx(object):
             self.state = "closed"
 
 
-    @requires(('key', str_type), ('data', bytes))
+    @requires(('key', str_type), ('data', object))
     def write(self, key, data, offset=0):
         """
         Write data to an object synchronously
@@ -2633,7 +2937,7 @@ cdef class Ioctx(object):
         :param key: name of the object
         :type key: str
         :param data: data to write
-        :type data: bytes
+        :type data: bytes-like object
         :param offset: byte offset in the object to begin writing at
         :type offset: int
 
@@ -2646,8 +2950,9 @@ cdef class Ioctx(object):
         key = cstr(key, 'key')
         cdef:
             char *_key = key
-            char *_data = data
-            size_t length = len(data)
+            _Buffer data_buf = _Buffer(data)
+            char *_data = <char *>data_buf.view.buf
+            size_t length = data_buf.view.len
             uint64_t _offset = offset
 
         with nogil:
@@ -2661,7 +2966,7 @@ cdef class Ioctx(object):
             raise LogicError("Ioctx.write(%s): rados_write \
 returned %d, but should return zero on success." % (self.name, ret))
 
-    @requires(('key', str_type), ('data', bytes))
+    @requires(('key', str_type), ('data', object))
     def write_full(self, key, data):
         """
         Write an entire object synchronously.
@@ -2672,7 +2977,7 @@ returned %d, but should return zero on success." % (self.name, ret))
         :param key: name of the object
         :type key: str
         :param data: data to write
-        :type data: bytes
+        :type data: bytes-like object
 
         :raises: :class:`TypeError`
         :raises: :class:`Error`
@@ -2682,8 +2987,9 @@ returned %d, but should return zero on success." % (self.name, ret))
         key = cstr(key, 'key')
         cdef:
             char *_key = key
-            char *_data = data
-            size_t length = len(data)
+            _Buffer data_buf = _Buffer(data)
+            char *_data = <char *>data_buf.view.buf
+            size_t length = data_buf.view.len
 
         with nogil:
             ret = rados_write_full(self.io, _key, _data, length)
@@ -2696,7 +3002,7 @@ returned %d, but should return zero on success." % (self.name, ret))
             raise LogicError("Ioctx.write_full(%s): rados_write_full \
 returned %d, but should return zero on success." % (self.name, ret))
 
-    @requires(('key', str_type), ('data', bytes))
+    @requires(('key', str_type), ('data', object))
     def append(self, key, data):
         """
         Append data to an object synchronously
@@ -2704,7 +3010,7 @@ returned %d, but should return zero on success." % (self.name, ret))
         :param key: name of the object
         :type key: str
         :param data: data to write
-        :type data: bytes
+        :type data: bytes-like object
 
         :raises: :class:`TypeError`
         :raises: :class:`LogicError`
@@ -2714,8 +3020,9 @@ returned %d, but should return zero on success." % (self.name, ret))
         key = cstr(key, 'key')
         cdef:
             char *_key = key
-            char *_data = data
-            size_t length = len(data)
+            _Buffer data_buf = _Buffer(data)
+            char *_data = <char *>data_buf.view.buf
+            size_t length = data_buf.view.len
 
         with nogil:
             ret = rados_append(self.io, _key, _data, length)
@@ -2772,6 +3079,80 @@ returned %d, but should return zero on success." % (self.name, ret))
             # itself and set ret_s to NULL, hence XDECREF).
             ref.Py_XDECREF(ret_s)
 
+    @requires(('key', str_type), ('buffer', object), ('offset', int))
+    def readinto(self, key, buffer, offset=0):
+        """
+        Read data from an object synchronously into a writable buffer
+
+        Up to len(buffer) bytes are read, without allocating a new bytes
+        object per call as :meth:`read` does.
+
+        :param key: name of the object
+        :type key: str
+        :param buffer: where to read the data to
+        :type buffer: writable bytes-like object (bytearray, memoryview...)
+        :param offset: byte offset in the object to begin reading at
+        :type offset: int
+
+        :raises: :class:`TypeError`
+        :raises: :class:`Error`
+        :returns: int - number of bytes read
+        """
+        self.require_ioctx_open()
+        key = cstr(key, 'key')
+        cdef:
+            char *_key = key
+            _Buffer buf = _Buffer(buffer, writable=True)
+            char *_buf = <char *>buf.view.buf
+            size_t _length = buf.view.len
+            uint64_t _offset = offset
+
+        with nogil:
+            ret = rados_read(self.io, _key, _buf, _length, _offset)
+        if ret < 0:
+            raise make_ex(ret, "Ioctx.readinto(%s): failed to read %s" % (self.name, key))
+        return ret
+
+    @requires(('key', str_type), ('buffers', object), ('offset', int))
+    def writev(self, key, buffers, offset=0):
+        """
+        Write a sequence of buffers to consecutive ranges of an object,
+        atomically, without joining them first
+
+        :param key: name of the object
+        :type key: str
+        :param buffers: data to write
+        :type buffers: iterable of bytes-like objects
+        :param offset: byte offset in the object to begin writing at
+        :type offset: int
+
+        :raises: :class:`TypeError`
+        :raises: :class:`Error`
+        :returns: int - number of bytes written
+        """
+        self.require_ioctx_open()
+        key = cstr(key, 'key')
+        bufs = [_Buffer(b) for b in buffers]
+        cdef:
+            char *_key = key
+            uint64_t _offset = offset
+            _Buffer buf
+            rados_write_op_t write_op = rados_create_write_op()
+
+        try:
+            for buf in bufs:
+                rados_write_op_write(write_op, <char *>buf.view.buf,
+                                     buf.view.len, _offset)
+                _offset += buf.view.len
+            with nogil:
+                ret = rados_write_op_operate(write_op, self.io, _key, NULL, 0)
+        finally:
+            rados_release_write_op(write_op)
+        if ret < 0:
+            raise make_ex(ret, "Ioctx.writev(%s): failed to write %s"
+                          % (self.name, key))
+        return _offset - offset
+
     @requires(('key', str_type), ('cls', str_type), ('method', str_type), ('data', bytes))
     def execute(self, key, cls, method, data, length=8192):
         """
@@ -3084,6 +3465,81 @@ returned %d, but should return zero on success." % (self.name, ret))
         self.require_ioctx_open()
         return ObjectIterator(self)
 
+    @requires(('shard', int), ('shards', int), ('batch_size', int))
+    def list_objects_batched(self, shard=0, shards=1, batch_size=1000):
+        """
+        List the objects of a shard of the pool, in batches.
+
+        The pool is split in `shards` ranges of object hashes of about the
+        same size, which can be listed concurrently by as many threads or
+        processes.  Unlike :meth:`list_objects`, the objects are returned
+        as plain tuples, many per call to librados.
+
+        :param shard: the shard to list, from 0 to shards - 1
+        :type shard: int
+        :param shards: the number of shards the pool is split in
+        :type shards: int
+        :param batch_size: the maximum number of objects per batch
+        :type batch_size: int
+
+        :raises: :class:`Error`
+        :returns: iterator over lists of (name, locator, namespace) tuples
+        """
+        self.require_ioctx_open()
+        if shards < 1 or not 0 <= shard < shards:
+            raise InvalidArgumentError("shard must be in [0, %d)" % shards)
+        if batch_size < 1:
+            raise InvalidArgumentError("batch_size must be positive")
+
+        cdef:
+            size_t _shard = shard
+            size_t _shards = shards
+            size_t _batch_size = batch_size
+            int ret
+            size_t i
+            rados_object_list_item *items = NULL
+            rados_object_list_cursor begin = rados_object_list_begin(self.io)
+            rados_object_list_cursor end = rados_object_list_end(self.io)
+            rados_object_list_cursor start = rados_object_list_begin(self.io)
+            rados_object_list_cursor finish = rados_object_list_end(self.io)
+
+        try:
+            items = <rados_object_list_item *>realloc_chk(
+                NULL, sizeof(rados_object_list_item) * _batch_size)
+            with nogil:
+                rados_object_list_slice(self.io, begin, end, _shard, _shards,
+                                        &start, &finish)
+            while True:
+                with nogil:
+                    ret = rados_object_list_cursor_cmp(self.io, start, finish)
+                if ret >= 0:
+                    break
+                with nogil:
+                    ret = rados_object_list(self.io, start, finish,
+                                            _batch_size, NULL, 0, items,
+                                            &start)
+                if ret < 0:
+                    raise make_ex(ret, "error listing the objects of ioctx '%s'"
+                                  % self.name)
+                batch = []
+                try:
+                    for i in range(ret):
+                        batch.append((
+                            decode_cstr(items[i].oid[:items[i].oid_length]),
+                            decode_cstr(items[i].locator[:items[i].locator_length])
+                            if items[i].locator_length else None,
+                            decode_cstr(items[i].nspace[:items[i].nspace_length])))
+                finally:
+                    rados_object_list_free(ret, items)
+                if batch:
+                    yield batch
+        finally:
+            free(items)
+            rados_object_list_cursor_free(self.io, begin)
+            rados_object_list_cursor_free(self.io, end)
+            rados_object_list_cursor_free(self.io, start)
+            rados_object_list_cursor_free(self.io, finish)
+
     def list_snaps(self):
         """
         Get SnapIterator on rados.Ioctx object.
@@ -3506,6 +3962,137 @@ returned %d, but should return zero on success." % (self.name, ret))
         with nogil:
             rados_write_op_omap_clear(_write_op.write_op)
 
+    @requires(('oid', str_type), ('prefix', opt(str_type)), ('page_size', int),
+              ('start_after', opt(str_type)))
+    def omap_iter(self, oid, prefix=None, page_size=1000, start_after=None,
+                  raw=False):
+        """
+        Iterate over the omap of an object
+
+        The omap is read by pages of `page_size` pairs.  The next page is
+        requested as soon as a page is read, so that it is on its way while
+        the caller goes through the current one.
+
+        :param oid: the name of the object
+        :type oid: str
+        :param prefix: iterate only over the keys beginning with prefix
+        :type prefix: str
+        :param page_size: the number of pairs read at once
+        :type page_size: int
+        :param start_after: iterate only over the keys after start_after
+        :type start_after: str
+        :param raw: return the keys as bytes instead of decoding them
+        :type raw: bool
+
+        :raises: :class:`Error`
+        :returns: iterator over the (key, value) pairs, sorted by key
+        """
+        self.require_ioctx_open()
+        if page_size < 1:
+            raise InvalidArgumentError("page_size must be positive")
+        msg = "error getting omap values of %s" % oid
+
+        def send(start_after):
+            op = _OmapReadOp(raw)
+            op.get_vals(start_after, prefix, page_size)
+            op.send(self, oid)
+            return op
+
+        op = send(start_after)
+        try:
+            while op is not None:
+                items = op.items(msg)
+                op = send(items[-1][0]) if op.has_more() and items else None
+                for item in items:
+                    yield item
+        finally:
+            # do not release a read op still in flight
+            if op is not None:
+                op.wait()
+
+    @requires(('items', object), ('max_in_flight', int))
+    def omap_set_many(self, items, max_in_flight=128):
+        """
+        Set omap values of many objects
+
+        One write operation is sent per object, with at most
+        `max_in_flight` of them sent at once.
+
+        :param items: the values to set of each object
+        :type items: iterable of (object name, dict of key to value) pairs,
+            or a dict
+        :param max_in_flight: maximum number of operations sent at once
+        :type max_in_flight: int
+
+        :raises: :class:`Error`
+        :returns: dict of the error of each object which could not be
+            updated, empty on success
+        """
+        self.require_ioctx_open()
+        if isinstance(items, dict):
+            items = items.items()
+
+        def op(oid, values):
+            def send(oncomplete):
+                write_op = WriteOp().create()
+
+                def oncomplete_(completion):
+                    write_op.release()
+                    oncomplete(completion)
+
+                try:
+                    self.set_omap(write_op, tuple(values.keys()),
+                                  tuple(values.values()))
+                    return self.operate_aio_write_op(write_op, oid,
+                                                     oncomplete_)
+                except:
+                    write_op.release()
+                    raise
+
+            return (oid, send, lambda: None,
+                    "error setting omap values of %s" % oid)
+
+        return dict((oid, result) for oid, result in _pipeline(
+            (op(oid, values) for oid, values in items), max_in_flight, False)
+            if isinstance(result, Exception))
+
+    @requires(('oids', object), ('keys', tuple), ('raw', bool),
+              ('max_in_flight', int), ('ordered', bool))
+    def omap_get_many(self, oids, keys, raw=False, max_in_flight=128,
+                      ordered=True):
+        """
+        Get omap values of many objects
+
+        One read operation is sent per object, with at most
+        `max_in_flight` of them sent at once.
+
+        :param oids: the names of the objects
+        :type oids: iterable of str
+        :param keys: the keys to get
+        :type keys: tuple
+        :param raw: return the keys as bytes instead of decoding them
+        :type raw: bool
+        :param max_in_flight: maximum number of operations sent at once
+        :type max_in_flight: int
+        :param ordered: return the objects in the order of `oids` rather
+            than as their operations complete
+        :type ordered: bool
+
+        :raises: :class:`Error`
+        :returns: iterator over (object name, values) pairs, where values
+            is a dict of the keys found, or the :class:`Error` of the object
+        """
+        self.require_ioctx_open()
+
+        def op(oid):
+            read_op = _OmapReadOp(raw)
+            read_op.get_vals_by_keys(keys)
+            msg = "error getting omap values of %s" % oid
+            return (oid, lambda cb: read_op.send(self, oid, cb),
+                    lambda: dict(read_op.items(msg)), msg)
+
+        return _pipeline((op(oid) for oid in oids), max_in_flight, ordered)
+
     @requires(('key', str_type), ('name', str_type), ('cookie', str_type), ('desc', str_type),
               ('duration', opt(int)), ('flags', int))
     def lock_exclusive(self, key, name, cookie, desc="", duration=None, flags=0):
@@ -3819,6 +4406,440 @@ returned %d, but should return zero on success." % (self.name, ret))
         return alignment
 
 
+def list_objects_parallel(ioctx, workers=8, shards=None, batch_size=1000):
+    """
+    List the objects of a pool with several threads.
+
+    The pool is split in `shards` shards (4 per worker by default) which
+    are listed by `workers` threads with :meth:`Ioctx.list_objects_batched`.
+    The batches are returned as they are listed, in no particular order.
+
+    To list a pool from several processes instead, have each of them call
+    ``ioctx.list_objects_batched(shard, shards)`` for its own shards.
+
+    :param ioctx: the io context of the pool (and namespace) to list
+    :type ioctx: :class:`Ioctx`
+    :param workers: the number of threads listing the pool
+    :type workers: int
+    :param shards: the number of shards the pool is split in
+    :type shards: int
+    :param batch_size: the maximum number of objects per batch
+    :type batch_size: int
+
+    :raises: :class:`Error`
+    :returns: iterator over lists of (name, locator, namespace) tuples
+    """
+    if workers < 1:
+        raise InvalidArgumentError("workers must be positive")
+    if shards is None:
+        shards = workers * 4
+    todo = iter(range(shards))
+    todo_lock = threading.Lock()
+    # a bounded queue, so that the workers wait for a slow consumer
+    results = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def work():
+        try:
+            while not stop.is_set():
+                with todo_lock:
+                    shard = next(todo, None)
+                if shard is None:
+                    break
+                for batch in ioctx.list_objects_batched(shard, shards,
+                                                        batch_size):
+                    if not put(('batch', batch)):
+                        return
+        except Exception as e:
+            put(('error', e))
+        finally:
+            put(('done', None))
+
+    threads = [threading.Thread(target=work)
+               for _ in range(min(workers, shards))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            kind, value = results.get()
+            if kind == 'done':
+                running -= 1
+            elif kind == 'error':
+                raise value
+            else:
+                yield value
+    finally:
+        # also stops the workers if the caller stops iterating early
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+class _PipelineOp(object):
+    """An operation run by :func:`_pipeline`"""
+
+    __slots__ = ('name', 'result', 'msg', 'completion', 'outcome',
+                 'finished')
+
+    def __init__(self, name, result, msg):
+        self.name = name
+        self.result = result
+        self.msg = msg
+        self.completion = None
+        self.outcome = None
+        self.finished = False
+
+    def get_result(self):
+        if isinstance(self.outcome, Error):
+            return self.outcome
+        ret, args = self.outcome
+        try:
+            return make_ex(ret, self.msg) if ret < 0 else self.result(*args)
+        except Error as e:
+            return e
+
+
+def _pipeline(ops, max_in_flight, ordered):
+    """
+    Run asynchronous operations with at most `max_in_flight` in flight
+
+    The operations are (name, send, result, msg) tuples, sent with
+    ``send(oncomplete)`` which returns their completion.  librados calls
+    ``oncomplete(completion, *args)`` and the result of the operation is
+    then ``result(*args)``, or ``make_ex(ret, msg)`` if it failed.
+
+    :returns: iterator over the (name, result or :class:`Error`) pairs of
+        the operations, in order or as they complete
+    """
+    if max_in_flight < 1:
+        raise InvalidArgumentError("max_in_flight must be positive")
+    done = queue.Queue()
+    # the operations not returned yet, in sending order
+    window = deque()
+
+    def callback(op):
+        # called from a librados thread
+        def oncomplete(completion, *args):
+            op.outcome = (completion.get_return_value(), args)
+            done.put(op)
+        return oncomplete
+
+    ops = iter(ops)
+    try:
+        while True:
+            for name, send, result, msg in ops:
+                op = _PipelineOp(name, result, msg)
+                try:
+                    op.completion = send(callback(op))
+                except Error as e:
+                    op.outcome = e
+                    done.put(op)
+                window.append(op)
+                if len(window) >= max_in_flight:
+                    break
+            if not window:
+                return
+            if ordered:
+                while not window[0].finished:
+                    done.get().finished = True
+                op = window.popleft()
+            else:
+                op = done.get()
+                window.remove(op)
+            yield op.name, op.get_result()
+    finally:
+        # the buffers of the operations in flight must outlive them
+        for op in window:
+            if op.completion is not None:
+                op.completion.wait_for_complete_and_cb()
+
+
+class AsyncIoctx(object):
+    """
+    asyncio adapter of a :class:`Ioctx`
+
+    The asynchronous operations of the Ioctx are returned as asyncio
+    futures, which are resolved in the event loop when librados completes
+    them.  At most ``max_in_flight`` operations are sent to the cluster at
+    once, the others are queued and sent as earlier ones complete.
+
+    Cancelling a future drops its operation if it has not been sent yet.
+    Operations already sent cannot be recalled: they run to completion
+    and their result is discarded.
+
+    The methods must be called from the thread running the event loop.
+
+    :param ioctx: the io context to run the operations on
+    :type ioctx: :class:`Ioctx`
+    :param max_in_flight: maximum number of operations sent at once
+    :type max_in_flight: int
+    :param loop: the event loop, defaults to the current event loop
+    """
+
+    def __init__(self, ioctx, max_in_flight=128, loop=None):
+        import asyncio
+
+        if max_in_flight < 1:
+            raise InvalidArgumentError("max_in_flight must be positive")
+        self.ioctx = ioctx
+        self.max_in_flight = max_in_flight
+        self.loop = loop or asyncio.get_event_loop()
+        self._in_flight = 0
+        self._queued = deque()
+
+    @property
+    def in_flight(self):
+        """Number of operations sent and not completed yet"""
+        return self._in_flight
+
+    @property
+    def queued(self):
+        """Number of operations waiting for a slot"""
+        return len(self._queued)
+
+    def _submit(self, send, result, msg):
+        future = self.loop.create_future()
+        if self._in_flight < self.max_in_flight:
+            self._send(future, send, result, msg)
+        else:
+            self._queued.append((future, send, result, msg))
+        return future
+
+    def _send_queued(self):
+        while self._queued and self._in_flight < self.max_in_flight:
+            future, send, result, msg = self._queued.popleft()
+            if not future.cancelled():
+                self._send(future, send, result, msg)
+
+    def _send(self, future, send, result, msg):
+        loop = self.loop
+
+        # called from a librados thread
+        def oncomplete(completion, *args):
+            try:
+                loop.call_soon_threadsafe(self._complete, future,
+                                          completion.get_return_value(),
+                                          args, result, msg)
+            except RuntimeError:
+                # the loop is closed: nobody awaits the result anymore
+                pass
+
+        self._in_flight += 1
+        try:
+            send(oncomplete)
+        except Exception as e:
+            self._in_flight -= 1
+            if not future.cancelled():
+                future.set_exception(e)
+
+    def _complete(self, future, ret, args, result, msg):
+        self._in_flight -= 1
+        self._send_queued()
+        if future.cancelled():
+            return
+        if ret < 0:
+            future.set_exception(make_ex(ret, msg))
+        else:
+            future.set_result(result(*args))
+
+    def stat(self, object_name):
+        """
+        Get object stats (size/mtime)
+
+        :param object_name: the name of the object to get stats from
+        :type object_name: str
+
+        :returns: future of the (size, timestamp) of the object
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_stat(object_name, cb),
+            lambda size, mtime: (size, mtime),
+            "error stating %s" % object_name)
+
+    def read(self, object_name, length=8192, offset=0):
+        """
+        Read data from an object
+
+        :param object_name: name of the object to read from
+        :type object_name: str
+        :param length: the number of bytes to read (default=8192)
+        :type length: int
+        :param offset: byte offset in the object to begin reading from
+        :type offset: int
+
+        :returns: future of the bytes read
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_read(object_name, length, offset, cb),
+            lambda data: data,
+            "error reading %s" % object_name)
+
+    def readinto(self, object_name, buffer, offset=0):
+        """
+        Read data from an object into a writable buffer
+
+        :param object_name: name of the object to read from
+        :type object_name: str
+        :param buffer: where to read the data to, must not be resized
+            until the future is resolved
+        :type buffer: writable bytes-like object (bytearray, memoryview...)
+        :param offset: byte offset in the object to begin reading from
+        :type offset: int
+
+        :returns: future of the number of bytes read
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_readinto(object_name, buffer, offset,
+                                               cb),
+            lambda length: length,
+            "error reading %s" % object_name)
+
+    def write(self, object_name, to_write, offset=0):
+        """
+        Write data to an object
+
+        :param object_name: name of the object
+        :type object_name: str
+        :param to_write: data to write
+        :type to_write: bytes
+        :param offset: byte offset in the object to begin writing at
+        :type offset: int
+
+        :returns: future resolved once the write is complete
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_write(object_name, to_write, offset,
+                                            oncomplete=cb),
+            lambda: None,
+            "error writing object %s" % object_name)
+
+    def write_full(self, object_name, to_write):
+        """
+        Write an entire object
+
+        :param object_name: name of the object
+        :type object_name: str
+        :param to_write: data to write
+        :type to_write: bytes
+
+        :returns: future resolved once the write is complete
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_write_full(object_name, to_write,
+                                                 oncomplete=cb),
+            lambda: None,
+            "error writing object %s" % object_name)
+
+    def append(self, object_name, to_append):
+        """
+        Append data to an object
+
+        :param object_name: name of the object
+        :type object_name: str
+        :param to_append: data to append
+        :type to_append: bytes
+
+        :returns: future resolved once the write is complete
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_append(object_name, to_append,
+                                             oncomplete=cb),
+            lambda: None,
+            "error appending object %s" % object_name)
+
+    def remove(self, object_name):
+        """
+        Remove an object
+
+        :param object_name: name of the object to remove
+        :type object_name: str
+
+        :returns: future resolved once the object is removed
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_remove(object_name, oncomplete=cb),
+            lambda: None,
+            "error removing %s" % object_name)
+
+    def execute(self, object_name, cls, method, data, length=8192):
+        """
+        Execute an OSD class method on an object
+
+        :param object_name: name of the object
+        :type object_name: str
+        :param cls: name of the object class
+        :type cls: str
+        :param method: name of the method
+        :type method: str
+        :param data: input data
+        :type data: bytes
+        :param length: size of output buffer in bytes (default=8192)
+        :type length: int
+
+        :returns: future of the data returned by the method
+        """
+        return self._submit(
+            lambda cb: self.ioctx.aio_execute(object_name, cls, method, data,
+                                              length, oncomplete=cb),
+            lambda out: out,
+            "error executing %s::%s on %s" % (cls, method, object_name))
+
+    def operate_write_op(self, write_op, oid, mtime=0,
+                         flags=LIBRADOS_OPERATION_NOFLAG):
+        """
+        Execute a write operation
+
+        :para write_op: write operation object
+        :type write_op: WriteOp
+        :para oid: object name
+        :type oid: str
+        :para mtime: the time to set the mtime to, 0 for the current time
+        :type mtime: int
+        :para flags: flags to apply to the entire operation
+        :type flags: int
+
+        :returns: future resolved once the operation is complete
+        """
+        return self._submit(
+            lambda cb: self.ioctx.operate_aio_write_op(
+                write_op, oid, oncomplete=cb, mtime=mtime, flags=flags),
+            lambda: None,
+            "Failed to operate aio write op for oid %s" % oid)
+
+    def operate_read_op(self, read_op, oid, flag=LIBRADOS_OPERATION_NOFLAG):
+        """
+        Execute a read operation
+
+        The results are available from the iterators returned when the
+        read operation was built, once the future is resolved.
+
+        :para read_op: read operation object
+        :type read_op: ReadOp
+        :para oid: object name
+        :type oid: str
+        :para flag: flags to apply to the entire operation
+        :type flag: int
+
+        :returns: future resolved once the operation is complete
+        """
+        return self._submit(
+            lambda cb: self.ioctx.operate_aio_read_op(
+                read_op, oid, oncomplete=cb, flag=flag),
+            lambda: None,
+            "Failed to operate aio read op for oid %s" % oid)
+
+
 def set_object_locator(func):
     def retfunc(self, *args, **kwargs):
         if self.locator_key is not None:
@@ -18,6 +18,8 @@ import cython
 import sys
 
 from cpython cimport PyObject, ref, exc
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, \
+    PyBUF_SIMPLE, PyBUF_WRITABLE
 from libc cimport errno
 from libc.stdint cimport *
 from libc.stdlib cimport realloc, free
@@ -44,6 +46,11 @@ cdef extern from "time.h":
         time_t tv_sec
         long tv_nsec
 
+cdef extern from "sys/uio.h":
+    cdef struct iovec:
+        void *iov_base
+        size_t iov_len
+
 cdef extern from "limits.h":
     cdef uint64_t INT64_MAX
 
@@ -397,6 +404,8 @@ cdef extern from "rbd/librbd.h" nogil:
 
     int rbd_aio_write2(rbd_image_t image, uint64_t off, size_t len,
                        const char *buf, rbd_completion_t c, int op_flags)
+    int rbd_aio_writev(rbd_image_t image, const iovec *iov, int iovcnt,
+                       uint64_t off, rbd_completion_t c)
     int rbd_aio_read2(rbd_image_t image, uint64_t off, size_t len,
                       char *buf, rbd_completion_t c, int op_flags)
     int rbd_aio_discard(rbd_image_t image, uint64_t off, uint64_t len,
@@ -710,6 +719,25 @@ cdef void* realloc_chk(void* ptr, size_t size) except NULL:
         raise MemoryError("realloc failed")
     return ret
 
+cdef class _Buffer(object):
+    """
+    The contiguous memory of an object supporting the buffer protocol
+    (bytes, bytearray, memoryview, mmap...), held until this is freed,
+    so that librbd can read from or write to it without a copy.
+    """
+    cdef:
+        Py_buffer view
+        bint held
+
+    def __cinit__(self, obj, writable=False):
+        PyObject_GetBuffer(obj, &self.view,
+                           PyBUF_WRITABLE if writable else PyBUF_SIMPLE)
+        self.held = True
+
+    def __dealloc__(self):
+        if self.held:
+            PyBuffer_Release(&self.view)
+
 cdef class Completion
 
 cdef void __aio_complete_cb(rbd_completion_t completion, void *args) with gil:
@@ -2593,6 +2621,35 @@ cdef class Image(object):
             # itself and set ret_s to NULL, hence XDECREF).
             ref.Py_XDECREF(ret_s)
 
+    def readinto(self, buffer, offset, fadvise_flags=0):
+        """
+        Read data from the image into a writable buffer, without
+        allocating a new bytes object per call as :meth:`read` does.
+        Raises :class:`InvalidArgument` if part of the range specified
+        is outside the image.
+
+        :param buffer: where to read len(buffer) bytes to
+        :type buffer: writable bytes-like object (bytearray, memoryview...)
+        :param offset: the offset to start reading at
+        :type offset: int
+        :param fadvise_flags: fadvise flags for this read
+        :type fadvise_flags: int
+        :returns: int - the number of bytes read
+        :raises: :class:`InvalidArgument`, :class:`IOError`
+        """
+        cdef:
+            _Buffer buf = _Buffer(buffer, writable=True)
+            char *_buf = <char *>buf.view.buf
+            uint64_t _offset = offset
+            size_t _length = buf.view.len
+            int _fadvise_flags = fadvise_flags
+        with nogil:
+            ret = rbd_read2(self.image, _offset, _length, _buf,
+                            _fadvise_flags)
+        if ret < 0:
+            raise make_ex(ret, 'error reading %s %ld~%ld' % (self.name, offset, _length))
+        return ret
+
     def diff_iterate(self, offset, length, from_snapshot, iterate_cb,
                      include_parent = True, whole_object = False):
         """
@@ -2657,7 +2714,7 @@ cdef class Image(object):
         part of the write would fall outside the image.
 
         :param data: the data to be written
-        :type data: bytes
+        :type data: bytes-like object
         :param offset: where to start writing data
         :type offset: int
         :param fadvise_flags: fadvise flags for this write
@@ -2666,11 +2723,10 @@ cdef class Image(object):
         :raises: :class:`IncompleteWriteError`, :class:`LogicError`,
                  :class:`InvalidArgument`, :class:`IOError`
         """
-        if not isinstance(data, bytes):
-            raise TypeError('data must be a byte string')
         cdef:
-            uint64_t _offset = offset, length = len(data)
-            char *_data = data
+            _Buffer data_buf = _Buffer(data)
+            uint64_t _offset = offset, length = data_buf.view.len
+            char *_data = <char *>data_buf.view.buf
             int _fadvise_flags = fadvise_flags
         with nogil:
             ret = rbd_write2(self.image, _offset, length, _data, _fadvise_flags)
@@ -3147,6 +3203,62 @@ written." % (self.name, ret, length))
 
         return completion
 
+    def aio_readinto(self, buffer, offset, oncomplete, fadvise_flags=0):
+        """
+        Asynchronously read data from the image into a writable buffer
+
+        Raises :class:`InvalidArgument` if part of the range specified is
+        outside the image.  The buffer must not be resized or released
+        until the read is complete.
+
+        oncomplete will be called with the number of bytes read as well
+        as the completion:
+
+        oncomplete(completion, length_read)
+
+        :param buffer: where to read len(buffer) bytes to
+        :type buffer: writable bytes-like object (bytearray, memoryview...)
+        :param offset: the offset to start reading at
+        :type offset: int
+        :param oncomplete: what to do when the read is complete
+        :type oncomplete: completion
+        :param fadvise_flags: fadvise flags for this read
+        :type fadvise_flags: int
+        :returns: :class:`Completion` - the completion object
+        :raises: :class:`InvalidArgument`, :class:`IOError`
+        """
+
+        cdef:
+            _Buffer buf = _Buffer(buffer, writable=True)
+            char *_buf = <char *>buf.view.buf
+            uint64_t _offset = offset
+            size_t _length = buf.view.len
+            int _fadvise_flags = fadvise_flags
+            Completion completion
+
+        def oncomplete_(completion_v):
+            cdef Completion _completion_v = completion_v
+            return_value = _completion_v.get_return_value()
+            return oncomplete(_completion_v, return_value if return_value >= 0 else None)
+
+        completion = self.__get_completion(oncomplete_)
+        # the completion holds the buffer until librbd is done with it
+        ref.Py_INCREF(buf)
+        completion.buf = <PyObject*>buf
+        try:
+            completion.__persist()
+            with nogil:
+                ret = rbd_aio_read2(self.image, _offset, _length, _buf,
+                                    completion.rbd_comp, _fadvise_flags)
+            if ret < 0:
+                raise make_ex(ret, 'error reading %s %ld~%ld' %
+                              (self.name, offset, _length))
+        except:
+            completion.__unpersist()
+            raise
+
+        return completion
+
     def aio_write(self, data, offset, oncomplete, fadvise_flags=0):
         """
         Asynchronously write data to the image
@@ -3159,7 +3271,7 @@ written." % (self.name, ret, length))
         oncomplete(completion)
 
         :param data: the data to be written
-        :type data: bytes
+        :type data: bytes-like object
         :param offset: the offset to start writing at
         :type offset: int
         :param oncomplete: what to do when the write is complete
@@ -3172,8 +3284,9 @@ written." % (self.name, ret, length))
 
         cdef:
             uint64_t _offset = offset
-            char *_data = data
-            size_t _length = len(data)
+            _Buffer data_buf = _Buffer(data)
+            char *_data = <char *>data_buf.view.buf
+            size_t _length = data_buf.view.len
             int _fadvise_flags = fadvise_flags
             Completion completion
 
@@ -3192,6 +3305,58 @@ written." % (self.name, ret, length))
 
         return completion
 
+    def aio_writev(self, buffers, offset, oncomplete):
+        """
+        Asynchronously write a sequence of buffers to consecutive ranges
+        of the image, without joining them first
+
+        Raises :class:`InvalidArgument` if part of the write would fall
+        outside the image.
+
+        oncomplete will be called with the completion:
+
+        oncomplete(completion)
+
+        :param buffers: the data to be written
+        :type buffers: iterable of bytes-like objects
+        :param offset: the offset to start writing at
+        :type offset: int
+        :param oncomplete: what to do when the write is complete
+        :type oncomplete: completion
+        :returns: :class:`Completion` - the completion object
+        :raises: :class:`InvalidArgument`, :class:`IOError`
+        """
+
+        bufs = [_Buffer(b) for b in buffers]
+        cdef:
+            uint64_t _offset = offset
+            int _iovcnt = len(bufs)
+            iovec *_iov = <iovec *>realloc_chk(NULL, max(_iovcnt, 1) * sizeof(iovec))
+            _Buffer buf
+            Completion completion
+
+        try:
+            for i, buf in enumerate(bufs):
+                _iov[i].iov_base = buf.view.buf
+                _iov[i].iov_len = buf.view.len
+
+            completion = self.__get_completion(oncomplete)
+            try:
+                completion.__persist()
+                with nogil:
+                    ret = rbd_aio_writev(self.image, _iov, _iovcnt, _offset,
+                                         completion.rbd_comp)
+                if ret < 0:
+                    raise make_ex(ret, 'error writing %s at %ld' %
+                                  (self.name, offset))
+            except:
+                completion.__unpersist()
+                raise
+        finally:
+            free(_iov)
+
+        return completion
+
     def aio_discard(self, offset, length, oncomplete):
         """
         Asynchronously trim the range from the image. It will be logically
@@ -0,0 +1,125 @@
+#!/usr/bin/env nosetests
+# -*- mode:python; tab-width:4; indent-tabs-mode:t -*-
+# vim: ts=4 sw=4 smarttab expandtab
+#
+"""
+Tests of the requests of the restful mgr module, with the commands
+answered by a fake notify thread.
+
+This is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License version 2, as published by the Free Software
+Foundation.  See file COPYING.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import types
+from unittest import TestCase
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'pybind', 'mgr'))
+# only available within ceph-mgr
+ceph_module = types.ModuleType('ceph_module')
+for base in ('BaseMgrModule', 'BaseMgrStandbyModule', 'BasePyOSDMap',
+             'BasePyOSDMapIncremental', 'BasePyCRUSH'):
+    setattr(ceph_module, base, object)
+sys.modules['ceph_module'] = ceph_module
+
+from mgr_module import MgrModule  # noqa
+from restful.module import Module  # noqa
+
+
+class FakeRestful(Module):
+    """
+    The restful module, sending the commands to a notify thread which
+    completes them in order
+    """
+
+    def __init__(self):
+        # MgrModule.__init__() needs ceph-mgr
+        self.module_name = 'restful'
+        self._logger = logging.getLogger(__name__)
+        init = MgrModule.__init__
+        MgrModule.__init__ = lambda self, *args: None
+        try:
+            super(FakeRestful, self).__init__('restful', None, None)
+        finally:
+            MgrModule.__init__ = init
+        self.commands = Queue()
+        self.notifier = threading.Thread(target=self.notify_commands)
+        self.notifier.daemon = True
+        self.notifier.start()
+
+    def get_config(self, key, default=None):
+        return default
+
+    def send_command(self, result, svc_type, svc_id, command, tag):
+        self.commands.put(tag)
+        # leave time to the other threads to take requests_lock
+        time.sleep(0.05)
+
+    def notify_commands(self):
+        while True:
+            tag = self.commands.get()
+            if tag is None:
+                return
+            self._notify('command', tag)
+
+    def stop(self):
+        self.commands.put(None)
+        self.notifier.join(10)
+
+
+class TestRequests(TestCase):
+    def setUp(self):
+        self.module = FakeRestful()
+
+    def tearDown(self):
+        self.module.stop()
+
+    def test_two_stages_while_listing(self):
+        stop = threading.Event()
+        requests = []
+
+        def list_requests():
+            while not stop.is_set():
+                self.module.list_requests()
+                self.module.get_request_stats()
+
+        def submit():
+            request = self.module.submit_request([
+                [{'prefix': 'osd pool set', 'var': 'size'},
+                 {'prefix': 'osd pool set', 'var': 'min_size'}],
+                [{'prefix': 'osd pool set', 'var': 'pg_num'},
+                 {'prefix': 'osd pool set', 'var': 'pgp_num'}],
+            ])
+            request.wait()
+            requests.append(request)
+
+        # a deadlock leaves the threads hanging, not the test
+        lister = threading.Thread(target=list_requests)
+        lister.daemon = True
+        lister.start()
+        submitter = threading.Thread(target=submit)
+        submitter.daemon = True
+        submitter.start()
+        submitter.join(10)
+        stop.set()
+        lister.join(10)
+        self.assertFalse(submitter.is_alive())
+        self.assertFalse(lister.is_alive())
+
+        request, = requests
+        self.assertEqual(len(request.finished), 4)
+        self.assertEqual(self.module.get_request_stats()['finished'], 1)
+        self.assertEqual(self.module.remove_finished_requests(), 1)
+        self.assertEqual(self.module.list_requests(), [])
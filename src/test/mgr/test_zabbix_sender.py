@@ -0,0 +1,155 @@
+#!/usr/bin/env nosetests
+# -*- mode:python; tab-width:4; indent-tabs-mode:t -*-
+# vim: ts=4 sw=4 smarttab expandtab
+#
+"""
+Tests of the Zabbix sender protocol client of the zabbix mgr module,
+against a fake Zabbix trapper.
+
+This is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License version 2, as published by the Free Software
+Foundation.  See file COPYING.
+"""
+
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+from unittest import TestCase
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'pybind', 'mgr'))
+# only available within ceph-mgr
+sys.modules['ceph_module'] = mock.Mock()
+
+from zabbix.module import ZabbixSender  # noqa
+
+
+def recv_exactly(conn, length):
+    data = b''
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class FakeTrapper(object):
+    """
+    Zabbix trapper answering a request per connection, as Zabbix does,
+    or never answering if `reply` is False
+    """
+
+    def __init__(self, reply=True, failed=0, response='success'):
+        self.reply = reply
+        self.failed = failed
+        self.response = response
+        self.requests = []
+        self.connections = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            try:
+                self.handle(conn)
+            finally:
+                conn.close()
+
+    def handle(self, conn):
+        header = recv_exactly(conn, ZabbixSender.HEADER_LEN)
+        if header is None:
+            return
+        assert header.startswith(b'ZBXD\x01')
+        length, = struct.unpack('<Q', header[5:])
+        request = json.loads(recv_exactly(conn, length).decode('utf-8'))
+        self.requests.append(request)
+        if not self.reply:
+            # wait for the client to give up
+            recv_exactly(conn, 1)
+            return
+        total = len(request['data'])
+        response = json.dumps({
+            'response': self.response,
+            'info': 'processed: %d; failed: %d; total: %d; '
+                    'seconds spent: 0.000123' % (total - self.failed,
+                                                 self.failed, total)
+        }).encode('utf-8')
+        conn.sendall(b'ZBXD\x01' + struct.pack('<Q', len(response)) +
+                     response)
+
+    def close(self):
+        self.sock.close()
+
+
+class TestZabbixSender(TestCase):
+    def setUp(self):
+        self.trapper = None
+
+    def tearDown(self):
+        if self.trapper is not None:
+            self.trapper.close()
+
+    def sender(self, **kwargs):
+        self.trapper = FakeTrapper(**kwargs)
+        return ZabbixSender('127.0.0.1', self.trapper.port,
+                            logging.getLogger(__name__))
+
+    def test_batches(self):
+        sender = self.sender()
+        items = [('ceph', 'ceph.item%d' % i, i) for i in range(600)]
+        self.assertEqual(sender.send(items), (600, 0))
+
+        requests = self.trapper.requests
+        self.assertEqual([len(r['data']) for r in requests], [250, 250, 100])
+        for request in requests:
+            self.assertEqual(request['request'], 'sender data')
+        self.assertEqual(requests[2]['data'][99],
+                         {'host': 'ceph', 'key': 'ceph.item599',
+                          'value': '599', 'clock': requests[2]['clock']})
+
+    def test_reconnects(self):
+        # the trapper closes the connection after each response
+        sender = self.sender()
+        items = [('ceph', 'ceph.item', 1)] * (ZabbixSender.BATCH_SIZE + 1)
+        self.assertEqual(sender.send(items), (251, 0))
+        self.assertEqual(sender.send(items[:1]), (1, 0))
+        self.assertEqual(len(self.trapper.requests), 3)
+        self.assertEqual(self.trapper.connections, 3)
+        self.assertIsNone(sender.sock)
+
+    def test_failed_items(self):
+        sender = self.sender(failed=2)
+        self.assertEqual(sender.send([('ceph', 'ceph.item', 1)] * 5), (3, 2))
+
+    def test_rejected(self):
+        sender = self.sender(response='failed')
+        self.assertRaises(RuntimeError, sender.send, [('ceph', 'ceph.item', 1)])
+
+    def test_no_resend_after_timeout(self):
+        sender = self.sender(reply=False)
+        sender.TIMEOUT = 0.5
+        self.assertRaises(socket.timeout, sender.send,
+                          [('ceph', 'ceph.item', 1)])
+        self.assertEqual(len(self.trapper.requests), 1)
+        self.assertEqual(self.trapper.connections, 1)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compare the throughput of the object I/O interfaces of the rados bindings
+
+Each mode writes then reads back `--count` objects of `--size` bytes in
+`--pool`, and reports the operations per second.  The objects are removed
+afterwards.
+
+    bench_rados.py --pool rbd --count 10000 --size 4096 sync asyncio many
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+import rados
+
+
+def bench_sync(ioctx, names, data, args):
+    start = time.time()
+    for name in names:
+        ioctx.write_full(name, data)
+    write = time.time() - start
+
+    start = time.time()
+    for name in names:
+        ioctx.read(name, len(data))
+    read = time.time() - start
+    return write, read
+
+
+def bench_asyncio(ioctx, names, data, args):
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    try:
+        aioctx = rados.AsyncIoctx(ioctx, max_in_flight=args.max_in_flight,
+                                  loop=loop)
+        start = time.time()
+        loop.run_until_complete(asyncio.gather(
+            *[aioctx.write_full(name, data) for name in names]))
+        write = time.time() - start
+
+        start = time.time()
+        loop.run_until_complete(asyncio.gather(
+            *[aioctx.read(name, len(data)) for name in names]))
+        read = time.time() - start
+    finally:
+        loop.close()
+    return write, read
+
+
+def bench_many(ioctx, names, data, args):
+    start = time.time()
+    errors = ioctx.write_many(((name, data) for name in names),
+                              max_in_flight=args.max_in_flight)
+    write = time.time() - start
+    assert not errors, errors
+
+    start = time.time()
+    for name, result in ioctx.read_many(names, len(data),
+                                        max_in_flight=args.max_in_flight,
+                                        ordered=False):
+        assert not isinstance(result, rados.Error), result
+    read = time.time() - start
+    return write, read
+
+
+MODES = {
+    'sync': bench_sync,
+    'asyncio': bench_asyncio,
+    'many': bench_many,
+}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-c', '--conf', default='',
+                        help='ceph configuration file')
+    parser.add_argument('-p', '--pool', required=True)
+    parser.add_argument('-n', '--count', type=int, default=1000,
+                        help='number of objects (default: %(default)s)')
+    parser.add_argument('-s', '--size', type=int, default=4096,
+                        help='size of the objects (default: %(default)s)')
+    parser.add_argument('--max-in-flight', type=int, default=128,
+                        help='operations in flight of the asynchronous '
+                             'modes (default: %(default)s)')
+    parser.add_argument('modes', nargs='*', choices=sorted(MODES),
+                        default=sorted(MODES))
+    args = parser.parse_args(argv)
+
+    data = b'x' * args.size
+    names = ['bench_rados.%d' % i for i in range(args.count)]
+    with rados.Rados(conffile=args.conf) as cluster:
+        with cluster.open_ioctx(args.pool) as ioctx:
+            print('{:<12} {:>12} {:>12}'.format('mode', 'write op/s',
+                                                'read op/s'))
+            for mode in args.modes:
+                write, read = MODES[mode](ioctx, names, data, args)
+                print('{:<12} {:>12.0f} {:>12.0f}'.format(
+                    mode, args.count / write, args.count / read))
+                errors = ioctx.remove_many(names)
+                if errors:
+                    print('failed to remove %d objects' % len(errors),
+                          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
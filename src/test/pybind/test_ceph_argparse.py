@@ -18,7 +18,8 @@
 from nose.tools import eq_ as eq
 from nose.tools import *
 
-from ceph_argparse import validate_command, parse_json_funcsigs
+from ceph_argparse import validate_command, parse_json_funcsigs, \
+    get_prefix_index, concise_sig, CephPrefix
 
 import os
 import re
@@ -125,6 +126,31 @@ class TestBasic:
         assert_equal({}, validate_command(sigdict, ['–w']))
 
 
+class TestPrefixIndex:
+
+    def test_cached(self):
+        assert get_prefix_index(sigdict) is get_prefix_index(sigdict)
+
+    def test_lookup(self):
+        index = get_prefix_index(sigdict)
+        cmds = [sigdict[cmdtag] for cmdtag in
+                index.lookup(['osd', 'pool', 'get', 'rbd', 'size'])]
+        assert_in('osd pool get', [concise_sig(cmd['sig']).split(' <')[0]
+                                   for cmd in cmds])
+        eq([], index.lookup(['no-such-command']))
+
+    def test_candidates(self):
+        index = get_prefix_index(sigdict)
+        args = ['osd', 'pool', 'get', 'rbd', 'size']
+        candidates = [cmdtag for cmdtag, _ in index.candidates(args)]
+        assert_true(len(candidates) < len(sigdict))
+        # partial matching of the last word
+        for cmdtag, cmd in index.candidates(['osd', 'po']):
+            prefix = [desc.instance.prefix for desc in cmd['sig']
+                      if desc.t == CephPrefix]
+            assert_true(prefix[:1] in ([], ['osd']))
+
+
 class TestPG(TestArgparse):
 
     def test_stat(self):
@@ -11,9 +11,18 @@ License version 2, as published by the Free Software
 Foundation.  See file COPYING.
 """
 
+import json
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
 from unittest import TestCase
 
-from ceph_daemon import DaemonWatcher
+from ceph_daemon import AdminSocketClient, DaemonWatcher
 
 try:
     from StringIO import StringIO
@@ -40,6 +49,97 @@ class TestDaemonWatcher(TestCase):
         dw = DaemonWatcher(None)
         # Can't count on having a tty available during tests, so only test the false case
         self.assertEqual(dw.supports_color(StringIO()), False)
+
+    def test_print_vals(self):
+        dw = DaemonWatcher(['/run/ceph/osd.0.asok', '/run/ceph/osd.1.asok'])
+        dw._schema = {'osd': {'op': {'type': 0xa}, 'numpg': {'type': 0x2}},
+                      'objecter': {'op_lat': {'type': 0x5}}}
+        dw._update_columns(OrderedDict([
+            ('osd', OrderedDict([('op', 'op'), ('numpg', 'pgs')])),
+            ('objecter', OrderedDict([('op_lat', 'lat')]))]))
+        dw._last_values['/run/ceph/osd.0.asok'][:] = \
+            array('d', [100, 0, 10, 0, 4, 0.5])
+        dw._values['/run/ceph/osd.0.asok'][:] = \
+            array('d', [250, 0, 12, 0, 8, 0.508])
+        # osd.1 did not reply
+        dw._values['/run/ceph/osd.1.asok'][:] = \
+            array('d', [float('nan')] * 6)
+        ostr = StringIO()
+        dw._print_vals(ostr)
+        sep = dw.colorize('|', dw.BLUE)
+        self.assertEqual(ostr.getvalue(),
+                         'osd.0 150   12 ' + sep + '  2 \n'
+                         'osd.1   -    - ' + sep + '  - \n')
+
+
+class FakeAdminSocket(object):
+    """
+    Serve the admin socket protocol from a thread, one command per
+    connection, like the daemons do.
+    """
+    DESCRIPTIONS = {
+        'cmd000': {'sig': ['perf', 'dump'], 'help': '', 'module': 'osd',
+                   'perm': 'r', 'avail': 'cli'},
+    }
+
+    def __init__(self, path, reply):
+        self.path = path
+        self.reply = reply
+        self.prefixes = []
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(8)
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+    def _serve(self):
+        while True:
+            conn, _ = self.sock.accept()
+            request = b''
+            while not request.endswith(b'\0'):
+                request += conn.recv(4096)
+            prefix = json.loads(request[:-1].decode('utf-8'))['prefix']
+            self.prefixes.append(prefix)
+            if prefix == 'get_command_descriptions':
+                out = json.dumps(self.DESCRIPTIONS).encode('utf-8')
+            else:
+                out = self.reply
+            conn.sendall(struct.pack('>I', len(out)) + out)
+            conn.close()
+
+
+class TestAdminSocketClient(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.daemons = [
+            FakeAdminSocket(os.path.join(self.dir, 'osd.%d.asok' % i),
+                            b'x' * (i + 1) * 100000)
+            for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_command(self):
+        client = AdminSocketClient(timeout=10)
+        path = self.daemons[0].path
+        self.assertEqual(client.command(path, ['perf', 'dump']), b'x' * 100000)
+        self.assertEqual(client.command(path, ['perf', 'dump']), b'x' * 100000)
+        self.assertEqual(self.daemons[0].prefixes,
+                         ['get_command_descriptions', 'perf dump', 'perf dump'])
+        self.assertRaises(RuntimeError, client.command, path, ['bogus'])
+
+    def test_command_many(self):
+        client = AdminSocketClient(timeout=10)
+        missing = os.path.join(self.dir, 'missing.asok')
+        paths = [d.path for d in self.daemons] + [missing]
+        replies, errors = client.command_many(paths, ['perf', 'dump'])
+        self.assertEqual(sorted(replies.keys()), paths[:-1])
+        for i, daemon in enumerate(self.daemons):
+            self.assertEqual(replies[daemon.path], b'x' * (i + 1) * 100000)
+        self.assertEqual(list(errors.keys()), [missing])
+
+
 # Local Variables:
 # compile-command: "cd ../.. ; make -j4 &&
 #  PYTHONPATH=pybind nosetests --stop \
@@ -0,0 +1,78 @@
+#!/usr/bin/env nosetests
+# -*- mode:python; tab-width:4; indent-tabs-mode:t -*-
+# vim: ts=4 sw=4 smarttab expandtab
+#
+"""
+Tests of "ceph tell --parallel", with the commands sent to the daemons
+replaced by canned replies.
+
+This is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License version 2, as published by the Free Software
+Foundation.  See file COPYING.
+"""
+
+import errno
+import imp
+import io
+import json
+import os
+import sys
+from argparse import Namespace
+from unittest import TestCase
+
+CEPH_IN = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', '..', 'ceph.in')
+
+
+def load_ceph_cli():
+    # ceph.in rewires the standard streams when it is loaded
+    streams = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    try:
+        return imp.load_source('ceph_cli', CEPH_IN)
+    finally:
+        sys.stdout, sys.stderr = streams
+
+
+class TestTellParallel(TestCase):
+    replies = {
+        ('osd', '0'): (0, b'{"version": "1"}', ''),
+        ('osd', '1'): (-errno.EINTR, None, 'Interrupted!'),
+        ('osd', '2'): (0, b'not json', 'some status'),
+    }
+
+    def setUp(self):
+        self.cli = load_ceph_cli()
+        self.cli.get_command_descriptions = \
+            lambda target: (0, b'{}', '', None)
+        self.cli.parse_json_funcsigs = lambda s, consumer: {}
+        self.cli.validate_command = \
+            lambda sigdict, args, verbose: {'prefix': 'version'}
+        self.cli.json_command = \
+            lambda cluster, target, argdict, inbuf, timeout: \
+            self.replies[target]
+
+    def tell(self, output_format):
+        parsed_args = Namespace(output_format=output_format, parallel=2,
+                                target_timeout=5, output_file='-')
+        outf = io.BytesIO()
+        ret = self.cli.tell_parallel(parsed_args, ['version'],
+                                     sorted(self.replies), b'', outf)
+        return ret, outf.getvalue()
+
+    def test_timeout_json(self):
+        ret, output = self.tell('json')
+        self.assertEqual(ret, errno.ETIMEDOUT)
+        results = json.loads(output.decode('utf-8'))
+        self.assertEqual(results['osd.0'],
+                         {'ret': 0, 'outs': '', 'output': {'version': '1'}})
+        self.assertEqual(results['osd.1']['ret'], -errno.ETIMEDOUT)
+        self.assertEqual(results['osd.1']['output'], '')
+        self.assertEqual(results['osd.2']['output'], 'not json')
+
+    def test_timeout_plain(self):
+        ret, output = self.tell(None)
+        self.assertEqual(ret, errno.ETIMEDOUT)
+        self.assertIn(b'{"version": "1"}', output)
+        self.assertIn(b'not json', output)
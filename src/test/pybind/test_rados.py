@@ -2,7 +2,8 @@ from __future__ import print_function
 from nose import SkipTest
 from nose.tools import eq_ as eq, ok_ as ok, assert_raises
 from rados import (Rados, Error, RadosStateError, Object, ObjectExists,
-                   ObjectNotFound, ObjectBusy, requires, opt,
+                   ObjectNotFound, ObjectBusy, requires, opt, AsyncIoctx,
+                   list_objects_parallel,
                    ANONYMOUS_AUID, ADMIN_AUID, LIBRADOS_ALL_NSPACES, WriteOpCtx, ReadOpCtx,
                    LIBRADOS_SNAP_HEAD, LIBRADOS_OPERATION_BALANCE_READS, LIBRADOS_OPERATION_SKIPRWLOCKS, MonitorLog)
 import time
@@ -334,6 +335,28 @@ class TestIoctx(object):
         self.ioctx.write('abc', b'a\0b\0c')
         eq(self.ioctx.read('abc'), b'a\0b\0c')
 
+    def test_write_buffers(self):
+        self.ioctx.write_full('abc', bytearray(b'abc'))
+        self.ioctx.write('abc', memoryview(b'xBCx')[1:3], 1)
+        self.ioctx.append('abc', memoryview(bytearray(b'd')))
+        eq(self.ioctx.read('abc'), b'aBCd')
+        assert_raises(TypeError, self.ioctx.write_full, 'abc', 42)
+
+    def test_writev(self):
+        eq(self.ioctx.writev('abc', [b'ab', bytearray(b'c'), memoryview(b'de')]), 5)
+        eq(self.ioctx.writev('abc', [b'C', b'D'], 2), 2)
+        eq(self.ioctx.read('abc'), b'abCDe')
+
+    def test_readinto(self):
+        self.ioctx.write('abc', b'abcdef')
+        buf = bytearray(4)
+        eq(self.ioctx.readinto('abc', buf), 4)
+        eq(buf, bytearray(b'abcd'))
+        eq(self.ioctx.readinto('abc', memoryview(buf)[1:], 4), 2)
+        eq(buf, bytearray(b'aefd'))
+        assert_raises(BufferError, self.ioctx.readinto, 'abc', b'immutable')
+        assert_raises(ObjectNotFound, self.ioctx.readinto, 'nope', buf)
+
     def test_trunc(self):
         self.ioctx.write('abc', b'abc')
         self.ioctx.trunc('abc', 2)
@@ -352,6 +375,29 @@ class TestIoctx(object):
         object_names = [obj.key for obj in self.ioctx.list_objects()]
         eq(sorted(object_names), ['a', 'b', 'c', 'd'])
 
+    def test_list_objects_batched(self):
+        names = set('obj%d' % i for i in range(100))
+        for name in names:
+            self.ioctx.write(name, b'')
+        listed = []
+        for shard in range(5):
+            for batch in self.ioctx.list_objects_batched(shard, 5, batch_size=7):
+                assert len(batch) <= 7
+                listed.extend(name for name, locator, nspace in batch)
+        eq(len(listed), len(names))
+        eq(set(listed), names)
+        assert_raises(Error, next, self.ioctx.list_objects_batched(5, 5))
+
+    def test_list_objects_parallel(self):
+        names = set('obj%d' % i for i in range(100))
+        for name in names:
+            self.ioctx.write(name, b'')
+        listed = [obj[0] for batch in list_objects_parallel(self.ioctx, workers=3,
+                                                           batch_size=10)
+                  for obj in batch]
+        eq(len(listed), len(names))
+        eq(set(listed), names)
+
     def test_list_ns_objects(self):
         self.ioctx.write('a', b'')
         self.ioctx.write('b', b'foo')
@@ -581,6 +627,50 @@ class TestIoctx(object):
             self.ioctx.operate_read_op(read_op, "hw")
             eq(list(iter), [])
 
+    def test_write_read_remove_many(self):
+        data = dict(('obj%d' % i, ('data%d' % i).encode()) for i in range(30))
+        data['empty'] = b''
+        names = sorted(data)
+        eq(self.ioctx.write_many(data, max_in_flight=4), {})
+        eq(list(self.ioctx.read_many(names, max_in_flight=4)),
+           [(name, data[name]) for name in names])
+        got = dict(self.ioctx.read_many(names + ['no_such'], length=4,
+                                        ordered=False))
+        eq(len(got), 32)
+        eq(got['obj1'], b'data')
+        eq(got['empty'], b'')
+        assert isinstance(got['no_such'], ObjectNotFound)
+        errors = self.ioctx.remove_many(names + ['no_such'], max_in_flight=4)
+        eq(list(errors), ['no_such'])
+        assert isinstance(errors['no_such'], ObjectNotFound)
+        eq(list(self.ioctx.list_objects()), [])
+
+    def test_omap_iter(self):
+        keys = tuple('key%03d' % i for i in range(25))
+        values = tuple(('val%d' % i).encode() for i in range(25))
+        with WriteOpCtx(self.ioctx) as write_op:
+            self.ioctx.set_omap(write_op, keys + ('other',), values + (b'x',))
+            self.ioctx.operate_write_op(write_op, "hw")
+        eq(list(self.ioctx.omap_iter("hw", prefix="key", page_size=4)),
+           list(zip(keys, values)))
+        eq(list(self.ioctx.omap_iter("hw", page_size=10, start_after="key020")),
+           list(zip(keys[21:], values[21:])) + [('other', b'x')])
+        eq(next(self.ioctx.omap_iter("hw", raw=True)), (b'key000', b'val0'))
+        with assert_raises(ObjectNotFound):
+            next(self.ioctx.omap_iter("no_such"))
+
+    def test_omap_set_get_many(self):
+        eq(self.ioctx.omap_set_many(
+            dict(('obj%d' % i, {'a': b'1', 'b': ('%d' % i).encode()})
+                 for i in range(20)), max_in_flight=4), {})
+        got = list(self.ioctx.omap_get_many(['obj%d' % i for i in range(20)],
+                                            ('b', 'c'), max_in_flight=4))
+        eq(got, [('obj%d' % i, {'b': ('%d' % i).encode()}) for i in range(20)])
+        got = dict(self.ioctx.omap_get_many(['obj1', 'no_such'], ('a',),
+                                            raw=True, ordered=False))
+        eq(got['obj1'], {b'a': b'1'})
+        assert isinstance(got['no_such'], ObjectNotFound)
+
     def test_locator(self):
         self.ioctx.set_locator_key("bar")
         self.ioctx.write('foo', b'contents1')
@@ -830,6 +920,24 @@ class TestIoctx(object):
         ret, buf = self.ioctx.execute("foo", "hello", "say_hello", b"nose")
         eq(buf, b"Hello, nose!")
 
+    def test_aio_readinto(self):
+        retval = [None]
+        lock = threading.Condition()
+        def cb(_, length):
+            with lock:
+                retval[0] = length
+                lock.notify()
+        self.ioctx.write("foo", b"bar\000frob")
+        buf = bytearray(16)
+        comp = self.ioctx.aio_readinto("foo", memoryview(buf)[2:], 3, cb)
+        comp.wait_for_complete()
+        with lock:
+            while retval[0] is None:
+                lock.wait()
+        eq(retval[0], 5)
+        eq(buf[:7], bytearray(b"\0\0\000frob"))
+        [i.remove() for i in self.ioctx.list_objects()]
+
     def test_aio_execute(self):
         count = [0]
         retval = [None]
@@ -903,6 +1011,81 @@ class TestIoctx(object):
         eq(self.ioctx.alignment(), None)
 
 
+class TestAsyncIoctx(object):
+
+    def setUp(self):
+        if _python2:
+            raise SkipTest("asyncio requires Python 3")
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        self.rados = Rados(conffile='')
+        self.rados.connect()
+        self.rados.create_pool('test_pool')
+        assert self.rados.pool_exists('test_pool')
+        self.ioctx = self.rados.open_ioctx('test_pool')
+        self.aioctx = AsyncIoctx(self.ioctx, max_in_flight=4, loop=self.loop)
+
+    def tearDown(self):
+        self.ioctx.close()
+        self.rados.delete_pool('test_pool')
+        self.rados.shutdown()
+        self.loop.close()
+
+    def _run(self, future):
+        return self.loop.run_until_complete(future)
+
+    def _gather(self, futures):
+        import asyncio
+        return self._run(asyncio.gather(*futures))
+
+    def test_write_read(self):
+        self._gather([self.aioctx.write_full('foo%d' % i, b'bar%d' % i)
+                      for i in range(16)])
+        eq(self._gather([self.aioctx.read('foo%d' % i) for i in range(16)]),
+           [b'bar%d' % i for i in range(16)])
+        self._run(self.aioctx.write_full('empty', b''))
+        eq(self._run(self.aioctx.read('empty')), b'')
+        self._run(self.aioctx.append('foo0', b'baz'))
+        self._run(self.aioctx.write('foo0', b'B', 3))
+        eq(self._run(self.aioctx.read('foo0', 4, 2)), b'0Baz')
+        size, mtime = self._run(self.aioctx.stat('foo0'))
+        eq(size, 7)
+        self._run(self.aioctx.remove('foo0'))
+        assert_raises(ObjectNotFound, self._run, self.aioctx.read('foo0'))
+        assert_raises(ObjectNotFound, self._run, self.aioctx.stat('foo0'))
+
+    def test_operate_ops(self):
+        with WriteOpCtx() as write_op:
+            self.ioctx.set_omap(write_op, ("a", "b"), (b"1", b"2"))
+            self._run(self.aioctx.operate_write_op(write_op, "hw"))
+        with ReadOpCtx() as read_op:
+            iter, ret = self.ioctx.get_omap_vals(read_op, "", "", 10)
+            self._run(self.aioctx.operate_read_op(read_op, "hw"))
+            eq(list(iter), [("a", b"1"), ("b", b"2")])
+
+    def test_max_in_flight(self):
+        futures = [self.aioctx.write_full('foo%d' % i, b'bar')
+                   for i in range(10)]
+        eq(self.aioctx.in_flight, 4)
+        eq(self.aioctx.queued, 6)
+        self._gather(futures)
+        eq(self.aioctx.in_flight, 0)
+        eq(self.aioctx.queued, 0)
+        eq(len(list(self.ioctx.list_objects())), 10)
+
+    def test_cancel(self):
+        import asyncio
+        futures = [self.aioctx.write_full('foo%d' % i, b'bar')
+                   for i in range(10)]
+        for future in futures[4:]:
+            future.cancel()
+        self._run(asyncio.wait(futures[:4]))
+        eq(self.aioctx.in_flight, 0)
+        eq(self.aioctx.queued, 0)
+        eq(sorted(o.key for o in self.ioctx.list_objects()),
+           ['foo%d' % i for i in range(4)])
+
+
 class TestIoctxEc(object):
 
     def setUp(self):
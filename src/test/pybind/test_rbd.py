@@ -433,6 +433,17 @@ class TestImage(object):
         read = self.image.read(offset, 256)
         eq(data, read)
 
+    def test_write_readinto(self):
+        data = rand_data(256)
+        self.image.write(memoryview(data)[:128], 50)
+        self.image.write(bytearray(data[128:]), 178)
+        buf = bytearray(256)
+        eq(self.image.readinto(buf, 50), 256)
+        eq(bytes(buf), data)
+        eq(self.image.readinto(memoryview(buf)[:16], 0), 16)
+        eq(bytes(buf[:16]), b'\0' * 16)
+        assert_raises(BufferError, self.image.readinto, data, 0)
+
     def test_read_bad_offset(self):
         assert_raises(InvalidArgument, self.image.read, IMG_SIZE + 1, IMG_SIZE)
 
@@ -911,6 +922,38 @@ class TestImage(object):
         eq(sys.getrefcount(comp), 2)
         eq(self.image.read(256, 256), data)
 
+    def test_aio_readinto(self):
+        retval = [None]
+        def cb(_, length):
+            retval[0] = length
+
+        data = rand_data(64)
+        self.image.write(data, 0)
+        buf = bytearray(64)
+        comp = self.image.aio_readinto(buf, 0, cb)
+        comp.wait_for_complete_and_cb()
+        eq(retval[0], 64)
+        eq(bytes(buf), data)
+        eq(sys.getrefcount(comp), 2)
+
+        comp = self.image.aio_readinto(buf, IMG_SIZE, cb)
+        comp.wait_for_complete_and_cb()
+        eq(None, retval[0])
+        assert(comp.get_return_value() < 0)
+
+    def test_aio_writev(self):
+        retval = [None]
+        def cb(comp):
+            retval[0] = comp.get_return_value()
+
+        data = rand_data(256)
+        comp = self.image.aio_writev([data[:100], memoryview(data)[100:]],
+                                     256, cb)
+        comp.wait_for_complete_and_cb()
+        eq(retval[0], 0)
+        eq(sys.getrefcount(comp), 2)
+        eq(self.image.read(256, 256), data)
+
     def test_aio_discard(self):
         retval = [None]
         def cb(comp):